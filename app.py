@@ -1,82 +1,467 @@
-from flask import Flask, jsonify, request, send_from_directory, render_template, g
+from flask import Flask, jsonify, request, send_from_directory, render_template, g, url_for, Response
+from flask.json.provider import DefaultJSONProvider
 import os
-import io
-import base64
 import jwt
 import datetime
+import time
 import uuid
-import qrcode
 import json
+import hmac
+import base64
+import random
+import logging
 from functools import wraps
-from supabase import create_client, Client
 from dotenv import load_dotenv
 
-# Try import bcrypt
-try:
-    import bcrypt
-    HAS_BCRYPT = True
-except ImportError:
-    HAS_BCRYPT = False
-    from werkzeug.security import generate_password_hash, check_password_hash
+# Load environment variables (Create a .env file locally)
+# Before the local imports below, which read their settings at import time.
+load_dotenv()
+
+from stats import format_admin_stats, format_analytics
+from cache import TTLCache
+from qr import REQUEST_ID_RE, get_qr_png, new_request_ids, qr_cache, qr_pool
+from scanner import (SCAN_MAX_UPLOAD_BYTES, UPLOAD_OVERHEAD_BYTES, UploadRejected,
+                     decode_scan, load_decoders, read_upload, scan_pool)
+from events import EventBus, format_sse
+from dispatch import Dispatcher
+from archive import Archiver
+from passwords import hash_pool, hash_password, verify_password
+from workers import PoolFull, PoolOverloaded
+import tracing
+from metrics import registry, http_requests, http_request_seconds
+from storage import create_storage
+from storage.base import query_fanout
+from storage.transport import connection_stats, pool_settings
 
 # ----------------- CONFIGURATION -----------------
 app = Flask(__name__, static_folder='static', template_folder='templates')
 app.secret_key = 'cleanvit_secret_key_2024_vitvellore'
 
-# Load environment variables (Create a .env file locally)
-load_dotenv()
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
-# Initialize Supabase Client
-supabase: Client = None
+# Database access goes through the storage layer (storage/): Supabase when
+# configured, else the local SQLite file. See create_storage().
+db = create_storage()
 
-if SUPABASE_URL and SUPABASE_KEY:
-    try:
-        supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-        print("Connected to Supabase!")
-    except Exception as e:
-        print(f"Failed to connect to Supabase: {e}")
-else:
-    print("WARNING: SUPABASE_URL and SUPABASE_KEY must be set in Environment Variables or .env file.")
+# Shared result cache for the dashboard endpoints admins poll. Mutation routes
+# invalidate the entries they affect; the TTL bounds staleness for writes made
+# through other worker processes.
+result_cache = TTLCache(
+    maxsize=int(os.getenv('CACHE_MAX_ENTRIES', 256)),
+    ttl=float(os.getenv('CACHE_TTL_SECONDS', 15))
+)
+
+# Decoded JWT claims, keyed by the raw token (signature checked once), and
+# student profile rows for tokens issued before profile claims were added.
+# Profiles have their own cache so they and the stats entries don't evict
+# each other; writes to a users row drop its entry (invalidate_user_profile).
+claims_cache = TTLCache(maxsize=int(os.getenv('CLAIMS_CACHE_SIZE', 4096)), ttl=300)
+profile_cache = TTLCache(
+    maxsize=int(os.getenv('PROFILE_CACHE_SIZE', 4096)),
+    ttl=float(os.getenv('PROFILE_CACHE_TTL_SECONDS', 300))
+)
+
+# Request lifecycle events pushed to /api/events streams. The bus lives in
+# one process: a stream only sees writes handled by the same process, and
+# holds one of its threads while open. That suits a single process (the
+# dev server, or one gunicorn worker with threads), not several workers or
+# serverless instances, where most events never reach a given stream.
+# There set SSE_ENABLED=0 (the default on Vercel): the event routes answer
+# 404 and the pages poll instead.
+SSE_ENABLED = os.getenv('SSE_ENABLED', '0' if os.getenv('VERCEL') else '1') == '1'
+event_bus = EventBus(max_queue=int(os.getenv('SSE_QUEUE_SIZE', 100)))
+SSE_KEEPALIVE_SECONDS = 15
+# EventSource cannot send headers, so browsers open a stream with a
+# short-lived token from POST /api/events/token in ?token= instead of the
+# access token. Its audience keeps it good for nothing but opening a stream.
+EVENT_TOKEN_AUDIENCE = 'cleanvit:events'
+EVENT_TOKEN_TTL_SECONDS = 60
+
+# Automatic assignment of pending requests to free cleaners (dispatch.py).
+# Only cleaners who have gone on shift (PUT /api/cleaner/shift) get jobs;
+# the rest accept by hand from the pending list as before. An assigned job
+# not started within DISPATCH_START_TIMEOUT_SECONDS goes back to pending.
+# DISPATCH_ENABLED=0 turns it off.
+DISPATCH_ENABLED = os.getenv('DISPATCH_ENABLED', '1') == '1'
+dispatcher = Dispatcher(
+    db,
+    max_jobs=int(os.getenv('DISPATCH_MAX_JOBS_PER_CLEANER', 1)),
+    resync_seconds=float(os.getenv('DISPATCH_RESYNC_SECONDS', 30)),
+    start_timeout=float(os.getenv('DISPATCH_START_TIMEOUT_SECONDS', 900))
+) if db and DISPATCH_ENABLED else None
+
+# Completed requests older than ARCHIVE_AFTER_DAYS move to requests_archive
+# (archive.py). ARCHIVE_ENABLED=0 leaves that to archive_requests.py.
+ARCHIVE_ENABLED = os.getenv('ARCHIVE_ENABLED', '1') == '1'
+archiver = Archiver(
+    db,
+    after_days=float(os.getenv('ARCHIVE_AFTER_DAYS', 30)),
+    batch_size=int(os.getenv('ARCHIVE_BATCH_SIZE', 500)),
+    interval_seconds=float(os.getenv('ARCHIVE_INTERVAL_SECONDS', 3600)),
+    max_batches=int(os.getenv('ARCHIVE_MAX_BATCHES', 20))
+) if db and ARCHIVE_ENABLED else None
+if archiver:
+    os.register_at_fork(after_in_child=archiver.reset)
 
 # ----------------- HELPERS -----------------
 
-def hash_password(password):
-    if HAS_BCRYPT:
-        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-    else:
-        return generate_password_hash(password)
+@app.errorhandler(PoolOverloaded)
+def worker_pool_overloaded(e):
+    # Shed load instead of queueing CPU-heavy work without bound
+    resp = jsonify({'error': 'Server busy, please retry'})
+    resp.headers['Retry-After'] = '2'
+    return resp, 503
+
+@app.errorhandler(413)
+def upload_too_large(e):
+    return jsonify({'error': 'Upload too large'}), 413
+
+# ----------------- METRICS -----------------
+# Per-route request counts and latency for /metrics. Routes are labelled by
+# their URL rule (/api/requests/<id>/accept), never the raw path, so the
+# number of series stays bounded. METRICS_TOKEN, when set, is required as
+# a bearer token to scrape.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(resp):
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        http_request_seconds.observe(time.perf_counter() - started, route, request.method)
+        http_requests.inc(route, request.method, str(resp.status_code))
+    return resp
+
+def collect_caches(field):
+    caches = {'result': result_cache, 'claims': claims_cache, 'profile': profile_cache, 'qr': qr_cache}
+    return lambda: {(name,): c.stats()[field] for name, c in caches.items()}
+
+def collect_pools(field):
+    pools = {'bcrypt': hash_pool, 'scan': scan_pool}
+    return lambda: {(name,): p.stats()[field] for name, p in pools.items()}
+
+registry.collected('cleanvit_cache_entries', 'Entries held per in-process cache.', ('cache',),
+                   collect_caches('size'))
+registry.collected('cleanvit_cache_hits_total', 'Cache hits per in-process cache.', ('cache',),
+                   collect_caches('hits'), kind='counter')
+registry.collected('cleanvit_cache_misses_total', 'Cache misses per in-process cache.', ('cache',),
+                   collect_caches('misses'), kind='counter')
+registry.collected('cleanvit_pool_pending', 'Jobs queued or running per worker pool.', ('pool',),
+                   collect_pools('pending'))
+registry.collected('cleanvit_pool_rejected_total', 'Jobs turned away because the pool was full.', ('pool',),
+                   collect_pools('rejected'), kind='counter')
+registry.collected('cleanvit_pool_timed_out_total', 'Jobs that exceeded their timeout.', ('pool',),
+                   collect_pools('timedOut'), kind='counter')
+registry.collected('cleanvit_pool_broken_total', 'Jobs lost to a worker process that died.', ('pool',),
+                   collect_pools('broken'), kind='counter')
+registry.collected('cleanvit_qr_pool_ready', 'Pre-generated request ids with a rendered QR.', (),
+                   lambda: {(): qr_pool.stats()['ready']})
+registry.collected('cleanvit_qr_pool_takes_total', 'Request ids taken from the QR pool, by result.', ('result',),
+                   lambda: {('hit',): qr_pool.stats()['hits'], ('miss',): qr_pool.stats()['misses']},
+                   kind='counter')
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    if METRICS_TOKEN and bearer_token() != METRICS_TOKEN:
+        return jsonify({'error': 'Unauthorized'}), 401
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+# ----------------- TRACING -----------------
+# A request is traced when it carries `X-Trace: <TRACE_TOKEN>` or is picked
+# by TRACE_SAMPLE_RATE (0..1). Traced responses get a Server-Timing header
+# (totals for db, qr_render, qr_decode, bcrypt, json, and request-thread
+# CPU) that browser devtools show under Timing. Any request slower than
+# SLOW_REQUEST_MS is written as one JSON line to the cleanvit.slow_requests
+# logger, with the per-call breakdown when it was traced.
+TRACE_TOKEN = os.getenv('TRACE_TOKEN')
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', 0))
+SLOW_REQUEST_MS = float(os.getenv('SLOW_REQUEST_MS', 1000))
+slow_request_log = logging.getLogger('cleanvit.slow_requests')
+
+class TracedJSONProvider(DefaultJSONProvider):
+    # jsonify() goes through response(); time serialization when traced
+    def response(self, *args, **kwargs):
+        with tracing.span('json'):
+            return super().response(*args, **kwargs)
+
+app.json = TracedJSONProvider(app)
+
+def trace_requested():
+    header = request.headers.get('X-Trace')
+    if TRACE_TOKEN and header and hmac.compare_digest(header.encode(), TRACE_TOKEN.encode()):
+        return True
+    return TRACE_SAMPLE_RATE > 0 and random.random() < TRACE_SAMPLE_RATE
+
+@app.before_request
+def start_request_trace():
+    if trace_requested():
+        tracing.start_trace()
+
+@app.after_request
+def finish_request_trace(resp):
+    trace = tracing.current_trace.get()
+    started = trace.started if trace else g.get('request_started')
+    if started is None:
+        return resp
+    total_ms = (time.perf_counter() - started) * 1000
+    if trace:
+        resp.headers['Server-Timing'] = trace.server_timing(total_ms)
+    if total_ms >= SLOW_REQUEST_MS:
+        entry = {'method': request.method, 'path': request.path,
+                 'route': request.url_rule.rule if request.url_rule else 'unmatched',
+                 'status': resp.status_code, 'ms': round(total_ms, 1), 'traced': trace is not None}
+        if trace:
+            entry.update(trace.summary())
+        slow_request_log.warning(json.dumps(entry, default=str))
+    return resp
+
+@app.teardown_request
+def end_request_trace(exc=None):
+    # Runs even when the view raised, so no trace leaks into the next
+    # request handled on this thread
+    tracing.end_trace()
+
+def invalidate_stats(cleaner_id=None):
+    # Called after every write that changes request counts or ratings
+    result_cache.invalidate('admin_stats')
+    if cleaner_id is not None:
+        result_cache.invalidate('cleaner_stats', cleaner_id)
+
+# ----------------- FIELD SETS -----------------
+# Columns each list view actually renders. `?fields=a,b` lets a client narrow
+# a view further but never widen it (e.g. no password hashes, no request_id
+# for cleaners, who must prove presence by scanning the QR).
+# 'student_name' is virtual: the storage backend fills it from the users join.
+FIELD_SETS = {
+    'student_requests': ('id', 'request_id', 'type', 'instructions', 'status', 'created_at',
+                         'accepted_at', 'completed_at', 'rating', 'feedback'),
+    'cleaner_requests': ('id', 'block', 'room_number', 'type', 'instructions', 'status',
+                         'accepted_at', 'completed_at', 'rating', 'feedback', 'student_name'),
+    'pending_requests': ('id', 'block', 'room_number', 'type', 'instructions', 'created_at',
+                         'student_name'),
+    'cleaners': ('id', 'employee_id', 'name', 'assigned_blocks', 'is_active', 'created_at'),
+}
+
+def requested_fields(view):
+    # Returns the column tuple for this view, or None if ?fields= is invalid
+    allowed = FIELD_SETS[view]
+    param = request.args.get('fields')
+    if not param:
+        return allowed
+    fields = tuple(f.strip() for f in param.split(',') if f.strip())
+    if not fields or any(f not in allowed for f in fields):
+        return None
+    return fields
+
+# ----------------- PAGINATION -----------------
+# Keyset pagination for request listings: ?after=<cursor>&limit=N.
+# Rows are ordered by (sort column, id) so ties on timestamps stay stable, and
+# the cursor for the next page is returned in the X-Next-Cursor header. The
+# cursor is opaque: urlsafe base64 (unpadded) of the JSON [sort value, id],
+# so it can go in a query string as is (timestamps carry a '+').
+PAGE_SIZE_DEFAULT = int(os.getenv('PAGE_SIZE_DEFAULT', 50))
+PAGE_SIZE_MAX = 200
+
+def page_params():
+    # Returns (cursor, limit), or None if the parameters are malformed
+    try:
+        limit = int(request.args.get('limit', PAGE_SIZE_DEFAULT))
+    except ValueError:
+        return None
+    if limit < 1:
+        return None
+    limit = min(limit, PAGE_SIZE_MAX)
+    
+    after = request.args.get('after')
+    if not after:
+        return None, limit
+    cursor = decode_cursor(after)
+    if cursor is None:
+        return None
+    return cursor, limit
+
+def encode_cursor(value, last_id):
+    if isinstance(value, datetime.datetime):
+        value = value.isoformat()
+    raw = json.dumps([value, last_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(token):
+    # (sort value, id), or None if the cursor was not made by encode_cursor
+    try:
+        raw = base64.b64decode(token + '=' * (-len(token) % 4), altchars=b'-_', validate=True)
+        value, last_id = json.loads(raw)
+        if not isinstance(value, str) or type(last_id) is not int:
+            return None
+        datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (ValueError, TypeError):
+        return None
+    return value, last_id
+
+def include_archived():
+    # ?include_archived=1 adds requests already moved to requests_archive
+    return request.args.get('include_archived', '0').lower() in ('1', 'true')
+
+def page_query(page):
+    # Storage keyword arguments for a page. One extra row tells us whether
+    # there is a next page.
+    cursor, limit = page
+    return {'cursor': cursor, 'limit': limit + 1}
+
+def paged_response(rows, column, page):
+    _, limit = page
+    resp = jsonify(rows[:limit])
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        resp.headers['X-Next-Cursor'] = encode_cursor(last[column], last['id'])
+    return resp
+
+def bearer_token():
+    if 'Authorization' in request.headers:
+        parts = request.headers['Authorization'].split(" ")
+        if len(parts) > 1:
+            return parts[1]
+    return None
+
+def decode_token(token):
+    found, data = claims_cache.get(('claims', token))
+    if found:
+        if data.get('exp', float('inf')) > time.time():
+            return data
+        return None
+    
+    try:
+        data = jwt.decode(token, app.secret_key, algorithms=["HS256"])
+    except Exception:
+        return None
+    
+    # Never keep claims past the token's own expiry
+    ttl = claims_cache.ttl
+    if 'exp' in data:
+        ttl = min(ttl, data['exp'] - time.time())
+    if ttl > 0:
+        claims_cache.set(('claims', token), data, ttl=ttl)
+    return data
+
+def student_token(user):
+    # Profile fields ride in the token so student routes don't have to
+    # re-read the users row on every call.
+    return jwt.encode({
+        'id': user['id'],
+        'email': user['email'],
+        'name': user['name'],
+        'role': 'student',
+        'block': user['block'],
+        'roomNumber': user['room_number'],
+        'groupNo': user['group_no'],
+        'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=24)
+    }, app.secret_key, algorithm="HS256")
+
+def get_user_profile(user_id):
+    found, profile = profile_cache.get(('user_profile', user_id))
+    if found:
+        return profile
+    
+    profile = db.get_user_profile(user_id)
+    if not profile:
+        return None
+    profile_cache.set(('user_profile', user_id), profile)
+    return profile
 
-def verify_password(password, hashed):
-    if HAS_BCRYPT:
-        if isinstance(hashed, str):
-            hashed = hashed.encode('utf-8')
-        return bcrypt.checkpw(password.encode('utf-8'), hashed)
+def invalidate_user_profile(user_id=None):
+    # Call after any write to a users row (create, block, room or group
+    # change, delete); with no id, drops every cached profile
+    if user_id is None:
+        profile_cache.invalidate('user_profile')
     else:
-        return check_password_hash(hashed, password)
+        profile_cache.invalidate('user_profile', user_id)
+
+def current_student_profile():
+    # From the token's claims when present; older tokens fall back to the
+    # cached users row.
+    user = g.current_user
+    if user.get('groupNo'):
+        return {
+            'id': user['id'],
+            'name': user.get('name'),
+            'block': user['block'],
+            'room_number': user['roomNumber'],
+            'group_no': user['groupNo']
+        }
+    return get_user_profile(user['id'])
 
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = None
-        if 'Authorization' in request.headers:
-            parts = request.headers['Authorization'].split(" ")
-            if len(parts) > 1:
-                token = parts[1]
-        
+        token = bearer_token()
         if not token:
             return jsonify({'message': 'Token is missing!'}), 401
         
-        try:
-            data = jwt.decode(token, app.secret_key, algorithms=["HS256"])
-            g.current_user = data
-        except Exception as e:
+        data = decode_token(token)
+        if data is None:
             return jsonify({'message': 'Token is invalid!'}), 403
+        g.current_user = data
         
         return f(*args, **kwargs)
     return decorated
 
+def publish_request_event(event_type, row):
+    # row: the request row returned by the write. request_id is never sent,
+    # since cleaners must obtain it by scanning the QR.
+    event_bus.publish(event_type, {
+        'id': row.get('id'),
+        'block': row.get('block'),
+        'groupNo': row.get('group_no'),
+        'userId': row.get('user_id'),
+        'cleanerId': row.get('cleaner_id'),
+        'type': row.get('type'),
+        'status': row.get('status'),
+        'rating': row.get('rating')
+    })
+
+def run_dispatch():
+    # Assigns queued requests to free cleaners, announcing each one as an
+    # accept so the cleaner's and the students' streams update. Runs after
+    # the caller's own write has committed, so a failure here is logged and
+    # never turns that write into an error; the dispatcher rebuilds from
+    # the database next time.
+    if not dispatcher:
+        return
+    try:
+        rows = dispatcher.dispatch()
+    except Exception as e:
+        print(f"Dispatch failed: {e}")
+        return
+    # Rows back to 'pending' are assigned jobs taken back after the start
+    # timeout
+    for row in rows:
+        publish_request_event('request.accepted' if row['status'] == 'assigned' else 'request.requeued', row)
+    if rows:
+        invalidate_stats()
+
+def event_visible(user, event):
+    data = event['data']
+    role = user.get('role')
+    if role == 'admin':
+        return True
+    if role == 'cleaner':
+        return data.get('block') in user.get('blocks', []) or data.get('cleanerId') == user.get('id')
+    if role == 'student':
+        group_no = user.get('groupNo') or f"{user.get('block')}-{user.get('roomNumber')}"
+        return data.get('groupNo') == group_no or data.get('userId') == user.get('id')
+    return False
+
+@app.before_request
+def archive_old_requests():
+    # Starts a background pass at most every ARCHIVE_INTERVAL_SECONDS
+    if archiver:
+        archiver.maybe_run()
+
 # ----------------- ROUTES -----------------
 
 @app.route('/')
@@ -99,7 +484,7 @@ def admin_page():
 
 @app.route('/api/auth/student/signup-direct', methods=['POST'])
 def student_signup_direct():
-    if not supabase: return jsonify({'error': 'Database not configured'}), 500
+    if not db: return jsonify({'error': 'Database not configured'}), 500
     
     data = request.json
     email = data.get('email')
@@ -112,8 +497,7 @@ def student_signup_direct():
         return jsonify({'error': 'Please use a valid VIT email address'}), 400
         
     # Check if user exists
-    existing = supabase.table('users').select('id').eq('email', email).execute()
-    if existing.data:
+    if db.email_registered(email):
         return jsonify({'error': 'Email already registered'}), 400
     
     hashed = hash_password(password)
@@ -121,7 +505,7 @@ def student_signup_direct():
     
     try:
         # Create User
-        user_res = supabase.table('users').insert({
+        user = db.create_user({
             'email': email,
             'password': hashed,
             'name': name,
@@ -129,7 +513,8 @@ def student_signup_direct():
             'room_number': room_number,
             'group_no': group_no,
             'role': 'student'
-        }).execute()
+        })
+        invalidate_user_profile(user['id'] if user else None)
         
         return jsonify({'message': 'Account created successfully'})
     except Exception as e:
@@ -138,7 +523,7 @@ def student_signup_direct():
 # Legacy OTP routes kept but not used by new frontend
 @app.route('/api/auth/student/signup', methods=['POST'])
 def student_signup_otp():
-    if not supabase: return jsonify({'error': 'Database not configured'}), 500
+    if not db: return jsonify({'error': 'Database not configured'}), 500
     
     data = request.json
     email = data.get('email')
@@ -147,26 +532,20 @@ def student_signup_otp():
         return jsonify({'error': 'Please use a valid VIT email address'}), 400
         
     # Check if user exists
-    existing = supabase.table('users').select('id').eq('email', email).execute()
-    if existing.data:
+    if db.email_registered(email):
         return jsonify({'error': 'Email already registered'}), 400
         
     otp = str(uuid.uuid4().int)[:6]
     # Use timezone aware current time if possible, or ISO string
     expires_at = (datetime.datetime.utcnow() + datetime.timedelta(minutes=10)).isoformat()
     
-    supabase.table('otps').insert({
-        'email': email,
-        'otp': otp,
-        'expires_at': expires_at,
-        'used':False
-    }).execute()
+    db.create_otp(email, otp, expires_at)
     
     return jsonify({'message': 'OTP sent', 'otp': otp})
 
 @app.route('/api/auth/student/verify-otp', methods=['POST'])
 def student_verify_signup():
-    if not supabase: return jsonify({'error': 'Database not configured'}), 500
+    if not db: return jsonify({'error': 'Database not configured'}), 500
     
     data = request.json
     otp = data.get('otp')
@@ -177,19 +556,17 @@ def student_verify_signup():
     room_number = data.get('roomNumber')
 
     # Find valid OTP
-    res = supabase.table('otps').select('*').eq('email', email).eq('otp', otp).eq('used', False).order('created_at', desc=True).limit(1).execute()
+    otp_record = db.find_unused_otp(email, otp)
     
-    if not res.data:
+    if not otp_record:
          return jsonify({'error': 'Invalid or expired OTP'}), 400
     
-    otp_record = res.data[0]
-    
     hashed = hash_password(password)
     group_no = f"{block}-{room_number}"
     
     try:
         # Create User
-        user_res = supabase.table('users').insert({
+        user = db.create_user({
             'email': email,
             'password': hashed,
             'name': name,
@@ -197,10 +574,11 @@ def student_verify_signup():
             'room_number': room_number,
             'group_no': group_no,
             'role': 'student'
-        }).execute()
+        })
+        invalidate_user_profile(user['id'] if user else None)
         
         # Mark OTP used
-        supabase.table('otps').update({'used': True}).eq('id', otp_record['id']).execute()
+        db.mark_otp_used(otp_record['id'])
         
         return jsonify({'message': 'Account created successfully'})
     except Exception as e:
@@ -216,7 +594,7 @@ def get_config():
 
 @app.route('/api/auth/student/google-check', methods=['POST'])
 def google_check():
-    if not supabase: return jsonify({'error': 'Database not configured'}), 500
+    if not db: return jsonify({'error': 'Database not configured'}), 500
     
     data = request.json
     email = data.get('email')
@@ -225,23 +603,14 @@ def google_check():
         return jsonify({'error': 'Please use a valid VIT email address'}), 400
 
     # Check if user exists in our local users table
-    res = supabase.table('users').select('*').eq('email', email).execute()
+    user = db.find_user_by_email(email)
     
-    if not res.data:
+    if not user:
         # User auth'd with Google but not in our DB -> Needs profile
         return jsonify({'status': 'profile_required'})
     
-    user = res.data[0]
-    
     # User exists, generate token
-    token = jwt.encode({
-        'id': user['id'],
-        'email': user['email'],
-        'role': 'student',
-        'block': user['block'],
-        'roomNumber': user['room_number'],
-        'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=24)
-    }, app.secret_key, algorithm="HS256")
+    token = student_token(user)
     
     return jsonify({
         'status': 'success',
@@ -257,7 +626,7 @@ def google_check():
 
 @app.route('/api/auth/student/google-register', methods=['POST'])
 def google_register():
-    if not supabase: return jsonify({'error': 'Database not configured'}), 500
+    if not db: return jsonify({'error': 'Database not configured'}), 500
     
     data = request.json
     email = data.get('email')
@@ -269,13 +638,12 @@ def google_register():
         return jsonify({'error': 'Please use a valid VIT email address'}), 400
         
     group_no = f"{block}-{room_number}"
+    # Password is a dummy one for Google users. Hashed before the try so a
+    # busy bcrypt pool gives the usual 503, not a 500
+    hashed = hash_password(str(uuid.uuid4()))
     
     try:
-        # Create User - password is None/Empty for Google users if we want, or a dummy one
-        dummy_pass = str(uuid.uuid4())
-        hashed = hash_password(dummy_pass)
-        
-        user_res = supabase.table('users').insert({
+        user = db.create_user({
             'email': email,
             'password': hashed, 
             'name': name,
@@ -283,25 +651,14 @@ def google_register():
             'room_number': room_number,
             'group_no': group_no,
             'role': 'student'
-        }).execute()
+        })
         
         # Now login
-        try:
-             # Depending on supabase-py version, insert might return data or we query it
-            res = supabase.table('users').select('*').eq('email', email).execute()
-            user = res.data[0]
-        except:
-             # Fallback if insert returns data directly (it should)
-             user = user_res.data[0]
-
-        token = jwt.encode({
-            'id': user['id'],
-            'email': user['email'],
-            'role': 'student',
-            'block': user['block'],
-            'roomNumber': user['room_number'],
-            'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=24)
-        }, app.secret_key, algorithm="HS256")
+        if not user:
+            user = db.find_user_by_email(email)
+        invalidate_user_profile(user['id'])
+
+        token = student_token(user)
         
         return jsonify({
             'status': 'success',
@@ -319,29 +676,20 @@ def google_register():
 
 @app.route('/api/auth/student/login', methods=['POST'])
 def student_login():
-    if not supabase: return jsonify({'error': 'Database not configured'}), 500
+    if not db: return jsonify({'error': 'Database not configured'}), 500
     
     data = request.json
     email = data.get('email')
     password = data.get('password')
     
-    res = supabase.table('users').select('*').eq('email', email).execute()
-    if not res.data:
+    user = db.find_user_by_email(email)
+    if not user:
         return jsonify({'error': 'Invalid credentials'}), 401
     
-    user = res.data[0]
-    
     if not verify_password(password, user['password']):
         return jsonify({'error': 'Invalid credentials'}), 401
         
-    token = jwt.encode({
-        'id': user['id'],
-        'email': user['email'],
-        'role': 'student',
-        'block': user['block'],
-        'roomNumber': user['room_number'],
-        'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=24)
-    }, app.secret_key, algorithm="HS256")
+    token = student_token(user)
     
     return jsonify({
         'token': token,
@@ -356,19 +704,17 @@ def student_login():
 
 @app.route('/api/auth/cleaner/login', methods=['POST'])
 def cleaner_login():
-    if not supabase: return jsonify({'error': 'Database not configured'}), 500
+    if not db: return jsonify({'error': 'Database not configured'}), 500
     
     data = request.json
     emp_id = data.get('employeeId')
     password = data.get('password')
     
-    res = supabase.table('cleaners').select('*').eq('employee_id', emp_id).eq('is_active', True).execute()
+    cleaner = db.find_active_cleaner(emp_id)
     
-    if not res.data:
+    if not cleaner:
         return jsonify({'error': 'Invalid credentials'}), 401
     
-    cleaner = res.data[0]
-    
     if not verify_password(password, cleaner['password']):
         return jsonify({'error': 'Invalid credentials'}), 401
         
@@ -392,18 +738,16 @@ def cleaner_login():
 
 @app.route('/api/auth/admin/login', methods=['POST'])
 def admin_login():
-    if not supabase: return jsonify({'error': 'Database not configured'}), 500
+    if not db: return jsonify({'error': 'Database not configured'}), 500
     
     data = request.json
     username = data.get('username')
     password = data.get('password')
     
-    res = supabase.table('admins').select('*').eq('username', username).execute()
+    admin = db.find_admin(username)
     
-    if not res.data:
+    if not admin:
         return jsonify({'error': 'Invalid credentials'}), 401
-        
-    admin = res.data[0]
     if not verify_password(password, admin['password']):
         return jsonify({'error': 'Invalid credentials'}), 401
         
@@ -421,7 +765,7 @@ def admin_login():
 @app.route('/api/requests', methods=['POST'])
 @token_required
 def create_request():
-    if not supabase: return jsonify({'error': 'Database not configured'}), 500
+    if not db: return jsonify({'error': 'Database not configured'}), 500
     if g.current_user['role'] != 'student':
         return jsonify({'error': 'Unauthorized'}), 403
         
@@ -429,23 +773,15 @@ def create_request():
     req_type = data.get('type')
     instructions = data.get('instructions')
     
-    req_id = f"REQ-{str(uuid.uuid4())[:8].upper()}"
+    # Pre-generated when the pool has one; its QR is then already cached
+    req_id = qr_pool.take()
     
-    # Generate QR
-    qr = qrcode.QRCode(version=1, box_size=10, border=5)
-    qr.add_data(req_id)
-    qr.make(fit=True)
-    img = qr.make_image(fill_color="black", back_color="white")
-    buf = io.BytesIO()
-    img.save(buf)
-    qr_b64 = base64.b64encode(buf.getvalue()).decode("utf-8")
-    qr_data_url = f"data:image/png;base64,{qr_b64}"
+    # Room details for redundant storage, from the token or profile cache
+    user = current_student_profile()
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
     
-    # Get user details for redundant storage (optional, but good for quick access)
-    user_res = supabase.table('users').select('*').eq('id', g.current_user['id']).execute()
-    user = user_res.data[0]
-    
-    supabase.table('requests').insert({
+    row = db.create_request({
         'request_id': req_id,
         'user_id': user['id'],
         'block': user['block'],
@@ -453,196 +789,531 @@ def create_request():
         'group_no': user['group_no'],
         'type': req_type,
         'instructions': instructions,
-        'qr_code': qr_data_url,
         'status': 'pending'
-    }).execute()
+    })
+    invalidate_stats()
+    if row:
+        publish_request_event('request.created', row)
+        if dispatcher:
+            dispatcher.add(row)
+        run_dispatch()
     
-    return jsonify({'message': 'Request created', 'qrCode': qr_data_url})
+    # The QR only encodes request_id; it is rendered on demand, not stored
+    qr_url = url_for('get_request_qr', request_id=req_id)
+    return jsonify({'message': 'Request created', 'requestId': req_id, 'qrCode': qr_url})
+
+# ----------------- BULK REQUESTS -----------------
+# Admins (acting as wardens) schedule cleaning for many room groups at once:
+#   {"type": "...", "instructions": "...",
+#    "items": [{"groupNo": "A-101"}, {"groupNo": "A-102", "type": "Mopping"}]}
+# Item fields override the top-level defaults. All groups are resolved in
+# one query and all valid items inserted in one multi-row insert; the
+# response has one result per item, in order. A request_id that is already
+# taken skips just that row, which is retried with a new id (up to
+# BULK_REQUEST_ID_ATTEMPTS inserts in all).
+BULK_REQUEST_MAX_ITEMS = int(os.getenv('BULK_REQUEST_MAX_ITEMS', 500))
+BULK_REQUEST_ID_ATTEMPTS = 3
+
+@app.route('/api/requests/bulk', methods=['POST'])
+@token_required
+def create_requests_bulk():
+    if not db: return jsonify({'error': 'Database not configured'}), 500
+    if g.current_user['role'] != 'admin': return jsonify({'error': 'Unauthorized'}), 403
+    
+    data = request.get_json(silent=True) or {}
+    items = data.get('items')
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'items must be a non-empty list'}), 400
+    if len(items) > BULK_REQUEST_MAX_ITEMS:
+        return jsonify({'error': f'At most {BULK_REQUEST_MAX_ITEMS} items per request'}), 400
+    
+    results = [None] * len(items)
+    wanted = []
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[i] = {'index': i, 'error': 'Item must be an object'}
+            continue
+        group_no = item.get('groupNo')
+        req_type = item.get('type') or data.get('type')
+        if not group_no or not req_type:
+            results[i] = {'index': i, 'groupNo': group_no, 'error': 'groupNo and type are required'}
+            continue
+        wanted.append((i, group_no, req_type, item.get('instructions', data.get('instructions'))))
+    
+    # The request is filed under the group's first registered student
+    owners = {}
+    if wanted:
+        for user in db.list_group_students({w[1] for w in wanted}):
+            owners.setdefault(user['group_no'], user)
+    
+    rows, placed = [], []
+    req_ids = iter(new_request_ids(len(wanted)))
+    for i, group_no, req_type, instructions in wanted:
+        user = owners.get(group_no)
+        if not user:
+            results[i] = {'index': i, 'groupNo': group_no, 'error': 'Unknown group'}
+            continue
+        rows.append({
+            'request_id': next(req_ids),
+            'user_id': user['id'],
+            'block': user['block'],
+            'room_number': user['room_number'],
+            'group_no': group_no,
+            'type': req_type,
+            'instructions': instructions,
+            'status': 'pending'
+        })
+        placed.append(i)
+    
+    created = {}
+    todo = rows
+    for _ in range(BULK_REQUEST_ID_ATTEMPTS):
+        if not todo:
+            break
+        # RETURNING order is not guaranteed for multi-row inserts
+        created.update((row['request_id'], row) for row in db.create_requests(todo))
+        todo = [fields for fields in todo if fields['request_id'] not in created]
+        fresh = (req_id for req_id in new_request_ids(2 * len(todo)) if req_id not in created)
+        for fields, req_id in zip(todo, fresh):
+            fields['request_id'] = req_id
+    for i, fields in zip(placed, rows):
+        row = created.get(fields['request_id'])
+        if not row:
+            results[i] = {'index': i, 'groupNo': fields['group_no'], 'error': 'Not created'}
+            continue
+        results[i] = {'index': i, 'groupNo': row['group_no'], 'requestId': row['request_id'],
+                      'qrCode': url_for('get_request_qr', request_id=row['request_id'])}
+        publish_request_event('request.created', row)
+        if dispatcher:
+            dispatcher.add(row)
+    if created:
+        invalidate_stats()
+        run_dispatch()
+    
+    return jsonify({
+        'message': f'{len(created)} of {len(items)} requests created',
+        'created': len(created),
+        'failed': len(items) - len(created),
+        'results': results
+    })
+
+@app.route('/api/requests/<request_id>/qr.png', methods=['GET'])
+def get_request_qr(request_id):
+    # Loaded via <img src>, so no Authorization header; request_ids are random
+    # and only ever returned to the owning room group and its cleaner.
+    if not REQUEST_ID_RE.match(request_id):
+        return jsonify({'error': 'Invalid request id'}), 404
+    
+    png, etag = get_qr_png(request_id)
+    resp = Response(png, mimetype='image/png')
+    resp.set_etag(etag)
+    resp.cache_control.private = True
+    resp.cache_control.max_age = 86400
+    resp.cache_control.immutable = True
+    return resp.make_conditional(request)
 
 @app.route('/api/requests', methods=['GET'])
 @token_required
 def get_requests():
-    if not supabase: return jsonify({'error': 'Database not configured'}), 500
+    if not db: return jsonify({'error': 'Database not configured'}), 500
+    
+    page = page_params()
+    if page is None: return jsonify({'error': 'Invalid pagination parameters'}), 400
     
     if g.current_user['role'] == 'student':
+        fields = requested_fields('student_requests')
+        if fields is None: return jsonify({'error': 'Invalid fields'}), 400
+        
         # Get group
-        user_res = supabase.table('users').select('group_no').eq('id', g.current_user['id']).execute()
-        group_no = user_res.data[0]['group_no'] if user_res.data else None
+        profile = current_student_profile()
+        group_no = profile['group_no'] if profile else None
         
-        query = supabase.table('requests').select('*').order('created_at', desc=True)
-        if group_no:
-            query = query.eq('group_no', group_no)
-        else:
-            query = query.eq('user_id', g.current_user['id'])
-            
-        res = query.execute()
-        return jsonify(res.data)
+        rows = db.list_group_requests(fields, group_no=group_no, user_id=g.current_user['id'],
+                                      include_archived=include_archived(), **page_query(page))
+        return paged_response(rows, 'created_at', page)
         
     elif g.current_user['role'] == 'cleaner':
-        # Cleaners see accepted/completed
-        # We need to join users to get student name. Supabase-py syntax:
-        # .select('*, users(name)')
-        res = supabase.table('requests').select('*, users(name)').eq('cleaner_id', g.current_user['id']).in_('status', ['in_progress', 'accepted', 'completed']).order('accepted_at', desc=True).execute()
-        
-        # Flatten structure if needed by frontend (frontend expects student_name, not users.name)
-        # Or update frontend. Let's map it here to match previous API response structure
-        result = []
-        for r in res.data:
-            item = r.copy()
-            if r.get('users'):
-                item['student_name'] = r['users'].get('name')
-            result.append(item)
-            
-        return jsonify(result)
+        fields = requested_fields('cleaner_requests')
+        if fields is None: return jsonify({'error': 'Invalid fields'}), 400
+        
+        # Cleaners see accepted/completed, with the student name joined from users
+        rows = db.list_cleaner_requests(fields, g.current_user['id'], include_archived=include_archived(),
+                                        **page_query(page))
+        return paged_response(rows, 'accepted_at', page)
     else:
         return jsonify([])
 
 @app.route('/api/requests/pending', methods=['GET'])
 @token_required
 def get_pending_requests():
-    if not supabase: return jsonify({'error': 'Database not configured'}), 500
+    if not db: return jsonify({'error': 'Database not configured'}), 500
     if g.current_user['role'] != 'cleaner': return jsonify({'error': 'Unauthorized'}), 403
         
+    fields = requested_fields('pending_requests')
+    if fields is None: return jsonify({'error': 'Invalid fields'}), 400
+    page = page_params()
+    if page is None: return jsonify({'error': 'Invalid pagination parameters'}), 400
+    
     blocks = g.current_user.get('blocks', [])
     if not blocks: return jsonify([])
-        
-    # Supabase "in" filter for blocks
-    res = supabase.table('requests').select('*, users(name)').eq('status', 'pending').in_('block', blocks).order('created_at', desc=False).execute()
     
-    result = []
-    for r in res.data:
-        item = r.copy()
-        if r.get('users'):
-            item['student_name'] = r['users'].get('name')
-        result.append(item)
+    # A cleaner looking for work is a cue to hand out any queued requests
+    run_dispatch()
         
-    return jsonify(result)
+    rows = db.list_pending_requests(fields, blocks, **page_query(page))
+    return paged_response(rows, 'created_at', page)
 
 @app.route('/api/requests/<int:req_id>/accept', methods=['PUT'])
 @token_required
 def accept_request(req_id):
-    if not supabase: return jsonify({'error': 'Database not configured'}), 500
+    if not db: return jsonify({'error': 'Database not configured'}), 500
     if g.current_user['role'] != 'cleaner': return jsonify({'error': 'Unauthorized'}), 403
         
-    supabase.table('requests').update({
-        'status': 'in_progress',
-        'cleaner_id': g.current_user['id'],
-        'accepted_at': datetime.datetime.utcnow().isoformat()
-    }).eq('id', req_id).execute()
+    # Conditional on status so exactly one of several racing cleaners wins
+    row = db.accept_request(req_id, g.current_user['id'])
+    if not row:
+        return jsonify({'error': 'Request is no longer pending'}), 409
+    
+    if dispatcher:
+        dispatcher.accepted(req_id, g.current_user['id'])
+    invalidate_stats()
+    publish_request_event('request.accepted', row)
     
     return jsonify({'message': 'Accepted'})
 
+@app.route('/api/requests/<int:req_id>/start', methods=['PUT'])
+@token_required
+def start_request(req_id):
+    if not db: return jsonify({'error': 'Database not configured'}), 500
+    if g.current_user['role'] != 'cleaner': return jsonify({'error': 'Unauthorized'}), 403
+    
+    # A job the dispatcher assigned; started jobs are never taken back
+    row = db.start_request(req_id, g.current_user['id'])
+    if not row:
+        return jsonify({'error': 'Request is not assigned to you'}), 409
+    
+    invalidate_stats()
+    publish_request_event('request.started', row)
+    
+    return jsonify({'message': 'Started'})
+
+@app.route('/api/cleaner/shift', methods=['GET'])
+@token_required
+def get_shift():
+    if not db: return jsonify({'error': 'Database not configured'}), 500
+    if g.current_user['role'] != 'cleaner': return jsonify({'error': 'Unauthorized'}), 403
+    
+    cleaner = db.get_cleaner(g.current_user['id'])
+    if not cleaner: return jsonify({'error': 'Cleaner not found'}), 404
+    return jsonify({'onShift': bool(cleaner.get('on_shift')), 'dispatchEnabled': dispatcher is not None})
+
+@app.route('/api/cleaner/shift', methods=['PUT'])
+@token_required
+def set_shift():
+    if not db: return jsonify({'error': 'Database not configured'}), 500
+    if g.current_user['role'] != 'cleaner': return jsonify({'error': 'Unauthorized'}), 403
+    
+    on_shift = (request.json or {}).get('onShift')
+    if not isinstance(on_shift, bool):
+        return jsonify({'error': 'onShift must be true or false'}), 400
+    
+    cleaner_id = g.current_user['id']
+    if not db.set_cleaner_shift(cleaner_id, on_shift):
+        return jsonify({'error': 'Cleaner not found'}), 404
+    
+    if not on_shift:
+        # Jobs handed out but not started go to the next cleaner
+        requeued = db.requeue_assigned(cleaner_id=cleaner_id)
+        for row in requeued:
+            publish_request_event('request.requeued', row)
+        if requeued:
+            invalidate_stats()
+    if dispatcher:
+        dispatcher.invalidate()
+        run_dispatch()
+    
+    return jsonify({'onShift': on_shift})
+
+def complete_in_progress(req_id, qr_data, completed_by=None):
+    # One conditional UPDATE: only the assigned cleaner, presenting the QR's
+    # request_id, can move an open (assigned or in-progress) job to
+    # completed.
+    # Returns the updated row, or None if the transition did not happen.
+    return db.complete_request(req_id, g.current_user['id'], qr_data, completed_by=completed_by)
+
+def release_cleaner(cleaner_id):
+    # The cleaner has a free slot again: give them the next queued request
+    if dispatcher:
+        dispatcher.released(cleaner_id)
+        run_dispatch()
+
+def completion_error(req_id, qr_data, invalid_qr_message):
+    # Only reached when the conditional update matched nothing; one extra
+    # read tells the client why.
+    state = db.get_request_state(req_id)
+    if not state:
+        return jsonify({'error': 'Request not found'}), 404
+    if state['request_id'] != qr_data:
+        return jsonify({'error': invalid_qr_message}), 400
+    return jsonify({'error': 'Request is not in progress for this cleaner'}), 409
+
 @app.route('/api/requests/<int:req_id>/complete', methods=['PUT'])
 @token_required
 def complete_request(req_id):
-    if not supabase: return jsonify({'error': 'Database not configured'}), 500
+    if not db: return jsonify({'error': 'Database not configured'}), 500
     if g.current_user['role'] != 'cleaner': return jsonify({'error': 'Unauthorized'}), 403
         
     data = request.json
     qr_data = data.get('qrData')
     
-    # Verify QR
-    res = supabase.table('requests').select('request_id').eq('id', req_id).execute()
-    if not res.data or res.data[0]['request_id'] != qr_data:
-        return jsonify({'error': 'Invalid QR Code'}), 400
-        
-    supabase.table('requests').update({
-        'status': 'completed',
-        'completed_at': datetime.datetime.utcnow().isoformat()
-    }).eq('id', req_id).execute()
+    # Verify QR and complete in one round trip
+    row = complete_in_progress(req_id, qr_data)
+    if not row:
+        return completion_error(req_id, qr_data, 'Invalid QR Code')
+    
+    invalidate_stats(g.current_user['id'])
+    publish_request_event('request.completed', row)
+    release_cleaner(g.current_user['id'])
     
     return jsonify({'message': 'Completed'})
 
 @app.route('/api/requests/<int:req_id>/rate', methods=['PUT'])
 @token_required
 def rate_request(req_id):
-    if not supabase: return jsonify({'error': 'Database not configured'}), 500
+    if not db: return jsonify({'error': 'Database not configured'}), 500
     if g.current_user['role'] != 'student': return jsonify({'error': 'Unauthorized'}), 403
         
     data = request.json
-    supabase.table('requests').update({
-        'rating': data.get('rating'),
-        'feedback': data.get('feedback')
-    }).eq('id', req_id).execute()
+    row = db.rate_request(req_id, data.get('rating'), data.get('feedback'))
+    invalidate_stats(row.get('cleaner_id') if row else None)
+    if row:
+        publish_request_event('request.rated', row)
     
     return jsonify({'message': 'Rating submitted'})
 
+def events_disabled():
+    return jsonify({'error': 'Event streams are disabled'}), 404
+
+@app.route('/api/events/token', methods=['POST'])
+@token_required
+def create_event_token():
+    if not SSE_ENABLED: return events_disabled()
+    # The caller's claims, for event_visible(), on a token that only
+    # /api/events accepts (decode_token rejects its audience)
+    claims = {k: v for k, v in g.current_user.items() if k not in ('exp', 'aud')}
+    token = jwt.encode(dict(
+        claims,
+        aud=EVENT_TOKEN_AUDIENCE,
+        exp=datetime.datetime.utcnow() + datetime.timedelta(seconds=EVENT_TOKEN_TTL_SECONDS)
+    ), app.secret_key, algorithm="HS256")
+    return jsonify({'token': token, 'expiresIn': EVENT_TOKEN_TTL_SECONDS})
+
+def decode_event_token(token):
+    try:
+        return jwt.decode(token, app.secret_key, algorithms=["HS256"], audience=EVENT_TOKEN_AUDIENCE)
+    except Exception:
+        return None
+
+@app.route('/api/events', methods=['GET'])
+def stream_events():
+    if not SSE_ENABLED: return events_disabled()
+    # Authorization header, or a stream token (POST /api/events/token) in
+    # ?token=; access tokens are never accepted in the URL
+    token = bearer_token()
+    if token:
+        user = decode_token(token)
+    else:
+        token = request.args.get('token')
+        if not token:
+            return jsonify({'message': 'Token is missing!'}), 401
+        user = decode_event_token(token)
+    if user is None:
+        return jsonify({'message': 'Token is invalid!'}), 403
+    
+    sub = event_bus.subscribe(lambda event: event_visible(user, event))
+    
+    def generate():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                event = sub.get(timeout=SSE_KEEPALIVE_SECONDS)
+                if event is None:
+                    yield ": keep-alive\n\n"
+                else:
+                    yield format_sse(event)
+        finally:
+            event_bus.unsubscribe(sub)
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 @app.route('/api/student/roommates', methods=['GET'])
 @token_required
 def get_roommates():
-    if not supabase: return jsonify({'error': 'Database not configured'}), 500
+    if not db: return jsonify({'error': 'Database not configured'}), 500
     if g.current_user['role'] != 'student': return jsonify([])
         
-    user_res = supabase.table('users').select('group_no').eq('id', g.current_user['id']).execute()
-    if not user_res.data: return jsonify([])
-    group_no = user_res.data[0]['group_no']
+    profile = current_student_profile()
+    if not profile: return jsonify([])
+    group_no = profile['group_no']
     
     if not group_no: return jsonify([])
     
-    res = supabase.table('users').select('name, email').eq('group_no', group_no).execute()
-    return jsonify(res.data)
+    return jsonify(db.list_group_members(group_no))
 
 @app.route('/api/admin/stats', methods=['GET'])
 @token_required
 def get_stats():
-    if not supabase: return jsonify({'error': 'Database not configured'}), 500
+    if not db: return jsonify({'error': 'Database not configured'}), 500
     if g.current_user['role'] != 'admin': return jsonify({'error': 'Unauthorized'}), 403
     
-    # 1. Basic Counts
-    total = supabase.table('requests').select('*', count='exact', head=True).execute().count
-    pending = supabase.table('requests').select('*', count='exact', head=True).eq('status', 'pending').execute().count
-    completed = supabase.table('requests').select('*', count='exact', head=True).eq('status', 'completed').execute().count
-    
-    # 2. Block-wise request counts
-    # Supabase doesn't support GROUP BY directly in the client easily for counts in one go without RPC.
-    # We'll fetch all requests (lightweight if we select only 'block') and aggregate in Python.
-    # Ideally use a SQL view or RPC for large datasets.
-    all_reqs = supabase.table('requests').select('block').execute()
-    block_counts = {}
-    for r in all_reqs.data:
-        b = r['block']
-        block_counts[b] = block_counts.get(b, 0) + 1
-        
-    # Format for chart: labels and data
-    blocks_chart = {
-        'labels': list(block_counts.keys()),
-        'data': list(block_counts.values())
-    }
+    return jsonify(result_cache.get_or_set(('admin_stats',), compute_stats))
+
+def compute_stats():
+    # Totals, status counts, block histogram and recent reviews in one
+    # backend call (admin_stats() SQL function on Supabase)
+    return format_admin_stats(db.admin_stats())
+
+# ----------------- ANALYTICS -----------------
+# /api/admin/analytics?from=&to=&granularity=hour|day reads only the
+# trigger-maintained rollup tables, so its cost depends on the number of
+# buckets in the range, not on the number of requests.
+ANALYTICS_GRANULARITIES = {
+    'hour': datetime.timedelta(hours=1),
+    'day': datetime.timedelta(days=1),
+}
+ANALYTICS_DEFAULT_SPAN = {'hour': 48, 'day': 30}
+ANALYTICS_MAX_BUCKETS = {'hour': 24 * 31, 'day': 366 * 2}
+
+def parse_utc(value):
+    # ISO date or datetime; aware values are converted to naive UTC
+    dt = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if dt.tzinfo:
+        dt = dt.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return dt
+
+def truncate(dt, granularity):
+    dt = dt.replace(minute=0, second=0, microsecond=0)
+    return dt.replace(hour=0) if granularity == 'day' else dt
+
+def analytics_range():
+    # Returns (granularity, start, end) on bucket boundaries, or None
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in ANALYTICS_GRANULARITIES:
+        return None
+    step = ANALYTICS_GRANULARITIES[granularity]
+    try:
+        end = parse_utc(request.args['to']) if request.args.get('to') else datetime.datetime.utcnow()
+        end = truncate(end, granularity) + step
+        if request.args.get('from'):
+            start = truncate(parse_utc(request.args['from']), granularity)
+        else:
+            start = end - step * ANALYTICS_DEFAULT_SPAN[granularity]
+    except ValueError:
+        return None
+    if start >= end or (end - start) / step > ANALYTICS_MAX_BUCKETS[granularity]:
+        return None
+    return granularity, start, end
+
+@app.route('/api/admin/analytics', methods=['GET'])
+@token_required
+def get_analytics():
+    if not db: return jsonify({'error': 'Database not configured'}), 500
+    if g.current_user['role'] != 'admin': return jsonify({'error': 'Unauthorized'}), 403
     
-    # 3. Recent Reviews
-    reviews_res = supabase.table('requests').select('rating, feedback, users(name), cleaners(name), completed_at').not_.is_('rating', 'null').order('completed_at', desc=True).limit(5).execute()
-    
-    reviews = []
-    for r in reviews_res.data:
-        reviews.append({
-            'student': r['users']['name'] if r.get('users') else 'Unknown',
-            'cleaner': r['cleaners']['name'] if r.get('cleaners') else 'Unknown',
-            'rating': r['rating'],
-            'feedback': r['feedback'],
-            'date': r['completed_at']
-        })
+    params = analytics_range()
+    if params is None:
+        return jsonify({'error': 'Invalid analytics range (granularity hour|day, from < to, '
+                                 f"at most {ANALYTICS_MAX_BUCKETS['hour']} hours or {ANALYTICS_MAX_BUCKETS['day']} days)"}), 400
+    
+    granularity, start, end = params
+    return jsonify(format_analytics(db.request_analytics(granularity, start, end), granularity, start, end))
+
+@app.route('/api/admin/cache', methods=['GET'])
+@token_required
+def get_cache_stats():
+    if g.current_user['role'] != 'admin': return jsonify({'error': 'Unauthorized'}), 403
+    return jsonify(result_cache.stats())
+
+@app.route('/api/admin/qr', methods=['GET'])
+@token_required
+def get_qr_stats():
+    # Pre-generated QR pool hit rate and the rendered-PNG cache
+    if g.current_user['role'] != 'admin': return jsonify({'error': 'Unauthorized'}), 403
+    return jsonify({'pool': qr_pool.stats(), 'cache': qr_cache.stats()})
+
+@app.route('/api/admin/queries', methods=['GET'])
+@token_required
+def get_query_stats():
+    # Per-query timings of the parallel dashboard reads (this process only)
+    if g.current_user['role'] != 'admin': return jsonify({'error': 'Unauthorized'}), 403
+    return jsonify(query_fanout.stats())
+
+@app.route('/api/admin/workers', methods=['GET'])
+@token_required
+def get_worker_stats():
+    # Queue depth and job latency of the bcrypt and QR scan process pools
+    if g.current_user['role'] != 'admin': return jsonify({'error': 'Unauthorized'}), 403
+    return jsonify({'bcrypt': hash_pool.stats(), 'scan': scan_pool.stats()})
+
+@app.route('/api/admin/dispatch', methods=['GET'])
+@token_required
+def get_dispatch_stats():
+    # Queue depth per block, cleaner loads and time to assignment (this process)
+    if g.current_user['role'] != 'admin': return jsonify({'error': 'Unauthorized'}), 403
+    if not dispatcher:
+        return jsonify({'enabled': False})
+    return jsonify(dict(dispatcher.stats(), enabled=True))
+
+@app.route('/api/admin/archive', methods=['GET'])
+@token_required
+def get_archive_stats():
+    # Archiving passes run by this process
+    if g.current_user['role'] != 'admin': return jsonify({'error': 'Unauthorized'}), 403
+    if not archiver:
+        return jsonify({'enabled': False})
+    return jsonify(dict(archiver.stats(), enabled=True))
+
+@app.route('/api/admin/archive', methods=['POST'])
+@token_required
+def run_archive():
+    # Archive everything due now, in batches (ARCHIVE_AFTER_DAYS applies)
+    if not db: return jsonify({'error': 'Database not configured'}), 500
+    if g.current_user['role'] != 'admin': return jsonify({'error': 'Unauthorized'}), 403
+    if not archiver:
+        return jsonify({'error': 'Archiving is disabled'}), 400
     
+    archived = archiver.run()
+    return jsonify({'message': 'Archived', 'archived': archived})
+
+@app.route('/api/admin/http', methods=['GET'])
+@token_required
+def get_http_stats():
+    # Supabase connection reuse and setup time per route (this process only)
+    if g.current_user['role'] != 'admin': return jsonify({'error': 'Unauthorized'}), 403
     return jsonify({
-        'totalRequests': total,
-        'pendingRequests': pending,
-        'completedRequests': completed,
-        'blockStats': blocks_chart,
-        'recentReviews': reviews
+        'backend': db.name if db else None,
+        'pool': pool_settings(),
+        'routes': connection_stats.snapshot()
     })
 
 @app.route('/api/admin/cleaners', methods=['GET'])
 @token_required
 def get_cleaners():
-    if not supabase: return jsonify({'error': 'Database not configured'}), 500
+    if not db: return jsonify({'error': 'Database not configured'}), 500
     if g.current_user['role'] != 'admin': return jsonify({'error': 'Unauthorized'}), 403
     
-    res = supabase.table('cleaners').select('*').order('created_at', desc=True).execute()
-    return jsonify(res.data)
+    fields = requested_fields('cleaners')
+    if fields is None: return jsonify({'error': 'Invalid fields'}), 400
+    
+    return jsonify(db.list_cleaners(fields))
 
 @app.route('/api/admin/cleaners', methods=['POST'])
 @token_required
 def add_cleaner():
-    if not supabase: return jsonify({'error': 'Database not configured'}), 500
+    if not db: return jsonify({'error': 'Database not configured'}), 500
     if g.current_user['role'] != 'admin': return jsonify({'error': 'Unauthorized'}), 403
     
     data = request.json
@@ -658,91 +1329,103 @@ def add_cleaner():
     blocks_json = json.dumps(blocks) if blocks else '[]'
     
     try:
-        supabase.table('cleaners').insert({
+        db.create_cleaner({
             'employee_id': emp_id,
             'name': name,
             'password': hashed,
             'assigned_blocks': blocks_json,
             'is_active': True
-        }).execute()
-        return jsonify({'message': 'Cleaner added successfully'})
+        })
     except Exception as e:
         return jsonify({'error': str(e)}), 400
+    
+    if dispatcher:
+        dispatcher.invalidate()
+        run_dispatch()
+    return jsonify({'message': 'Cleaner added successfully'})
+
+@app.route('/api/admin/rollups/rebuild', methods=['POST'])
+@token_required
+def rebuild_rollups():
+    # Reconciliation: recompute cleaner and analytics rollups from requests
+    if not db: return jsonify({'error': 'Database not configured'}), 500
+    if g.current_user['role'] != 'admin': return jsonify({'error': 'Unauthorized'}), 403
+    
+    cleaners = db.rebuild_cleaner_rollups()
+    rows = db.rebuild_request_rollups()
+    result_cache.invalidate('cleaner_stats')
+    return jsonify({'message': 'Rollups rebuilt', 'cleaners': cleaners, 'requestRollupRows': rows})
 
 @app.route('/api/admin/cleaners/<int:id>/stats', methods=['GET'])
 @token_required
 def get_cleaner_stats(id):
-    if not supabase: return jsonify({'error': 'Database not configured'}), 500
+    if not db: return jsonify({'error': 'Database not configured'}), 500
     if g.current_user['role'] != 'admin': return jsonify({'error': 'Unauthorized'}), 403
     
-    # 1. Get Cleaner Details
-    cleaner_res = supabase.table('cleaners').select('*').eq('id', id).execute()
-    if not cleaner_res.data:
-        return jsonify({'error': 'Cleaner not found'}), 404
-    cleaner = cleaner_res.data[0]
-    
-    # 2. Get Completed Requests Count
-    completed_res = supabase.table('requests').select('*', count='exact', head=True).eq('cleaner_id', id).eq('status', 'completed').execute()
-    total_cleaned = completed_res.count
+    found, stats = result_cache.get(('cleaner_stats', id))
+    if not found:
+        stats = compute_cleaner_stats(id)
+        if stats is None:
+            return jsonify({'error': 'Cleaner not found'}), 404
+        result_cache.set(('cleaner_stats', id), stats)
     
-    # 3. Calculate Average Rating
-    # Fetch ratings (not null)
-    ratings_res = supabase.table('requests').select('rating').eq('cleaner_id', id).not_.is_('rating', 'null').execute()
-    ratings = [r['rating'] for r in ratings_res.data]
-    avg_rating = sum(ratings) / len(ratings) if ratings else 0
+    return jsonify(stats)
+
+def compute_cleaner_stats(id):
+    # Four independent reads, sent in parallel: cleaner details, the
+    # trigger-maintained rollup counters and the last 5 jobs with student
+    # names, from requests and (topping up a short list) the archive
+    res = db.gather({
+        'cleaner_stats.cleaner': lambda: db.get_cleaner(id),
+        'cleaner_stats.rollup': lambda: db.get_cleaner_rollup(id),
+        'cleaner_stats.history': lambda: db.recent_history(id, limit=5),
+        'cleaner_stats.archived_history': lambda: db.recent_history(id, limit=5, archived=True),
+    })
+    cleaner = res['cleaner_stats.cleaner']
+    if not cleaner:
+        return None
     
-    # 4. Recent History (Last 5 jobs) with student names
-    # Note: Supabase-py join syntax: select('*, users(name)')
-    history_res = supabase.table('requests').select('id, type, completed_at, rating, users(name, room_number)').eq('cleaner_id', id).eq('status', 'completed').order('completed_at', desc=True).limit(5).execute()
+    rollup = res['cleaner_stats.rollup']
+    rating_count = rollup['rating_count']
+    avg_rating = rollup['rating_sum'] / rating_count if rating_count else 0
     
     history = []
-    for h in history_res.data:
+    for h in (res['cleaner_stats.history'] + res['cleaner_stats.archived_history'])[:5]:
         history.append({
             'id': h['id'],
             'type': h['type'],
             'date': h['completed_at'],
             'rating': h['rating'],
-            'student': h['users']['name'] if h.get('users') else 'Unknown',
-            'room': h['users']['room_number'] if h.get('users') else 'Unknown',
+            'student': h.get('student_name') or 'Unknown',
+            'room': h.get('room_number') or 'Unknown',
         })
         
-    return jsonify({
+    return {
         'cleaner': {
             'name': cleaner['name'],
             'employeeId': cleaner['employee_id'],
             'blocks': json.loads(cleaner['assigned_blocks']) if cleaner.get('assigned_blocks') else []
         },
         'stats': {
-            'totalCleaned': total_cleaned,
+            'totalCleaned': rollup['completed_count'],
             'avgRating': round(avg_rating, 1),
-            'ratingCount': len(ratings)
+            'ratingCount': rating_count,
+            'lastCompletedAt': rollup['last_completed_at']
         },
         'history': history
-    })
-
-# Try imports for QR decoding
-HAS_CV2 = False
-HAS_PYZBAR = False
-
-try:
-    import cv2
-    import numpy as np
-    HAS_CV2 = True
-except ImportError as e:
-    print(f"Warning: OpenCV (cv2) not found: {e}")
-
-try:
-    from pyzbar.pyzbar import decode
-    HAS_PYZBAR = True
-except Exception as e:
-    print(f"Warning: Pyzbar not found or DLL missing: {e}")
+    }
 
 @app.route('/api/requests/<id>/complete-scan', methods=['PUT'])
 @token_required
 def complete_job_scan(id):
-    if not supabase: return jsonify({'error': 'Database not configured'}), 500
+    if not db: return jsonify({'error': 'Database not configured'}), 500
     if g.current_user['role'] != 'cleaner': return jsonify({'error': 'Unauthorized'}), 403
 
+    # Enforced while the body is read: a larger Content-Length is refused
+    # up front, a chunked body as soon as it passes the limit (413). The
+    # per-request setter needs Flask 3.1 (requirements.txt).
+    request.max_content_length = SCAN_MAX_UPLOAD_BYTES + UPLOAD_OVERHEAD_BYTES
+
     if 'qr_image' not in request.files:
         return jsonify({'error': 'No image uploaded'}), 400
         
@@ -750,82 +1433,55 @@ def complete_job_scan(id):
     if file.filename == '':
         return jsonify({'error': 'No selected file'}), 400
 
-    if not HAS_CV2 and not HAS_PYZBAR:
-        return jsonify({'error': 'Server missing QR libraries'}), 500
+    if not load_decoders():
+        # Uploads are loaded with OpenCV whether or not pyzbar is installed
+        # (imported here on the first scan, see scanner.py)
+        return jsonify({'error': 'Server missing OpenCV for image processing'}), 500
 
     try:
-        # Read image to numpy array
-        filestr = file.read()
-        npimg = np.frombuffer(filestr, np.uint8)
-        
-        if HAS_CV2:
-            img = cv2.imdecode(npimg, cv2.IMREAD_COLOR)
-        else:
-            # Should not happen as we need cv2 to decode image to array for pyzbar usually, 
-            # unless we use PIL. But we assumed cv2/numpy for image loading.
-            # If HAS_CV2 is false, we can't easily load the image with this code.
-            # So fallback: we really need cv2 for image loading in this implementation.
-            return jsonify({'error': 'Server missing OpenCV for image processing'}), 500
-        
-        qr_data = None
-        
-        # 1. Try Pyzbar (Robust)
-        if HAS_PYZBAR:
-            try:
-                decoded_objects = decode(img)
-                if decoded_objects:
-                    qr_data = decoded_objects[0].data.decode('utf-8')
-            except Exception as e:
-                print(f"Pyzbar scan error: {e}")
-        
-        # 2. Fallback to CV2 (Native)
-        if not qr_data and HAS_CV2:
-            try:
-                detector = cv2.QRCodeDetector()
-                data, _, _ = detector.detectAndDecode(img)
-                if data:
-                    qr_data = data
-            except Exception as e:
-                print(f"CV2 scan error: {e}")
+        try:
+            qr_data, _ = decode_scan(read_upload(file.stream))
+        except UploadRejected as e:
+            return jsonify({'error': str(e)}), e.status
+        except ValueError:
+            return jsonify({'error': 'Uploaded file is not a readable image'}), 400
+        except PoolFull:
+            # Scans already queued on this worker: ask the app to retry
+            resp = jsonify({'error': 'Too many scans in progress, please retry'})
+            resp.headers['Retry-After'] = '1'
+            return resp, 429
         
         if not qr_data:
             return jsonify({'error': 'No QR code found in image'}), 400
             
-        # Verify
-        req_res = supabase.table('requests').select('*').eq('id', id).execute()
-        if not req_res.data:
-            return jsonify({'error': 'Request not found'}), 404
-            
-        request_obj = req_res.data[0]
-        
+        # Verify and complete in one conditional update.
         # The QR code contains the 'request_id' field (e.g., REQ-XXXX)
-        if qr_data != request_obj['request_id']:
-             return jsonify({'error': f'Invalid QR Code Scanned: {qr_data}'}), 400
-             
-        if request_obj['status'] != 'in_progress':
-             return jsonify({'error': 'Request is not in progress'}), 400
-             
-        # valid -> complete
-        supabase.table('requests').update({
-            'status': 'completed',
-            'completed_at': datetime.datetime.utcnow().isoformat(),
-            'completed_by': g.current_user['id']
-        }).eq('id', id).execute()
+        row = complete_in_progress(id, qr_data, completed_by=g.current_user['id'])
+        if not row:
+            return completion_error(id, qr_data, f'Invalid QR Code Scanned: {qr_data}')
+        
+        invalidate_stats(g.current_user['id'])
+        publish_request_event('request.completed', row)
+        release_cleaner(g.current_user['id'])
         
         return jsonify({'message': 'Job verified and completed'})
         
+    except PoolOverloaded:
+        raise
     except Exception as e:
         print(f"QR Scan Error: {e}")
         return jsonify({'error': f'Failed to process image: {str(e)}'}), 500
 
 if __name__ == '__main__':
-    if not SUPABASE_URL:
+    if not db:
         print("""
         ========================= IMPROTANT =========================
-        Supabase URL/Key missing! 
+        No database available!
         Please create a .env file with:
         SUPABASE_URL=...
         SUPABASE_KEY=...
+        or run against a local file with STORAGE_BACKEND=sqlite
+        (SQLITE_PATH=cleanvit.db by default).
         =============================================================
         """)
     app.run(debug=True, port=5000)
@@ -0,0 +1,108 @@
+import time
+import datetime
+import threading
+
+# ----------------- ARCHIVAL -----------------
+# Completed requests older than after_days are moved from requests to
+# requests_archive, oldest first, batch_size rows per transaction
+# (Storage.archive_requests). requests then holds the active work and the
+# recent history, so the pending list, the dispatcher and the hot indexes
+# stay the same size however long the app runs.
+#
+# History listings read the archive when asked (?include_archived=1), as the
+# student and cleaner pages do, so archived jobs stay in their history.
+# Admin stats and the rollup rebuilds always read both tables. The rollups
+# themselves are not changed by a move.
+#
+# maybe_run() is called on every request. Once per interval_seconds per
+# process, starting one interval after startup (so short-lived workers
+# never archive), it starts a pass on a background thread.
+# A pass stops after max_batches, so a large backlog is worked off over
+# several passes instead of holding the write lock for long.
+# archive_requests.py runs a full pass from cron.
+
+class Archiver:
+    def __init__(self, db, after_days=30, batch_size=500, interval_seconds=3600, max_batches=20,
+                 clock=time.time):
+        self.db = db
+        self.after_days = after_days
+        self.batch_size = batch_size
+        self.interval_seconds = interval_seconds
+        self.max_batches = max_batches
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._running = False
+        self._started_at = clock()
+        self.passes = 0
+        self.archived = 0
+        self.failures = 0
+        self.last_pass = None
+
+    def cutoff(self):
+        # Naive UTC, like the storage layer's timestamps
+        now = datetime.datetime.fromtimestamp(self.clock(), datetime.timezone.utc).replace(tzinfo=None)
+        return now - datetime.timedelta(days=self.after_days)
+
+    def run(self, max_batches=None):
+        # One pass: batches until one comes back short (or max_batches);
+        # returns the number of requests moved
+        before = self.cutoff()
+        moved = batches = 0
+        started = time.perf_counter()
+        while max_batches is None or batches < max_batches:
+            n = self.db.archive_requests(before, self.batch_size)
+            moved += n
+            batches += 1
+            if n < self.batch_size:
+                break
+        with self._lock:
+            self.passes += 1
+            self.archived += moved
+            self.last_pass = {
+                'before': before.isoformat(),
+                'archived': moved,
+                'batches': batches,
+                'ms': round((time.perf_counter() - started) * 1000, 1)
+            }
+        return moved
+
+    def maybe_run(self):
+        # True if a background pass was started
+        now = self.clock()
+        with self._lock:
+            if self._running or now - self._started_at < self.interval_seconds:
+                return False
+            self._running = True
+            self._started_at = now
+        threading.Thread(target=self._background, name='archiver', daemon=True).start()
+        return True
+
+    def _background(self):
+        try:
+            self.run(self.max_batches)
+        except Exception as e:
+            # Retried at the next interval
+            print(f"Archiving failed: {e}")
+            with self._lock:
+                self.failures += 1
+        finally:
+            with self._lock:
+                self._running = False
+
+    def reset(self):
+        # After a fork: the parent's pass (if any) is not running here
+        self._lock = threading.Lock()
+        self._running = False
+
+    def stats(self):
+        with self._lock:
+            return {
+                'afterDays': self.after_days,
+                'batchSize': self.batch_size,
+                'intervalSeconds': self.interval_seconds,
+                'running': self._running,
+                'passes': self.passes,
+                'archived': self.archived,
+                'failures': self.failures,
+                'lastPass': self.last_pass
+            }
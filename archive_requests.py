@@ -0,0 +1,26 @@
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from storage import create_storage
+from archive import Archiver
+
+# Archival job: move every request completed more than ARCHIVE_AFTER_DAYS
+# (default 30) days ago to requests_archive, ARCHIVE_BATCH_SIZE rows per
+# transaction. Safe to run while the app is serving, e.g. nightly from cron
+# on deployments where the app's own background passes are off
+# (ARCHIVE_ENABLED=0) or never run (serverless).
+#   python archive_requests.py
+
+db = create_storage()
+if not db:
+    print("Database not configured!")
+    exit(1)
+
+archiver = Archiver(db, after_days=float(os.getenv('ARCHIVE_AFTER_DAYS', 30)),
+                    batch_size=int(os.getenv('ARCHIVE_BATCH_SIZE', 500)))
+n = archiver.run()
+print(f"Archived {n} requests completed before {archiver.cutoff():%Y-%m-%d %H:%M} UTC "
+      f"in {archiver.last_pass['batches']} batches ({db.name})")
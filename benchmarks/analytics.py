@@ -0,0 +1,98 @@
+import os
+import sys
+import time
+import random
+import argparse
+import datetime
+import tempfile
+
+from seed import seed, percentile
+from cleaner_rollups import churn
+from stats import format_analytics
+from storage.sqlite_backend import SQLiteStorage
+
+# /api/admin/analytics over about a year of requests (5 minutes apart): the
+# rollup-table read the endpoint uses versus aggregating the raw requests
+# table. Then checks that trigger-maintained rollups match a rebuild from
+# scratch after a random mix of writes (exits 1 on any mismatch).
+#
+#   python benchmarks/analytics.py --requests 105000
+
+RAW_DAILY = " UNION ALL ".join(f"""
+    SELECT strftime('%Y-%m-%d 00:00:00', created_at) AS bucket, '{dim}' AS dimension, {dim} AS value, COUNT(*) AS count
+    FROM requests WHERE created_at >= ? AND created_at < ?
+    GROUP BY 1, 3
+""" for dim in ('status', 'block', 'type'))
+
+def timed(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - t0) * 1000)
+    return percentile(timings, 50), percentile(timings, 99)
+
+def snapshot(db, table, key):
+    return {tuple(r[k] for k in key): r['count'] for r in db.all(f"SELECT * FROM {table} WHERE count <> 0")}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=105000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--ops', type=int, default=3000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'analytics.db')
+        seed(path, n_requests=args.requests).close()
+        t0 = time.perf_counter()
+        db = SQLiteStorage(path)
+        db.conn()
+        print(f"{args.requests} requests seeded; initial rollup backfill {time.perf_counter() - t0:.1f}s\n")
+
+        start = datetime.datetime(2025, 1, 1)
+        year = start + datetime.timedelta(days=365)
+        week = start + datetime.timedelta(days=7)
+        raw_range = ('2025-01-01 00:00:00', '2026-01-01 00:00:00') * 3
+
+        def analytics(granularity, end):
+            return lambda: format_analytics(db.request_analytics(granularity, start, end), granularity, start, end)
+
+        cases = [
+            ('day, 1 year (rollups)', analytics('day', year)),
+            ('hour, 7 days (rollups)', analytics('hour', week)),
+            ('hour, 31 days (rollups)', analytics('hour', start + datetime.timedelta(days=31))),
+            ('day, 1 year (raw GROUP BY)', lambda: db.all(RAW_DAILY, raw_range)),
+        ]
+        print(f"{'query':<30}{'p50 ms':>10}{'p99 ms':>10}")
+        for name, fn in cases:
+            p50, p99 = timed(fn, args.repeat)
+            print(f"{name:<30}{p50:>10.2f}{p99:>10.2f}")
+
+        result = cases[0][1]()
+        print(f"\nyear totals: {result['totals']['requests']} requests, "
+              f"accept p50 {result['latency']['accept']['p50']}s, p99 {result['latency']['accept']['p99']}s, "
+              f"complete p50 {result['latency']['complete']['p50']}s")
+
+        rng = random.Random(11)
+        write_timings = []
+        pending = [r['id'] for r in db.all("SELECT id FROM requests WHERE status = 'pending' LIMIT 500")]
+        for req_id in pending:
+            t0 = time.perf_counter()
+            db.accept_request(req_id, rng.randint(1, 20))
+            write_timings.append((time.perf_counter() - t0) * 1000)
+        print(f"accept with rollup triggers: p50 {percentile(write_timings, 50):.3f}ms, "
+              f"p99 {percentile(write_timings, 99):.3f}ms")
+
+        churn(db, rng, args.ops)
+        tables = [('request_rollups', ('granularity', 'bucket', 'dimension', 'value')),
+                  ('latency_rollups', ('granularity', 'bucket', 'metric', 'bin'))]
+        maintained = [snapshot(db, t, k) for t, k in tables]
+        db.rebuild_request_rollups()
+        rebuilt = [snapshot(db, t, k) for t, k in tables]
+        drift = sum(len(set(m.items()) ^ set(r.items())) for m, r in zip(maintained, rebuilt))
+        print(f"{args.ops} random writes: {drift} rollup rows differ from a full rebuild")
+        sys.exit(1 if drift else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+from seed import seed, percentile
+from storage.sqlite_backend import SQLiteStorage
+from archive import Archiver
+
+# Hot-path reads and writes on a long-lived requests table, before and
+# after the completed history is moved to requests_archive. Checks that the
+# move changes nothing visible: the rollups, the admin stats, and a
+# student's and a cleaner's full history paged with include_archived
+# (exits 1 on any mismatch).
+#
+#   python benchmarks/archive_hot_path.py --requests 200000 --after-days 30
+
+# app.FIELD_SETS, without importing the app (and its database connection)
+STUDENT_FIELDS = ('id', 'request_id', 'type', 'instructions', 'status', 'created_at',
+                  'accepted_at', 'completed_at', 'rating', 'feedback')
+CLEANER_FIELDS = ('id', 'block', 'room_number', 'type', 'instructions', 'status',
+                  'accepted_at', 'completed_at', 'rating', 'feedback', 'student_name')
+PENDING_FIELDS = ('id', 'block', 'room_number', 'type', 'instructions', 'created_at', 'student_name')
+
+def timed(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - t0) * 1000)
+    return percentile(timings, 50)
+
+def history(list_page, column):
+    # Every row, paged the way the API pages them
+    rows, cursor = [], None
+    while True:
+        page = list_page(cursor)
+        rows.extend(page)
+        if len(page) < 50:
+            return rows
+        cursor = (page[-1][column], page[-1]['id'])
+
+def snapshot(db, group_no, cleaner_id):
+    # Rollup rows counted down to zero are equivalent to no row
+    return {
+        'cleaner_rollups': db.all("SELECT * FROM cleaner_rollups ORDER BY cleaner_id"),
+        'request_rollups': db.all("SELECT * FROM request_rollups WHERE count <> 0 ORDER BY 1, 2, 3, 4"),
+        'admin_stats': db.admin_stats(),
+        'student_history': history(lambda c: db.list_group_requests(
+            STUDENT_FIELDS, group_no=group_no, cursor=c, include_archived=True), 'created_at'),
+        'cleaner_history': history(lambda c: db.list_cleaner_requests(
+            CLEANER_FIELDS, cleaner_id, cursor=c, include_archived=True), 'accepted_at'),
+    }
+
+def measure(db, group_no, repeat):
+    # The requests created here are deleted again before returning
+    seq = iter(range(10 ** 9))
+    results = {
+        'pending page': timed(lambda: db.list_pending_requests(PENDING_FIELDS, ['A', 'B', 'C'], None, 51), repeat),
+        'dispatch queue': timed(db.list_dispatch_queue, repeat),
+        'cleaner loads': timed(db.list_cleaner_loads, repeat),
+        'cleaner jobs page': timed(lambda: db.list_cleaner_requests(CLEANER_FIELDS, 1, None, 51), repeat),
+        'student page': timed(lambda: db.list_group_requests(STUDENT_FIELDS, group_no=group_no, limit=51), repeat),
+        'create request': timed(lambda: db.create_request({
+            'request_id': f'HOT-{next(seq):08X}', 'user_id': 1, 'block': 'A', 'room_number': '100',
+            'group_no': group_no, 'type': 'Sweeping', 'status': 'pending'}), repeat),
+        'admin stats': timed(db.admin_stats, max(1, repeat // 10)),
+    }
+    db.conn().execute("DELETE FROM requests WHERE request_id LIKE 'HOT-%'")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=200000)
+    parser.add_argument('--after-days', type=float, default=30)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'archive.db')
+        seed(path, n_requests=args.requests).close()
+        db = SQLiteStorage(path)
+        group_no = db.one("SELECT group_no FROM users WHERE id = 1")['group_no']
+        count = lambda table: db.one(f"SELECT COUNT(*) AS n FROM {table}")['n']
+
+        expected = snapshot(db, group_no, 1)
+        before = measure(db, group_no, args.repeat)
+        hot_before = count('requests')
+
+        archiver = Archiver(db, after_days=args.after_days, batch_size=args.batch_size)
+        t0 = time.perf_counter()
+        moved = archiver.run()
+        elapsed = time.perf_counter() - t0
+        print(f"Archived {moved} of {hot_before} requests in {archiver.last_pass['batches']} batches, "
+              f"{elapsed:.1f} s ({moved / elapsed if elapsed else 0:.0f} rows/s); "
+              f"requests now {count('requests')}, requests_archive {count('requests_archive')}\n")
+
+        after = measure(db, group_no, args.repeat)
+
+        print(f"{'median ms':<20}{'before':>10}{'after':>10}")
+        for name in before:
+            print(f"{name:<20}{before[name]:>10.3f}{after[name]:>10.3f}")
+
+        actual = snapshot(db, group_no, 1)
+        failures = [name for name in expected if expected[name] != actual[name]]
+        for name in failures:
+            print(f"MISMATCH {name}")
+        print(f"\n{'OK' if not failures else 'FAILED'}: rollups, stats and histories "
+              f"{'unchanged' if not failures else 'differ'} after archiving")
+        return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
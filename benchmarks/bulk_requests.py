@@ -0,0 +1,84 @@
+import os
+import time
+import datetime
+import argparse
+import tempfile
+
+import jwt
+
+from seed import seed
+
+# Creating one request per room group for --groups groups: the existing
+# per-request path (profile lookup + insert, once per request) versus
+# POST /api/requests/bulk (one group lookup + one multi-row insert). Storage
+# calls are counted and each one is delayed by --rtt-ms to stand in for the
+# network round trip to Supabase.
+#
+#   python benchmarks/bulk_requests.py --groups 500 --rtt-ms 20
+
+class RoundTrips:
+    # Wraps a Storage, counting (and delaying) every method call
+    def __init__(self, db, rtt_ms):
+        self._db = db
+        self._rtt = rtt_ms / 1000
+        self.calls = 0
+
+    def __getattr__(self, name):
+        attr = getattr(self._db, name)
+        if not callable(attr) or name.startswith('_') or name in ('conn', 'one', 'all', 'insert'):
+            return attr
+
+        def call(*args, **kwargs):
+            self.calls += 1
+            time.sleep(self._rtt)
+            return attr(*args, **kwargs)
+        return call
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--groups', type=int, default=500)
+    parser.add_argument('--rtt-ms', type=float, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bulk.db')
+        # Auto-assignment would add its own storage calls to the count
+        os.environ.update(STORAGE_BACKEND='sqlite', SQLITE_PATH=path, DISPATCH_ENABLED='0', ARCHIVE_ENABLED='0')
+        seed(path, n_requests=0).close()
+
+        import app as cleanvit
+        from qr import new_request_id
+        db = RoundTrips(cleanvit.db, args.rtt_ms)
+        cleanvit.db = db
+
+        users = cleanvit.db._db.all("SELECT MIN(id) AS id, group_no FROM users GROUP BY group_no ORDER BY group_no")
+        groups = [u['group_no'] for u in users][:args.groups]
+        owners = {u['group_no']: u['id'] for u in users}
+        print(f"{len(groups)} room groups, {args.rtt_ms:g} ms per storage round trip\n")
+
+        t0 = time.perf_counter()
+        for group_no in groups:
+            user = db.get_user_profile(owners[group_no])
+            db.create_request({'request_id': new_request_id(), 'user_id': user['id'], 'block': user['block'],
+                               'room_number': user['room_number'], 'group_no': group_no,
+                               'type': 'Sweeping', 'instructions': None, 'status': 'pending'})
+        single_ms = (time.perf_counter() - t0) * 1000
+        single_calls, db.calls = db.calls, 0
+
+        token = jwt.encode({'id': 1, 'role': 'admin',
+                            'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=1)},
+                           cleanvit.app.config['SECRET_KEY'], algorithm='HS256')
+        client = cleanvit.app.test_client()
+        t0 = time.perf_counter()
+        resp = client.post('/api/requests/bulk', headers={'Authorization': f'Bearer {token}'},
+                           json={'type': 'Sweeping', 'items': [{'groupNo': g} for g in groups]})
+        bulk_ms = (time.perf_counter() - t0) * 1000
+        body = resp.get_json()
+
+        print(f"{'path':<22}{'round trips':>12}{'total ms':>10}")
+        print(f"{'one by one':<22}{single_calls:>12}{single_ms:>10.0f}")
+        print(f"{'POST /requests/bulk':<22}{db.calls:>12}{bulk_ms:>10.0f}")
+        print(f"\nbulk: {body['created']} created, {body['failed']} failed (HTTP {resp.status_code})")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+from seed import seed, percentile
+from storage.sqlite_backend import SQLiteStorage
+
+# Cost of the cleaner stats counters as a cleaner's history grows: the old
+# exact count + full ratings scan versus one cleaner_rollups row. Then runs a
+# random mix of accepts, completions, ratings and reassignments through the
+# storage layer and checks the trigger-maintained rollups against a rebuild
+# from scratch (exits 1 on any mismatch).
+#
+#   python benchmarks/cleaner_rollups.py --sizes 1000 10000 100000
+
+LEGACY_COUNT = "SELECT COUNT(*) AS n FROM requests WHERE cleaner_id = ? AND status = 'completed'"
+LEGACY_RATINGS = "SELECT rating FROM requests WHERE cleaner_id = ? AND rating IS NOT NULL"
+
+def legacy(db, cleaner_id):
+    n = db.one(LEGACY_COUNT, (cleaner_id,))['n']
+    ratings = [r['rating'] for r in db.all(LEGACY_RATINGS, (cleaner_id,))]
+    return n, sum(ratings), len(ratings)
+
+def timed(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - t0) * 1000)
+    return percentile(timings, 50)
+
+def snapshot(db):
+    # Rows decremented to zero are equivalent to no row
+    return {r['cleaner_id']: (r['completed_count'], r['rating_sum'], r['rating_count'])
+            for r in db.all("SELECT * FROM cleaner_rollups")
+            if r['completed_count'] or r['rating_count']}
+
+def churn(db, rng, n_ops):
+    pending = [r['id'] for r in db.all("SELECT id FROM requests WHERE status = 'pending'")]
+    active = [(r['id'], r['cleaner_id'], r['request_id'])
+              for r in db.all("SELECT id, cleaner_id, request_id FROM requests WHERE status = 'in_progress'")]
+    for _ in range(n_ops):
+        op = rng.random()
+        if op < 0.3 and pending:
+            req_id = pending.pop()
+            row = db.accept_request(req_id, rng.randint(1, 20))
+            active.append((row['id'], row['cleaner_id'], row['request_id']))
+        elif op < 0.6 and active:
+            req_id, cleaner_id, request_id = active.pop(rng.randrange(len(active)))
+            db.complete_request(req_id, cleaner_id, request_id)
+        elif op < 0.9:
+            req_id = db.one("SELECT id FROM requests WHERE status = 'completed' ORDER BY RANDOM() LIMIT 1")['id']
+            db.rate_request(req_id, rng.randint(1, 5), 'churn')
+        else:
+            # Admin reassignment of a finished job
+            db.conn().execute("UPDATE requests SET cleaner_id = ? WHERE id = ?",
+                              (rng.randint(1, 20), rng.randint(1, 1000)))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=30)
+    parser.add_argument('--ops', type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'requests':>10}{'jobs/cleaner':>14}{'count+scan ms':>15}{'rollup ms':>11}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            path = os.path.join(tmp, f'rollups-{size}.db')
+            seed(path, n_requests=size).close()
+            db = SQLiteStorage(path)
+            assert legacy(db, 1) == tuple(db.get_cleaner_rollup(1)[k] for k in
+                                          ('completed_count', 'rating_sum', 'rating_count'))
+            before = timed(lambda: legacy(db, 1), args.repeat)
+            after = timed(lambda: db.get_cleaner_rollup(1), args.repeat)
+            print(f"{size:>10}{size // 20:>14}{before:>15.3f}{after:>11.3f}")
+
+        db = SQLiteStorage(os.path.join(tmp, f'rollups-{args.sizes[0]}.db'))
+        churn(db, random.Random(7), args.ops)
+        maintained = snapshot(db)
+        db.rebuild_cleaner_rollups()
+        rebuilt = snapshot(db)
+        drift = {k for k in maintained.keys() | rebuilt.keys() if maintained.get(k) != rebuilt.get(k)}
+        print(f"\n{args.ops} random writes: {len(drift)} cleaners differ from a full rebuild")
+        sys.exit(1 if drift else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+import os
+import sys
+import json
+import time
+import argparse
+import datetime
+import tempfile
+import subprocess
+
+# Only stdlib here: anything the app imports, imported before it in the
+# child, would not be counted
+from seed import seed, percentile
+
+# Cold-start check: in a fresh interpreter per run, times `import app` and
+# the first request to one route, and records which of the lazily loaded
+# libraries (OpenCV, numpy, pyzbar, qrcode/Pillow, supabase-py, httpx) are
+# in sys.modules afterwards. Exits 1 if the app imports any of them at
+# startup, if a route loads one it has no use for, if a route fails, or if
+# the median import / first-request time is over --max-import-ms /
+# --max-first-request-ms. A Supabase run (unreachable URL) checks that
+# startup neither imports supabase-py nor connects.
+#
+#   python benchmarks/cold_start.py --runs 5 --max-import-ms 400
+#   python benchmarks/cold_start.py --env QR_POOL_SIZE=0 --env SCAN_POOL_SIZE=0
+
+LAZY_MODULES = ('cv2', 'numpy', 'pyzbar', 'qrcode', 'PIL', 'supabase', 'httpx')
+
+# name: (method, path, auth, body, lazy modules the route may load)
+ROUTES = {
+    'index': ('GET', '/', None, None, ()),
+    'config': ('GET', '/api/config', None, None, ()),
+    'student login': ('POST', '/api/auth/student/login', None,
+                      {'email': 'cold@vitstudent.ac.in', 'password': 'secret123'}, ()),
+    'list requests': ('GET', '/api/requests', 'student', None, ()),
+    # The QR pool's refill thread renders (and imports qrcode) in the background
+    'create request': ('POST', '/api/requests', 'student', {'type': 'Sweeping'}, ('qrcode', 'PIL')),
+    'qr.png': ('GET', '/api/requests/REQ-C0FFEE00/qr.png', None, None, ('qrcode', 'PIL')),
+    'complete-scan': ('PUT', '/api/requests/{job_id}/complete-scan', 'cleaner', 'image',
+                      ('cv2', 'numpy', 'pyzbar')),
+}
+
+def loaded():
+    return sorted(m for m in LAZY_MODULES if m in sys.modules)
+
+def child(args):
+    # One fresh process: import the app, then a single request
+    t0 = time.perf_counter()
+    import app as cleanvit
+    import_ms = (time.perf_counter() - t0) * 1000
+    at_import = loaded()
+
+    spec = json.loads(args.child)
+    method, path, auth, body, _ = ROUTES[spec['route']]
+    headers = {}
+    if auth:
+        claims = dict(spec['claims'][auth], exp=datetime.datetime.utcnow() + datetime.timedelta(hours=1))
+        headers['Authorization'] = 'Bearer ' + cleanvit.jwt.encode(claims, cleanvit.app.secret_key, algorithm='HS256')
+    kwargs = {'json': body} if isinstance(body, dict) else {}
+    if body == 'image':
+        kwargs = {'data': {'qr_image': (open(spec['image'], 'rb'), 'scan.png')},
+                  'content_type': 'multipart/form-data'}
+
+    client = cleanvit.app.test_client()
+    t0 = time.perf_counter()
+    resp = client.open(path.format(**spec), method=method, headers=headers, **kwargs)
+    resp.get_data()
+    first_ms = (time.perf_counter() - t0) * 1000
+    print(json.dumps({'importMs': import_ms, 'firstMs': first_ms, 'status': resp.status_code,
+                      'atImport': at_import, 'afterRequest': loaded()}))
+
+def run_child(spec, env):
+    started = time.perf_counter()
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', json.dumps(spec)],
+                         env=env, capture_output=True, text=True, timeout=120)
+    if out.returncode != 0:
+        raise RuntimeError(f"{spec['route']}: child failed\n{out.stderr}")
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    result['processMs'] = (time.perf_counter() - started) * 1000
+    return result
+
+def prepare(path, runs):
+    # A migrated database with a student who can log in and one in-progress
+    # job (with a photo of its QR) per complete-scan run
+    import bcrypt
+    from storage.sqlite_backend import SQLiteStorage
+    from qr import render_qr_png
+
+    seed(path, n_requests=5000).close()
+    db = SQLiteStorage(path)
+    conn = db.conn()
+    rounds = int(os.getenv('BCRYPT_ROUNDS', 12))
+    conn.execute("INSERT INTO users (email, password, name, block, room_number, group_no) "
+                 "VALUES ('cold@vitstudent.ac.in', ?, 'Cold', 'A', '101', 'A-101')",
+                 (bcrypt.hashpw(b'secret123', bcrypt.gensalt(rounds)).decode(),))
+    conn.commit()
+    student = db.find_user_by_email('cold@vitstudent.ac.in')
+    jobs = db.all("SELECT id, request_id, cleaner_id FROM requests WHERE status = 'in_progress' "
+                  "AND cleaner_id IS NOT NULL ORDER BY id LIMIT ?", (runs,))
+    if len(jobs) < runs:
+        raise RuntimeError(f"seeded database has only {len(jobs)} in-progress jobs")
+    claims = {'student': {'id': student['id'], 'email': student['email'], 'name': student['name'],
+                          'role': 'student', 'block': student['block'],
+                          'roomNumber': student['room_number'], 'groupNo': student['group_no']}}
+    scans = []
+    for job in jobs:
+        image = os.path.join(os.path.dirname(path), f"scan-{job['id']}.png")
+        with open(image, 'wb') as f:
+            f.write(render_qr_png(job['request_id']))
+        scans.append((job, image))
+    return claims, scans
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--runs', type=int, default=3, help='fresh processes per route')
+    parser.add_argument('--max-import-ms', type=float, help='median budget for `import app`')
+    parser.add_argument('--max-first-request-ms', type=float, help='median budget per route (not complete-scan)')
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE',
+                        help='extra settings for the app, e.g. QR_POOL_SIZE=0')
+    args = parser.parse_args()
+    if args.child:
+        return child(args)
+
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'cold.db')
+        claims, scans = prepare(path, args.runs)
+        env = dict(os.environ, STORAGE_BACKEND='sqlite', SQLITE_PATH=path, SUPABASE_URL='', SUPABASE_KEY='')
+        env.update(item.split('=', 1) for item in args.env)
+
+        print(f"{'route':<16}{'import ms':>11}{'first ms':>10}{'process ms':>12}  loaded by the request")
+        import_times = []
+        for name, route in ROUTES.items():
+            allowed = route[4]
+            results = []
+            for i in range(args.runs):
+                job, image = scans[i]
+                spec = {'route': name, 'job_id': job['id'], 'image': image,
+                        'claims': dict(claims, cleaner={'id': job['cleaner_id'], 'role': 'cleaner', 'blocks': []})}
+                results.append(run_child(spec, env))
+            import_times += [r['importMs'] for r in results]
+            first = percentile([r['firstMs'] for r in results], 50)
+            extra = sorted(set(results[-1]['afterRequest']) - set(results[-1]['atImport']))
+            print(f"{name:<16}{percentile([r['importMs'] for r in results], 50):>11.1f}{first:>10.1f}"
+                  f"{percentile([r['processMs'] for r in results], 50):>12.1f}  {', '.join(extra) or '-'}")
+
+            for r in results:
+                if r['atImport']:
+                    failures.append(f"{name}: `import app` loaded {', '.join(r['atImport'])}")
+                unexpected = set(r['afterRequest']) - set(r['atImport']) - set(allowed)
+                if unexpected:
+                    failures.append(f"{name}: the first request loaded {', '.join(sorted(unexpected))}")
+                if r['status'] >= 400:
+                    failures.append(f"{name}: HTTP {r['status']}")
+            if args.max_first_request_ms and name != 'complete-scan' and first > args.max_first_request_ms:
+                failures.append(f"{name}: first request {first:.1f} ms > {args.max_first_request_ms:.0f} ms")
+
+        # Supabase backend: startup must not import supabase-py or connect
+        # (the URL is unreachable; /api/config does not query)
+        supabase_env = dict(env, STORAGE_BACKEND='supabase', SUPABASE_URL='http://127.0.0.1:9', SUPABASE_KEY='cold-start')
+        r = run_child({'route': 'config', 'claims': claims}, supabase_env)
+        import_times.append(r['importMs'])
+        print(f"{'config (supa)':<16}{r['importMs']:>11.1f}{r['firstMs']:>10.1f}{r['processMs']:>12.1f}  "
+              f"{', '.join(r['afterRequest']) or '-'}")
+        if r['afterRequest'] or r['status'] >= 400:
+            failures.append(f"supabase: loaded {', '.join(r['afterRequest']) or 'nothing'}, HTTP {r['status']}")
+
+    import_ms = percentile(import_times, 50)
+    print(f"\nimport app: median {import_ms:.1f} ms over {len(import_times)} processes")
+    if args.max_import_ms and import_ms > args.max_import_ms:
+        failures.append(f"import app: {import_ms:.1f} ms > {args.max_import_ms:.0f} ms")
+
+    for f in failures:
+        print(f"FAIL {f}")
+    print(f"\n{'OK' if not failures else 'FAILED'}: cold start")
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,86 @@
+import os
+import sys
+import tempfile
+import argparse
+import threading
+
+from seed import seed
+from storage.sqlite_backend import SQLiteStorage
+
+# Fires many simultaneous accepts at the same pending job and checks that the
+# conditional transition used by accept_request (SQLiteStorage.accept_request,
+# one connection per thread) lets exactly one cleaner win. Then fires as many
+# simultaneous dispatcher assignments of different jobs at one cleaner and
+# checks that assign_request lets exactly --max-jobs of them through.
+#
+#   python benchmarks/concurrent_accept.py --cleaners 32 --jobs 50
+
+def race(db, attempts):
+    # attempts: callables run at the same moment, one thread (and
+    # connection) each; returns the indexes of those that returned a row
+    barrier = threading.Barrier(len(attempts))
+    winners = []
+    lock = threading.Lock()
+
+    def run(i, attempt):
+        db.conn()
+        barrier.wait()
+        if attempt():
+            with lock:
+                winners.append(i)
+
+    threads = [threading.Thread(target=run, args=(i, a)) for i, a in enumerate(attempts)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return winners
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cleaners', type=int, default=32)
+    parser.add_argument('--jobs', type=int, default=50)
+    parser.add_argument('--max-jobs', type=int, default=2, help='dispatcher job cap per cleaner')
+    parser.add_argument('--rounds', type=int, default=20, help='rounds of concurrent assignments')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'race.db')
+        # Enough pending jobs for both races
+        conn = seed(path, n_requests=(args.jobs + args.cleaners * args.rounds) * 20, n_cleaners=args.cleaners)
+        pending = [row[0] for row in conn.execute("SELECT id FROM requests WHERE status = 'pending' ORDER BY id")]
+        conn.close()
+        db = SQLiteStorage(path)
+        accept = lambda job_id, cleaner_id: lambda: db.accept_request(job_id, cleaner_id)
+
+        failures = 0
+        jobs, pending = pending[:args.jobs], pending[args.jobs:]
+        for job_id in jobs:
+            winners = race(db, [accept(job_id, i + 1) for i in range(args.cleaners)])
+            if len(winners) != 1:
+                failures += 1
+                print(f"job {job_id}: {len(winners)} winners")
+        print(f"{len(jobs)} jobs x {args.cleaners} concurrent accepts: "
+              f"{len(jobs) - failures} with exactly one winner, {failures} failures")
+
+        # One cleaner on shift with no open jobs; each round assigns
+        # --cleaners different jobs to them at once, then completes the winners
+        cleaner_id = 1
+        db.set_cleaner_shift(cleaner_id, True)
+        db.all("UPDATE requests SET status = 'completed' WHERE cleaner_id = ? AND status IN ('assigned', 'in_progress')",
+               (cleaner_id,))
+        assign = lambda job_id: lambda: db.assign_request(job_id, cleaner_id, args.max_jobs)
+        capped = 0
+        for _ in range(args.rounds):
+            jobs, pending = pending[:args.cleaners], pending[args.cleaners:]
+            winners = race(db, [assign(job_id) for job_id in jobs])
+            if len(winners) != args.max_jobs:
+                capped += 1
+                print(f"{len(winners)} of {len(jobs)} concurrent assignments went through, cap {args.max_jobs}")
+            db.all("UPDATE requests SET status = 'completed' WHERE cleaner_id = ? AND status = 'assigned'", (cleaner_id,))
+        print(f"{args.rounds} rounds x {args.cleaners} concurrent assignments to one cleaner: "
+              f"{args.rounds - capped} with exactly {args.max_jobs} through, {capped} failures")
+        sys.exit(1 if failures or capped else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+import os
+import time
+import heapq
+import random
+import argparse
+import tempfile
+import statistics
+
+from seed import seed, percentile
+from storage.sqlite_backend import SQLiteStorage
+from dispatch import Dispatcher
+
+# Simulated hours of a busy hostel: requests arrive (Poisson, --rate per
+# hour, random rooms, 70% Normal / 30% Deep Cleaning) and cleaners work
+# them for a type-dependent time. Cleaners either poll the pending list
+# every --poll-seconds while free and accept the oldest request in their
+# blocks (the current flow), or the dispatcher assigns on every arrival
+# and completion. Reports time to assignment (simulated), jobs per
+# cleaner, and the real time spent in storage calls and queue work.
+#
+#   python benchmarks/dispatch_sim.py --rate 2000 --cleaners 800 --hours 3
+
+SERVICE_MINUTES = {'Normal Cleaning': 15, 'Deep Cleaning': 40}
+
+def service_seconds(rng, req_type):
+    return rng.expovariate(1 / (SERVICE_MINUTES[req_type] * 60))
+
+def simulate(db, mode, args):
+    rng = random.Random(args.seed)
+    now = [0.0]
+    events = []
+    seq = iter(range(10 ** 9))
+
+    def at(t, kind, data=None):
+        heapq.heappush(events, (t, next(seq), kind, data))
+
+    students = db.all("SELECT id, block, room_number, group_no FROM users")
+    db.conn().execute("UPDATE cleaners SET on_shift = 1")
+    cleaners = {c['id']: c for c in db.list_cleaner_loads()}
+    for c in cleaners.values():
+        c['blocks'] = tuple(c['blocks'])
+    created, waits, jobs = {}, [], dict.fromkeys(cleaners, 0)
+    dispatcher = Dispatcher(db, max_jobs=1, resync_seconds=float('inf'), clock=lambda: now[0])
+    if mode == 'dispatcher':
+        dispatcher.rebuild()
+    busy = set()
+    queued = [0]
+    real = {'storage': 0.0, 'calls': 0}
+
+    def timed(fn, *a):
+        t0 = time.perf_counter()
+        try:
+            return fn(*a)
+        finally:
+            real['storage'] += time.perf_counter() - t0
+            real['calls'] += 1
+
+    def started(row, cleaner_id):
+        busy.add(cleaner_id)
+        queued[0] -= 1
+        jobs[cleaner_id] += 1
+        waits.append(now[0] - created[row['id']])
+        at(now[0] + service_seconds(rng, row['type']), 'complete', (row, cleaner_id))
+
+    def dispatch():
+        # No start timeout here, so every row written is an assignment
+        for row in timed(dispatcher.dispatch):
+            started(row, row['cleaner_id'])
+
+    t = 0.0
+    end = args.hours * 3600
+    while True:
+        t += rng.expovariate(args.rate / 3600)
+        if t >= end:
+            break
+        at(t, 'arrive')
+    if mode == 'polling':
+        for cid in cleaners:
+            at(rng.uniform(0, args.poll_seconds), 'poll', cid)
+
+    while events:
+        now[0], _, kind, data = heapq.heappop(events)
+        if kind == 'arrive':
+            s = rng.choice(students)
+            req_type = 'Normal Cleaning' if rng.random() < 0.7 else 'Deep Cleaning'
+            row = timed(db.create_request, {'request_id': f'SIM-{next(seq):08X}', 'user_id': s['id'],
+                                            'block': s['block'], 'room_number': s['room_number'],
+                                            'group_no': s['group_no'], 'type': req_type, 'status': 'pending'})
+            created[row['id']] = now[0]
+            queued[0] += 1
+            if mode == 'dispatcher':
+                dispatcher.add(dict(row, created_at=now[0]))
+                dispatch()
+        elif kind == 'complete':
+            row, cid = data
+            timed(db.complete_request, row['id'], cid, row['request_id'])
+            busy.discard(cid)
+            if mode == 'dispatcher':
+                dispatcher.released(cid)
+                dispatch()
+            else:
+                at(now[0], 'poll', cid)
+        elif kind == 'poll' and data not in busy and (now[0] < end or queued[0]):
+            rows = timed(db.list_pending_requests, ('id', 'type', 'created_at'), cleaners[data]['blocks'], None, 1)
+            row = rows and timed(db.accept_request, rows[0]['id'], data)
+            if row:
+                started(row, data)
+            else:
+                at(now[0] + args.poll_seconds, 'poll', data)
+    left = db.one("SELECT COUNT(*) AS n FROM requests WHERE status = 'pending'")['n']
+    return waits, jobs, real, left
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rate', type=float, default=2000, help='requests per hour')
+    parser.add_argument('--cleaners', type=int, default=800)
+    parser.add_argument('--hours', type=float, default=3)
+    parser.add_argument('--poll-seconds', type=float, default=30)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    print(f"{args.rate:g} requests/hour for {args.hours:g} h, {args.cleaners} cleaners (3 blocks each), "
+          f"polling every {args.poll_seconds:g} s\n")
+    print(f"{'mode':<12}{'assigned':>9}{'wait p50':>10}{'wait p90':>10}{'wait p99':>10}"
+          f"{'jobs/cleaner':>16}{'cv':>6}{'storage calls':>15}{'real s':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ('polling', 'dispatcher'):
+            path = os.path.join(tmp, f'{mode}.db')
+            seed(path, n_requests=0, n_cleaners=args.cleaners).close()
+            waits, jobs, real, left = simulate(SQLiteStorage(path), mode, args)
+            counts = list(jobs.values())
+            mean = statistics.mean(counts)
+            # Coefficient of variation of jobs per cleaner: 0 is perfectly even
+            cv = statistics.pstdev(counts) / mean if mean else 0
+            print(f"{mode:<12}{len(waits):>9}{percentile(waits, 50):>9.0f}s{percentile(waits, 90):>9.0f}s"
+                  f"{percentile(waits, 99):>9.0f}s{f'{mean:.1f} ({min(counts)}-{max(counts)})':>16}{cv:>6.2f}"
+                  f"{real['calls']:>15}{real['storage']:>8.1f}")
+            if left:
+                print(f"{'':<12}{left} still pending at the end")
+
+if __name__ == '__main__':
+    main()
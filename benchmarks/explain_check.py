@@ -0,0 +1,183 @@
+import os
+import re
+import sys
+import random
+import datetime
+import argparse
+import tempfile
+
+import jwt
+
+from seed import seed
+
+# Query-plan regression check. Seeds a large SQLite database, drives every
+# route in app.py through the test client with every statement recorded,
+# then runs EXPLAIN QUERY PLAN on each distinct statement. Exits 1 if any
+# of them reads a large table without an index (a plain "SCAN <table>").
+# Full scans of an index are reported but allowed: the admin per-block
+# counts aggregate the whole table by design. explain_check_postgres.py
+# does the same for the Postgres schema.
+#
+#   python benchmarks/explain_check.py --requests 100000
+
+LARGE_TABLES = {'requests', 'requests_archive', 'users', 'otps'}
+TABLE_ALIAS_RE = re.compile(r'\b(?:FROM|JOIN|UPDATE|INTO)\s+(\w+)(?:\s+(?:AS\s+)?(?!ON\b|WHERE\b|SET\b|LEFT\b|JOIN\b|GROUP\b|ORDER\b|LIMIT\b|VALUES\b)(\w+))?', re.I)
+LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+def shape(sql):
+    # Statement text with literals blanked, to group repeated calls
+    return LITERAL_RE.sub('?', ' '.join(sql.split()))
+
+def scanned_tables(conn, sql):
+    # [(table, plan detail)] for every SCAN step in the statement's plan
+    aliases = {}
+    for table, alias in TABLE_ALIAS_RE.findall(sql):
+        aliases[table.lower()] = table.lower()
+        if alias:
+            aliases[alias.lower()] = table.lower()
+    scans = []
+    for row in conn.execute("EXPLAIN QUERY PLAN " + sql).fetchall():
+        detail = row['detail']
+        if detail.startswith('SCAN '):
+            name = detail.split()[1].lower()
+            scans.append((aliases.get(name, name), detail))
+    return scans
+
+def drive(cleanvit, client, lookup):
+    # One pass over the API as each role, including second pages. Fixture
+    # rows are found with lookup(), which is not recorded.
+    secret = cleanvit.app.config['SECRET_KEY']
+    token = lambda claims: {'Authorization': 'Bearer ' + jwt.encode(
+        dict(claims, exp=datetime.datetime.utcnow() + datetime.timedelta(hours=1)), secret, algorithm='HS256')}
+
+    student = lookup("SELECT * FROM users ORDER BY id LIMIT 1")[0]
+    as_student = {'Authorization': f'Bearer {cleanvit.student_token(student)}'}
+    cleaner = lookup("SELECT * FROM cleaners ORDER BY id LIMIT 1")[0]
+    as_cleaner = token({'id': cleaner['id'], 'role': 'cleaner', 'blocks': cleanvit.json.loads(cleaner['assigned_blocks'])})
+    as_admin = token({'id': 1, 'role': 'admin'})
+    # A legacy student row without group_no lists requests by user_id
+    lookup("INSERT INTO users (email, password, name, block, room_number) "
+           "VALUES ('legacy@vitstudent.ac.in', 'x', 'Legacy', 'A', '999')")
+    legacy = lookup("SELECT * FROM users WHERE email = 'legacy@vitstudent.ac.in'")[0]
+    as_legacy = {'Authorization': f'Bearer {cleanvit.student_token(legacy)}'}
+
+    profile = {'password': 'secret123', 'name': 'New', 'block': 'A', 'roomNumber': '101'}
+    client.post('/api/auth/student/signup-direct', json=dict(profile, email='direct@vitstudent.ac.in'))
+    otp = client.post('/api/auth/student/signup', json={'email': 'otp@vitstudent.ac.in'}).get_json()['otp']
+    client.post('/api/auth/student/verify-otp', json=dict(profile, email='otp@vitstudent.ac.in', otp=otp))
+    client.post('/api/auth/student/google-check', json={'email': student['email']})
+    client.post('/api/auth/student/google-register', json=dict(profile, email='google@vitstudent.ac.in'))
+    client.post('/api/auth/student/login', json={'email': 'direct@vitstudent.ac.in', 'password': 'secret123'})
+    client.post('/api/admin/cleaners', headers=as_admin,
+                json={'employeeId': 'CHECK1', 'name': 'Check', 'password': 'secret123', 'blocks': ['A']})
+    client.post('/api/auth/cleaner/login', json={'employeeId': 'CHECK1', 'password': 'secret123'})
+    client.post('/api/auth/admin/login', json={'username': 'admin', 'password': 'x'})
+
+    # The seeded history is months old: most of it moves to the archive
+    client.post('/api/admin/archive', headers=as_admin)
+    client.post('/api/requests', headers=as_student, json={'type': 'Normal Cleaning'})
+    groups = [u['group_no'] for u in lookup("SELECT DISTINCT group_no FROM users WHERE group_no IS NOT NULL LIMIT 3")]
+    client.post('/api/requests/bulk', headers=as_admin, json={'type': 'Deep Cleaning', 'items': [{'groupNo': g} for g in groups]})
+
+    archived = {'include_archived': 1}
+    for headers, url, params in [(as_student, '/api/requests', {}), (as_legacy, '/api/requests', {}),
+                                 (as_cleaner, '/api/requests', {}), (as_cleaner, '/api/requests/pending', {}),
+                                 (as_student, '/api/requests', archived), (as_legacy, '/api/requests', archived),
+                                 (as_cleaner, '/api/requests', archived)]:
+        resp = client.get(url, headers=headers, query_string=dict(params, limit=2))
+        cursor = resp.headers.get('X-Next-Cursor')
+        if cursor:
+            client.get(url, headers=headers, query_string=dict(params, limit=2, after=cursor))
+
+    pending = lookup("SELECT id FROM requests WHERE status = 'pending' ORDER BY id LIMIT 1")
+    if pending:
+        client.put(f"/api/requests/{pending[0]['id']}/accept", headers=as_cleaner)
+    job = lookup("SELECT id, request_id, cleaner_id FROM requests WHERE status = 'in_progress' ORDER BY id LIMIT 1")[0]
+    as_job_cleaner = token({'id': job['cleaner_id'], 'role': 'cleaner', 'blocks': []})
+    client.put(f"/api/requests/{job['id']}/complete", headers=as_job_cleaner, json={'qrData': 'REQ-WRONG'})
+    client.put(f"/api/requests/{job['id']}/complete", headers=as_job_cleaner, json={'qrData': job['request_id']})
+    client.put(f"/api/requests/{job['id']}/rate", headers=as_student, json={'rating': 5, 'feedback': 'Good'})
+    old = lookup("SELECT id, cleaner_id FROM requests_archive ORDER BY id LIMIT 1")[0]
+    client.put(f"/api/requests/{old['id']}/rate", headers=as_student, json={'rating': 4, 'feedback': 'Late'})
+    client.put(f"/api/requests/{old['id']}/complete", headers=as_job_cleaner, json={'qrData': 'REQ-WRONG'})
+
+    # Shifts: the dispatcher assigns on the way on, the first job is started
+    # and the rest go back to pending on the way off. The seeded cleaner may
+    # already be at the job cap, so two jobs are assigned past it directly.
+    client.get('/api/cleaner/shift', headers=as_cleaner)
+    client.put('/api/cleaner/shift', headers=as_cleaner, json={'onShift': True})
+    for req in lookup("SELECT id FROM requests WHERE status = 'pending' ORDER BY id LIMIT 2"):
+        cleanvit.db.assign_request(req['id'], cleaner['id'], 10 ** 6)
+    assigned = lookup(f"SELECT id FROM requests WHERE status = 'assigned' AND cleaner_id = {cleaner['id']} ORDER BY id LIMIT 1")
+    if assigned:
+        client.put(f"/api/requests/{assigned[0]['id']}/start", headers=as_cleaner)
+    client.put('/api/cleaner/shift', headers=as_cleaner, json={'onShift': False})
+    client.get('/api/student/roommates', headers=as_student)
+
+    client.get('/api/admin/stats', headers=as_admin)
+    for granularity in ('hour', 'day'):
+        client.get('/api/admin/analytics', headers=as_admin, query_string={'granularity': granularity})
+    client.get('/api/admin/cleaners', headers=as_admin)
+    client.get(f"/api/admin/cleaners/{cleaner['id']}/stats", headers=as_admin)
+    client.get('/api/admin/dispatch', headers=as_admin)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=100000)
+    parser.add_argument('--rooms', type=int, default=3000)
+    parser.add_argument('--otps', type=int, default=50000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'explain.db')
+        conn = seed(path, n_requests=args.requests, n_rooms=args.rooms, n_cleaners=50)
+        rng = random.Random(3)
+        conn.executemany("INSERT INTO otps (email, otp, expires_at, used, created_at) VALUES (?, ?, ?, ?, ?)",
+                         [(f'student{rng.randrange(args.rooms)}@vitstudent.ac.in', f'{rng.randrange(10 ** 6):06d}',
+                           '2025-01-01 00:10:00', rng.random() < 0.9, '2025-01-01 00:00:00')
+                          for _ in range(args.otps)])
+        conn.commit()
+        conn.close()
+
+        # Everything on this thread, on one connection
+        os.environ.update(STORAGE_BACKEND='sqlite', SQLITE_PATH=path, SUPABASE_URL='', SUPABASE_KEY='',
+                          QUERY_FANOUT_WORKERS='0', HASH_POOL_SIZE='0', BCRYPT_ROUNDS='4',
+                          DISPATCH_ENABLED='1', ARCHIVE_ENABLED='1', ARCHIVE_INTERVAL_SECONDS='inf')
+        import app as cleanvit
+        db_conn = cleanvit.db.conn()
+        statements = []
+        recording = [True]
+        db_conn.set_trace_callback(lambda sql: recording[0] and statements.append(sql))
+
+        def lookup(sql):
+            recording[0] = False
+            try:
+                rows = db_conn.execute(sql).fetchall()
+                db_conn.commit()
+                return [dict(r) for r in rows]
+            finally:
+                recording[0] = True
+
+        drive(cleanvit, cleanvit.app.test_client(), lookup)
+        db_conn.set_trace_callback(None)
+
+        seen = {}
+        for sql in statements:
+            if re.match(r'\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b', sql, re.I):
+                seen.setdefault(shape(sql), sql)
+
+        failures = 0
+        print(f"{len(seen)} distinct statements on {args.requests} requests, {args.rooms} rooms, {args.otps} otps\n")
+        for sql in seen.values():
+            scans = scanned_tables(db_conn, sql)
+            bad = [d for table, d in scans if table in LARGE_TABLES and 'INDEX' not in d]
+            status = 'FAIL' if bad else 'ok'
+            failures += bool(bad)
+            print(f"{status:<5}{shape(sql)[:150]}")
+            for table, detail in scans:
+                print(f"       {detail}")
+        print(f"\n{failures} statement(s) scan a large table without an index")
+        return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
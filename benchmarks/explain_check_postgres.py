@@ -0,0 +1,241 @@
+import os
+import sys
+import json
+import argparse
+
+from seed import ROOT
+
+from storage.base import CLEANER_JOB_STATUSES, OPEN_JOB_STATUSES
+from storage.migrations import SCHEMA_MIGRATIONS_TABLE, list_migrations, migration_script
+
+# Query-plan regression check for Postgres, the counterpart of
+# explain_check.py. Builds supabase_schema.sql plus every migration in a
+# scratch schema (explain_check, dropped afterwards; nothing else in the
+# database is touched), seeds it, archives the old history, then runs
+# EXPLAIN on the statement PostgREST issues for each query in
+# storage/supabase_backend.py and in the archive_requests() batch. Exits 1
+# if any of them reads a large table with a Seq Scan.
+#
+# Not covered: the whole-table aggregates (admin_stats(), the legacy
+# per-query stats, rollup rebuilds), which read every row by design, and
+# embedded selects (users(name) and the like), which PostgREST joins on
+# primary keys.
+#
+#   DATABASE_URL=postgresql://localhost/scratch python benchmarks/explain_check_postgres.py
+#
+# Needs psycopg (pip install "psycopg[binary]").
+
+try:
+    import psycopg
+    from psycopg.rows import dict_row
+    HAS_PSYCOPG = True
+except ImportError:
+    HAS_PSYCOPG = False
+
+SCHEMA = 'explain_check'
+LARGE_TABLES = {'requests', 'requests_archive', 'users', 'otps', 'request_rollups', 'latency_rollups'}
+BLOCKS = ['A', 'B', 'C', 'D', 'M', 'P', 'Q', 'R', 'S']
+
+# A request every 5 minutes back from now. The last two days are 85%
+# completed (40% of those rated), 5% in progress and 10% pending, as in
+# seed.py; anything older is completed, as it would be in production
+# (seed.py spreads open requests over the whole history, which leaves a
+# hot table of mostly open work once the rest is archived). Each cleaner
+# covers three blocks.
+SEED = """
+SELECT setseed(0.42);
+INSERT INTO users (email, password, name, block, room_number, group_no, role)
+SELECT 'student' || i || '@vitstudent.ac.in', 'x', 'Student ' || i, b, r, b || '-' || r, 'student'
+FROM generate_series(0, %(rooms)s - 1) AS i,
+     LATERAL (SELECT (%(blocks)s::text[])[i %% 9 + 1] AS b, (100 + i / 9)::text AS r) AS room;
+
+INSERT INTO cleaners (employee_id, password, name, assigned_blocks)
+SELECT 'SEED' || lpad(i::text, 3, '0'), 'x', 'Cleaner ' || i,
+       json_build_array((%(blocks)s::text[])[i %% 9 + 1], (%(blocks)s::text[])[(i + 3) %% 9 + 1],
+                        (%(blocks)s::text[])[(i + 6) %% 9 + 1])::text
+FROM generate_series(0, %(cleaners)s - 1) AS i;
+
+INSERT INTO requests (request_id, user_id, cleaner_id, block, room_number, group_no, type, status,
+                      created_at, accepted_at, completed_at, rating, feedback)
+SELECT 'REQ-' || lpad(to_hex(i), 8, '0'), u.id,
+       CASE WHEN s.status <> 'pending' THEN 1 + (i::bigint * 7919) %% %(cleaners)s END,
+       u.block, u.room_number, u.group_no, 'Sweeping', s.status, t.created,
+       CASE WHEN s.status <> 'pending' THEN t.created + interval '30 minutes' END,
+       CASE WHEN s.status = 'completed' THEN t.created + interval '2 hours' END,
+       CASE WHEN s.status = 'completed' AND random() < 0.4 THEN 1 + (i %% 5) END,
+       NULL
+FROM generate_series(1, %(requests)s) AS i
+JOIN users u ON u.id = 1 + (i::bigint * 104729) %% %(rooms)s
+CROSS JOIN LATERAL (SELECT now() - (%(requests)s - i) * interval '5 minutes' AS created) AS t
+CROSS JOIN LATERAL (SELECT CASE WHEN i <= %(requests)s - 576 OR (i::bigint * 7907) %% 100 < 85 THEN 'completed'
+                                WHEN (i::bigint * 7907) %% 100 < 90 THEN 'in_progress'
+                                ELSE 'pending' END AS status) AS s;
+
+INSERT INTO otps (email, otp, expires_at, used, created_at)
+SELECT 'student' || (i * 31) %% %(rooms)s || '@vitstudent.ac.in', lpad((i::bigint * 7919 %% 1000000)::text, 6, '0'),
+       now() + interval '10 minutes', random() < 0.9, now() - i * interval '1 minute'
+FROM generate_series(1, %(otps)s) AS i;
+"""
+
+def fixtures(conn):
+    one = lambda sql: conn.execute(sql).fetchone()
+    student = one("SELECT id, email, group_no FROM users ORDER BY id LIMIT 1")
+    cleaner = one("SELECT cleaner_id AS id FROM requests WHERE cleaner_id IS NOT NULL "
+                  "GROUP BY cleaner_id ORDER BY count(*) DESC LIMIT 1")
+    pending = one("SELECT id, request_id FROM requests WHERE status = 'pending' ORDER BY id LIMIT 1")
+    archived = one("SELECT id FROM requests_archive ORDER BY id LIMIT 1")
+    otp = one("SELECT email, otp FROM otps ORDER BY id LIMIT 1")
+    # A keyset cursor partway down the listings
+    mid = one("SELECT created_at, accepted_at, id FROM requests WHERE accepted_at IS NOT NULL ORDER BY id OFFSET 100 LIMIT 1")
+    groups = [r['group_no'] for r in conn.execute("SELECT DISTINCT group_no FROM users LIMIT 3")]
+    return student, cleaner, pending, archived, otp, mid, groups
+
+def statements(conn):
+    # (name, sql, params): the statement PostgREST runs for each storage
+    # call, first page and keyset page, hot table and archive
+    student, cleaner, pending, archived, otp, mid, groups = fixtures(conn)
+    jobs = list(CLEANER_JOB_STATUSES)
+    open_jobs = list(OPEN_JOB_STATUSES)
+    out = [
+        ('email_registered', "SELECT id FROM users WHERE email = %s", (student['email'],)),
+        ('get_user_profile', "SELECT id, name, block, room_number, group_no FROM users WHERE id = %s", (student['id'],)),
+        ('list_group_members', "SELECT name, email FROM users WHERE group_no = %s", (student['group_no'],)),
+        ('list_group_students', "SELECT id, block, room_number, group_no FROM users WHERE group_no = ANY(%s) ORDER BY id",
+         (groups,)),
+        ('find_unused_otp', "SELECT * FROM otps WHERE email = %s AND otp = %s AND used = false "
+                            "ORDER BY created_at DESC LIMIT 1", (otp['email'], otp['otp'])),
+        ('mark_otp_used', "UPDATE otps SET used = true WHERE id = %s", (1,)),
+        ('list_pending_requests', "SELECT id, created_at FROM requests WHERE status = 'pending' AND block = ANY(%s) "
+                                  "ORDER BY created_at, id LIMIT 51", (BLOCKS[:3],)),
+        ('list_pending_requests (page 2)', "SELECT id, created_at FROM requests WHERE status = 'pending' AND block = ANY(%s) "
+                                           "AND (created_at > %s OR (created_at = %s AND id > %s)) ORDER BY created_at, id LIMIT 51",
+         (BLOCKS[:3], mid['created_at'], mid['created_at'], mid['id'])),
+        ('accept_request', "UPDATE requests SET status = 'in_progress', cleaner_id = %s, accepted_at = now() "
+                           "WHERE id = %s AND status = 'pending'", (cleaner['id'], pending['id'])),
+        # assign_request() in migrations/postgres: the cleaner lock, then
+        # the capped update
+        ('assign_request cleaner', "SELECT 1 FROM cleaners WHERE id = %s AND is_active AND on_shift FOR UPDATE",
+         (cleaner['id'],)),
+        ('assign_request', "UPDATE requests SET status = 'assigned', cleaner_id = %s, accepted_at = now() "
+                           "WHERE id = %s AND status = 'pending' AND (SELECT count(*) FROM requests "
+                           "WHERE cleaner_id = %s AND status = ANY(%s)) < 1",
+         (cleaner['id'], pending['id'], cleaner['id'], open_jobs)),
+        ('start_request', "UPDATE requests SET status = 'in_progress' WHERE id = %s AND status = 'assigned' "
+                          "AND cleaner_id = %s", (pending['id'], cleaner['id'])),
+        ('requeue_assigned', "UPDATE requests SET status = 'pending', cleaner_id = NULL, accepted_at = NULL "
+                             "WHERE status = 'assigned' AND accepted_at < now() - interval '15 minutes'", ()),
+        ('requeue_assigned (cleaner)', "UPDATE requests SET status = 'pending', cleaner_id = NULL, accepted_at = NULL "
+                                       "WHERE status = 'assigned' AND cleaner_id = %s", (cleaner['id'],)),
+        ('complete_request', "UPDATE requests SET status = 'completed', completed_at = now() WHERE id = %s "
+                             "AND status = ANY(%s) AND cleaner_id = %s AND request_id = %s",
+         (pending['id'], open_jobs, cleaner['id'], pending['request_id'])),
+        ('archive_requests batch', "SELECT id FROM requests WHERE status = 'completed' AND completed_at < now() - interval '30 days' "
+                                   "ORDER BY completed_at LIMIT 500 FOR UPDATE SKIP LOCKED", ()),
+        ('list_dispatch_queue', "SELECT id, block, type, created_at FROM requests WHERE status = 'pending' "
+                                "ORDER BY created_at, id LIMIT 1000 OFFSET 0", ()),
+        ('list_cleaner_loads', "SELECT cleaner_id FROM requests WHERE status = ANY(%s)", (open_jobs,)),
+        ('admin_stats_legacy reviews', "SELECT rating, feedback, completed_at FROM requests WHERE rating IS NOT NULL "
+                                       "ORDER BY completed_at DESC LIMIT 5", ()),
+        ('cleaner_rollup_legacy completed', "SELECT count(*) FROM requests WHERE cleaner_id = %s AND status = 'completed'",
+         (cleaner['id'],)),
+        ('cleaner_rollup_legacy ratings', "SELECT rating FROM requests WHERE cleaner_id = %s AND rating IS NOT NULL",
+         (cleaner['id'],)),
+        ('request_analytics counts', "SELECT bucket, dimension, value, count FROM request_rollups WHERE granularity = 'hour' "
+                                     "AND bucket >= now() - interval '2 days' AND bucket < now() AND count <> 0", ()),
+        ('request_analytics latency', "SELECT bucket, metric, bin, count FROM latency_rollups WHERE granularity = 'hour' "
+                                      "AND bucket >= now() - interval '2 days' AND bucket < now() AND count <> 0", ()),
+    ]
+    for table in ('requests', 'requests_archive'):
+        req_id = pending['id'] if table == 'requests' else archived['id']
+        out += [
+            (f'list_group_requests {table}', f"SELECT id, created_at FROM {table} WHERE group_no = %s "
+                                             "ORDER BY created_at DESC, id DESC LIMIT 51", (student['group_no'],)),
+            (f'list_group_requests {table} (page 2)', f"SELECT id, created_at FROM {table} WHERE group_no = %s "
+                                                      "AND (created_at < %s OR (created_at = %s AND id < %s)) "
+                                                      "ORDER BY created_at DESC, id DESC LIMIT 51",
+             (student['group_no'], mid['created_at'], mid['created_at'], mid['id'])),
+            (f'list_group_requests {table} (by user)', f"SELECT id, created_at FROM {table} WHERE user_id = %s "
+                                                       "ORDER BY created_at DESC, id DESC LIMIT 51", (student['id'],)),
+            (f'list_cleaner_requests {table}', f"SELECT id, accepted_at FROM {table} WHERE cleaner_id = %s "
+                                               "AND status = ANY(%s) ORDER BY accepted_at DESC, id DESC LIMIT 51",
+             (cleaner['id'], jobs)),
+            (f'list_cleaner_requests {table} (page 2)', f"SELECT id, accepted_at FROM {table} WHERE cleaner_id = %s "
+                                                        "AND status = ANY(%s) AND (accepted_at < %s OR (accepted_at = %s AND id < %s)) "
+                                                        "ORDER BY accepted_at DESC, id DESC LIMIT 51",
+             (cleaner['id'], jobs, mid['accepted_at'], mid['accepted_at'], mid['id'])),
+            (f'get_request_state {table}', f"SELECT request_id, status, cleaner_id FROM {table} WHERE id = %s", (req_id,)),
+            (f'rate_request {table}', f"UPDATE {table} SET rating = 5, feedback = 'Good' WHERE id = %s", (req_id,)),
+            (f'recent_history {table}', f"SELECT id, type, completed_at, rating, user_id FROM {table} "
+                                        "WHERE cleaner_id = %s AND status = 'completed' ORDER BY completed_at DESC LIMIT 5",
+             (cleaner['id'],)),
+        ]
+    return out
+
+def plan_nodes(node):
+    yield node
+    for child in node.get('Plans', ()):
+        yield from plan_nodes(child)
+
+def describe(node):
+    text = node['Node Type']
+    if node.get('Index Name'):
+        text += f" using {node['Index Name']}"
+    if node.get('Relation Name'):
+        text += f" on {node['Relation Name']}"
+    return text
+
+def build(conn, args):
+    conn.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    conn.execute(f"CREATE SCHEMA {SCHEMA}")
+    conn.execute(f"SET search_path = {SCHEMA}")
+    with open(os.path.join(ROOT, 'supabase_schema.sql')) as f:
+        conn.execute(f.read())
+    conn.execute(SCHEMA_MIGRATIONS_TABLE['postgres'])
+    for migration in list_migrations('postgres'):
+        conn.execute(migration_script('postgres', migration))
+    params = {'rooms': args.rooms, 'cleaners': 50, 'requests': args.requests, 'otps': args.otps, 'blocks': BLOCKS}
+    for stmt in SEED.split(';\n'):
+        if stmt.strip():
+            conn.execute(stmt, params)
+    # The seeded history goes back months: most of it moves to the archive
+    while conn.execute("SELECT archive_requests(now() - interval '30 days', 5000) AS n").fetchone()['n']:
+        pass
+    conn.execute("ANALYZE")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=100000)
+    parser.add_argument('--rooms', type=int, default=3000)
+    parser.add_argument('--otps', type=int, default=50000)
+    parser.add_argument('--keep', action='store_true', help=f'leave the {SCHEMA} schema in place')
+    args = parser.parse_args()
+
+    url = os.getenv('DATABASE_URL')
+    if not (HAS_PSYCOPG and url):
+        print("Needs psycopg installed and DATABASE_URL set")
+        return 1
+
+    with psycopg.connect(url, autocommit=True, row_factory=dict_row) as conn:
+        try:
+            build(conn, args)
+            checks = statements(conn)
+            failures = 0
+            print(f"{len(checks)} statements on {args.requests} requests, {args.rooms} rooms, {args.otps} otps\n")
+            for name, sql, params in checks:
+                plan = conn.execute("EXPLAIN (FORMAT JSON) " + sql, params).fetchone()['QUERY PLAN']
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                nodes = [n for n in plan_nodes(plan[0]['Plan']) if n.get('Relation Name')]
+                bad = [n for n in nodes if n['Node Type'] == 'Seq Scan' and n['Relation Name'] in LARGE_TABLES]
+                failures += bool(bad)
+                print(f"{'FAIL' if bad else 'ok':<5}{name}")
+                for node in nodes:
+                    print(f"       {describe(node)}")
+            print(f"\n{failures} statement(s) scan a large table without an index")
+            return 1 if failures else 0
+        finally:
+            if not args.keep:
+                conn.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+
+if __name__ == '__main__':
+    sys.exit(main())
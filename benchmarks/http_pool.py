@@ -0,0 +1,86 @@
+import time
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from seed import percentile
+from storage.transport import build_http_client, connection_stats
+
+# Latency of small PostgREST-sized requests through the shared pooled
+# transport versus a fresh connection per request (what happens when nothing
+# is kept alive), against a local HTTP/1.1 server that adds --rtt-ms of
+# delay to every new connection to stand in for the TCP + TLS handshake.
+#
+#   python benchmarks/http_pool.py --requests 400 --threads 8 --rtt-ms 20
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    setup_delay = 0.0
+    connections = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        with Handler.lock:
+            Handler.connections += 1
+        time.sleep(self.setup_delay)
+        super().setup()
+
+    def do_GET(self):
+        body = b'[{"id": 1, "status": "pending"}]'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def run(url, client_factory, shared, n_requests, threads):
+    client = client_factory() if shared else None
+    timings = []
+
+    def one(_):
+        t0 = time.perf_counter()
+        if shared:
+            client.get(url)
+        else:
+            with client_factory() as c:
+                c.get(url)
+        timings.append((time.perf_counter() - t0) * 1000)
+
+    Handler.connections = 0
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(one, range(n_requests)))
+    if client:
+        client.close()
+    return timings, Handler.connections
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--rtt-ms', type=float, default=20)
+    args = parser.parse_args()
+
+    Handler.setup_delay = args.rtt_ms / 1000
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_port}/rest/v1/requests'
+
+    print(f"{args.requests} requests, {args.threads} threads, {args.rtt_ms}ms connection setup\n")
+    print(f"{'transport':<28}{'connections':>12}{'p50 ms':>10}{'p99 ms':>10}")
+    for name, factory, shared in [
+        ('new connection per request', lambda: httpx.Client(), False),
+        ('shared pooled client', build_http_client, True),
+    ]:
+        timings, conns = run(url, factory, shared, args.requests, args.threads)
+        print(f"{name:<28}{conns:>12}{percentile(timings, 50):>10.2f}{percentile(timings, 99):>10.2f}")
+    print(f"\nsetup time recorded by the trace hook: {connection_stats.snapshot()}")
+    server.shutdown()
+
+if __name__ == '__main__':
+    main()
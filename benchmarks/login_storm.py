@@ -0,0 +1,80 @@
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from seed import percentile
+import app as cleanvit
+import passwords
+from workers import BoundedProcessPool, PoolOverloaded
+
+# Simulates a login burst at shift change on one threaded worker and reports
+# the latency of a cheap non-auth endpoint (/api/config) while it runs,
+# with bcrypt inline on the request threads versus in the bounded pool.
+#
+#   python benchmarks/login_storm.py --threads 8 --logins-per-sec 40
+
+def run_storm(args, pool):
+    passwords.hash_pool = pool
+    hashed = passwords._hash('password123', passwords.BCRYPT_ROUNDS)
+    server = ThreadPoolExecutor(max_workers=args.threads)
+    client = cleanvit.app.test_client()
+    probe_latencies = []
+    outcomes = {'ok': 0, 'rejected': 0}
+    lock = threading.Lock()
+
+    def login():
+        try:
+            passwords.verify_password('password123', hashed)
+            result = 'ok'
+        except PoolOverloaded:
+            result = 'rejected'
+        with lock:
+            outcomes[result] += 1
+
+    def probe(enqueued):
+        client.get('/api/config')
+        with lock:
+            probe_latencies.append((time.perf_counter() - enqueued) * 1000)
+
+    stop = time.perf_counter() + args.seconds
+    next_login = next_probe = time.perf_counter()
+    while time.perf_counter() < stop:
+        now = time.perf_counter()
+        if args.logins_per_sec and now >= next_login:
+            server.submit(login)
+            next_login += 1 / args.logins_per_sec
+        if now >= next_probe:
+            server.submit(probe, now)
+            next_probe += args.probe_interval / 1000
+        time.sleep(0.001)
+    server.shutdown(wait=True)
+    return probe_latencies, outcomes
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, default=8, help='request threads per worker')
+    parser.add_argument('--logins-per-sec', type=float, default=40)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--probe-interval', type=float, default=20, help='ms between probe requests')
+    parser.add_argument('--pool-size', type=int, default=passwords.hash_pool.max_workers)
+    parser.add_argument('--queue-limit', type=int, default=passwords.hash_pool.max_pending)
+    args = parser.parse_args()
+
+    logins = args.logins_per_sec
+    modes = [
+        ('no logins', BoundedProcessPool('bcrypt', 0, 10 ** 6), 0),
+        ('inline bcrypt', BoundedProcessPool('bcrypt', 0, 10 ** 6), logins),
+        (f'pool {args.pool_size}/{args.queue_limit}', BoundedProcessPool('bcrypt', args.pool_size, args.queue_limit), logins),
+    ]
+    print(f"{args.threads} request threads, {logins:g} logins/s for {args.seconds:g}s, "
+          f"bcrypt rounds={passwords.BCRYPT_ROUNDS}\n")
+    print(f"{'mode':<18}{'probe p50 ms':>14}{'probe p99 ms':>14}{'logins ok':>11}{'rejected':>10}")
+    for name, pool, rate in modes:
+        args.logins_per_sec = rate
+        latencies, outcomes = run_storm(args, pool)
+        print(f"{name:<18}{percentile(latencies, 50):>14.1f}{percentile(latencies, 99):>14.1f}"
+              f"{outcomes['ok']:>11}{outcomes['rejected']:>10}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+import os
+import time
+import argparse
+import tempfile
+
+from seed import seed, percentile
+
+# Cost of the /metrics instrumentation: a bare Histogram.observe() call, and
+# GET /api/config and GET /api/requests through the Flask test client with
+# the before/after request hooks installed versus removed. Storage timing
+# stays on in both modes, so the difference is the per-request hooks.
+#
+#   python benchmarks/metrics_overhead.py --requests 3000
+
+def timed_requests(client, url, headers, n):
+    samples = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        client.get(url, headers=headers)
+        samples.append((time.perf_counter() - t0) * 1000)
+    return samples
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=3000)
+    parser.add_argument('--observations', type=int, default=200000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'metrics.db')
+        os.environ.update(STORAGE_BACKEND='sqlite', SQLITE_PATH=path, ARCHIVE_ENABLED='0')
+        seed(path, n_requests=2000).close()
+
+        import app as cleanvit
+        from metrics import Histogram
+        hist = Histogram('bench_seconds', 'benchmark', ('route', 'method'))
+        t0 = time.perf_counter()
+        for i in range(args.observations):
+            hist.observe(0.003, '/api/requests', 'GET')
+        observe_us = (time.perf_counter() - t0) / args.observations * 1e6
+        print(f"Histogram.observe: {observe_us:.2f} us per call\n")
+
+        user = cleanvit.db.all("SELECT * FROM users ORDER BY id LIMIT 1")[0]
+        headers = {'Authorization': f'Bearer {cleanvit.student_token(user)}'}
+        client = cleanvit.app.test_client()
+        before = cleanvit.app.before_request_funcs[None]
+        after = cleanvit.app.after_request_funcs[None]
+        hooks = (cleanvit.start_request_timer, cleanvit.record_request_metrics)
+
+        print(f"{args.requests} requests per mode (milliseconds)\n")
+        print(f"{'endpoint':<18}{'mode':<12}{'p50':>8}{'p99':>8}")
+        for url in ('/api/config', '/api/requests'):
+            for mode in ('without', 'with'):
+                if mode == 'without':
+                    before.remove(hooks[0])
+                    after.remove(hooks[1])
+                timed_requests(client, url, headers, 100)  # warm up
+                samples = timed_requests(client, url, headers, args.requests)
+                if mode == 'without':
+                    before.append(hooks[0])
+                    after.append(hooks[1])
+                print(f"{url:<18}{mode:<12}{percentile(samples, 50):>8.3f}{percentile(samples, 99):>8.3f}")
+
+        t0 = time.perf_counter()
+        body = client.get('/metrics').get_data()
+        print(f"\n/metrics scrape: {(time.perf_counter() - t0) * 1000:.2f} ms, {len(body)} bytes")
+
+if __name__ == '__main__':
+    main()
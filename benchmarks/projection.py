@@ -0,0 +1,79 @@
+import json
+import time
+import base64
+import sqlite3
+import argparse
+
+from seed import seed, percentile
+from app import FIELD_SETS
+from qr import render_qr_png
+
+# Compares response size and latency of the list endpoints' old `select *`
+# queries against the per-view column projections in app.FIELD_SETS.
+#
+#   python benchmarks/projection.py --requests 20000
+
+def run(conn, sql, params, repeat):
+    timings = []
+    size = 0
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        rows = [dict(r) for r in conn.execute(sql, params)]
+        size = len(json.dumps(rows, default=str).encode('utf-8'))
+        timings.append((time.perf_counter() - t0) * 1000)
+    return size, len(rows), timings
+
+def columns(view):
+    cols = ['r.' + f for f in FIELD_SETS[view] if f != 'student_name']
+    if 'student_name' in FIELD_SETS[view]:
+        cols.append('u.name AS student_name')
+    return ', '.join(cols)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    legacy_qr = 'data:image/png;base64,' + base64.b64encode(render_qr_png('REQ-00000000')).decode('utf-8')
+    conn = seed(n_requests=args.requests, qr_code=legacy_qr)
+    conn.row_factory = sqlite3.Row
+
+    group_no = conn.execute("SELECT group_no FROM users WHERE id = 1").fetchone()[0]
+    cleaner_id = 1
+    blocks = [b.strip('"') for b in conn.execute(
+        "SELECT assigned_blocks FROM cleaners WHERE id = 1").fetchone()[0].strip('[]').split(',')]
+    in_blocks = ','.join('?' * len(blocks))
+
+    cases = [
+        ('student /api/requests',
+         "SELECT * FROM requests r WHERE r.group_no = ? ORDER BY r.created_at DESC",
+         f"SELECT {columns('student_requests')} FROM requests r WHERE r.group_no = ? ORDER BY r.created_at DESC",
+         (group_no,)),
+        ('cleaner /api/requests',
+         "SELECT r.*, u.name AS student_name FROM requests r LEFT JOIN users u ON u.id = r.user_id "
+         "WHERE r.cleaner_id = ? AND r.status IN ('in_progress', 'accepted', 'completed') ORDER BY r.accepted_at DESC",
+         f"SELECT {columns('cleaner_requests')} FROM requests r LEFT JOIN users u ON u.id = r.user_id "
+         "WHERE r.cleaner_id = ? AND r.status IN ('in_progress', 'accepted', 'completed') ORDER BY r.accepted_at DESC",
+         (cleaner_id,)),
+        ('/api/requests/pending',
+         f"SELECT r.*, u.name AS student_name FROM requests r LEFT JOIN users u ON u.id = r.user_id "
+         f"WHERE r.status = 'pending' AND r.block IN ({in_blocks}) ORDER BY r.created_at",
+         f"SELECT {columns('pending_requests')} FROM requests r LEFT JOIN users u ON u.id = r.user_id "
+         f"WHERE r.status = 'pending' AND r.block IN ({in_blocks}) ORDER BY r.created_at",
+         tuple(blocks)),
+        ('/api/admin/cleaners',
+         "SELECT * FROM cleaners r ORDER BY r.created_at DESC",
+         f"SELECT {columns('cleaners')} FROM cleaners r ORDER BY r.created_at DESC",
+         ()),
+    ]
+
+    print(f"{args.requests} requests seeded, {args.repeat} runs per query\n")
+    print(f"{'endpoint':<24}{'rows':>6}{'bytes before':>14}{'bytes after':>13}{'p50 ms before':>15}{'p50 ms after':>14}")
+    for name, before_sql, after_sql, params in cases:
+        b_size, n, b_t = run(conn, before_sql, params, args.repeat)
+        a_size, _, a_t = run(conn, after_sql, params, args.repeat)
+        print(f"{name:<24}{n:>6}{b_size:>14}{a_size:>13}{percentile(b_t, 50):>15.2f}{percentile(a_t, 50):>14.2f}")
+
+if __name__ == '__main__':
+    main()
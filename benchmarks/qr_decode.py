@@ -0,0 +1,116 @@
+import time
+import random
+import argparse
+from collections import Counter, defaultdict
+
+import cv2
+import numpy as np
+
+from seed import percentile
+from qr import render_qr_png
+import scanner
+from scanner import decode_qr
+
+# Decode rate and latency of complete-scan's QR pipeline on synthetic phone
+# photos: a rendered request QR pasted at a random size, angle and
+# perspective onto a noisy gradient, blurred, then JPEG-encoded.
+# "legacy" is the previous code path (full-resolution colour decode, pyzbar
+# if installed, then a new cv2.QRCodeDetector per call); "staged" is
+# scanner.decode_qr.
+#
+#   python benchmarks/qr_decode.py --per-case 20
+
+RESOLUTIONS = [(640, 480), (1600, 1200), (4032, 3024)]
+# Gaussian blur sigma as a fraction of one QR module's width
+BLURS = {'sharp': 0.0, 'soft': 0.35, 'blurry': 0.5}
+
+def synthetic_photo(rng, request_id, width, height, blur):
+    qr = cv2.imdecode(np.frombuffer(render_qr_png(request_id), np.uint8), cv2.IMREAD_GRAYSCALE)
+    side = int(min(width, height) * rng.uniform(0.2, 0.5))
+    qr = cv2.resize(qr, (side, side), interpolation=cv2.INTER_NEAREST)
+
+    x = rng.randint(0, width - side)
+    y = rng.randint(0, height - side)
+    jitter = side * 0.08
+    src = np.float32([[0, 0], [side, 0], [side, side], [0, side]])
+    dst = np.float32([[x + rng.uniform(-jitter, jitter), y + rng.uniform(-jitter, jitter)] for x, y in
+                      [(x, y), (x + side, y), (x + side, y + side), (x, y + side)]])
+    angle = rng.uniform(-30, 30)
+    center = dst.mean(axis=0)
+    rot = cv2.getRotationMatrix2D((float(center[0]), float(center[1])), angle, 1.0)
+    dst = cv2.transform(dst[None], rot)[0].astype(np.float32)
+    warp = cv2.getPerspectiveTransform(src, dst)
+
+    gradient = np.linspace(rng.randint(90, 160), rng.randint(160, 230), width, dtype=np.float32)
+    photo = np.tile(gradient, (height, 1))
+    photo += np.random.default_rng(rng.randint(0, 1 << 30)).normal(0, 8, (height, width))
+    mask = cv2.warpPerspective(np.ones_like(qr, np.float32), warp, (width, height))
+    pasted = cv2.warpPerspective(qr.astype(np.float32), warp, (width, height))
+    photo = photo * (1 - mask) + pasted * mask * rng.uniform(0.85, 1.0)
+
+    module = side / 31  # version 1 + 5-module border on each side
+    if blur:
+        photo = cv2.GaussianBlur(photo, (0, 0), blur * module)
+    photo = cv2.cvtColor(np.clip(photo, 0, 255).astype(np.uint8), cv2.COLOR_GRAY2BGR)
+    ok, jpeg = cv2.imencode('.jpg', photo, [cv2.IMWRITE_JPEG_QUALITY, 85])
+    return jpeg.tobytes()
+
+def legacy_decode(data):
+    img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if scanner.HAS_PYZBAR:
+        decoded_objects = scanner.zbar_decode(img)
+        if decoded_objects:
+            return decoded_objects[0].data.decode('utf-8')
+    data, _, _ = cv2.QRCodeDetector().detectAndDecode(img)
+    return data or None
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--per-case', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    scanner.load_decoders()
+    print(f"pyzbar: {'yes' if scanner.HAS_PYZBAR else 'no'}; {args.per_case} photos per case\n")
+    print(f"{'case':<24}{'legacy ok':>10}{'p50 ms':>9}{'staged ok':>11}{'p50 ms':>9}  stages")
+
+    by_stage = defaultdict(list)
+    for width, height in RESOLUTIONS:
+        for blur_name, blur in BLURS.items():
+            legacy_ok = staged_ok = 0
+            legacy_ms, staged_ms, stages = [], [], Counter()
+            for _ in range(args.per_case):
+                request_id = f"REQ-{rng.getrandbits(32):08X}"
+                photo = synthetic_photo(rng, request_id, width, height, blur)
+
+                t0 = time.perf_counter()
+                legacy_ok += legacy_decode(photo) == request_id
+                legacy_ms.append((time.perf_counter() - t0) * 1000)
+
+                t0 = time.perf_counter()
+                text, stage = decode_qr(photo)
+                elapsed = (time.perf_counter() - t0) * 1000
+                staged_ms.append(elapsed)
+                if text == request_id:
+                    staged_ok += 1
+                    stages[stage] += 1
+                    by_stage[stage].append(elapsed)
+                else:
+                    stages['miss'] += 1
+                    by_stage['miss'].append(elapsed)
+
+            n = args.per_case
+            print(f"{f'{width}x{height} {blur_name}':<24}{legacy_ok / n:>10.0%}{percentile(legacy_ms, 50):>9.1f}"
+                  f"{staged_ok / n:>11.0%}{percentile(staged_ms, 50):>9.1f}  "
+                  + ' '.join(f"{k}={v}" for k, v in sorted(stages.items())))
+
+    total = sum(len(v) for v in by_stage.values())
+    print(f"\n{'stage':<12}{'share':>8}{'p50 ms':>9}{'p99 ms':>9}")
+    for stage in ('reduced', 'full', 'threshold', 'rotated', 'miss'):
+        if by_stage[stage]:
+            timings = by_stage[stage]
+            print(f"{stage:<12}{len(timings) / total:>8.0%}{percentile(timings, 50):>9.1f}{percentile(timings, 99):>9.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+import os
+import time
+import argparse
+import tempfile
+
+from seed import seed, percentile
+
+# POST /api/requests followed by the client's first GET of the QR image,
+# with the pre-generated QR pool off and on. Requests arrive every
+# --interval-ms (the refill thread keeps up) and then back to back (it
+# cannot, and the hit rate shows it).
+#
+#   python benchmarks/qr_pool.py --requests 300 --interval-ms 20
+
+def run(cleanvit, client, headers, n, interval):
+    create_ms, total_ms = [], []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        resp = client.post('/api/requests', headers=headers, json={'type': 'Sweeping'})
+        t1 = time.perf_counter()
+        client.get(resp.get_json()['qrCode'])
+        t2 = time.perf_counter()
+        create_ms.append((t1 - t0) * 1000)
+        total_ms.append((t2 - t0) * 1000)
+        if interval:
+            time.sleep(interval / 1000)
+    return create_ms, total_ms
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--interval-ms', type=float, default=20)
+    parser.add_argument('--pool-size', type=int, default=64)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'qr_pool.db')
+        os.environ.update(STORAGE_BACKEND='sqlite', SQLITE_PATH=path, ARCHIVE_ENABLED='0')
+        seed(path, n_requests=0).close()
+
+        import app as cleanvit
+        from qr import QRPool, qr_cache
+        user = cleanvit.db.all("SELECT * FROM users ORDER BY id LIMIT 1")[0]
+        headers = {'Authorization': f'Bearer {cleanvit.student_token(user)}'}
+        client = cleanvit.app.test_client()
+
+        print(f"{args.requests} requests per mode (milliseconds)\n")
+        print(f"{'mode':<28}{'create p50':>11}{'create+qr p50':>15}{'create+qr p99':>15}{'hit rate':>10}")
+        for name, size, interval in [
+            ('no pool, paced', 0, args.interval_ms),
+            (f'pool {args.pool_size}, paced', args.pool_size, args.interval_ms),
+            (f'pool {args.pool_size}, back to back', args.pool_size, 0),
+        ]:
+            cleanvit.qr_pool = pool = QRPool(size)
+            qr_cache.clear()
+            if size:
+                # Let the refill thread fill the pool, as on a warm worker
+                pool.take()
+                while pool.stats()['ready'] < size:
+                    time.sleep(0.01)
+                pool.hits = pool.misses = 0
+            create_ms, total_ms = run(cleanvit, client, headers, args.requests, interval)
+            stats = pool.stats()
+            print(f"{name:<28}{percentile(create_ms, 50):>11.2f}{percentile(total_ms, 50):>15.2f}"
+                  f"{percentile(total_ms, 99):>15.2f}{stats['hitRate'] if size else 0:>10.0%}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+import io
+import os
+import sys
+import random
+import tempfile
+import argparse
+import resource
+import subprocess
+import threading
+
+import cv2
+import numpy as np
+from werkzeug.test import EnvironBuilder
+from werkzeug.wrappers import Request
+
+from qr_decode import synthetic_photo
+from scanner import decode_qr, read_upload
+
+# Peak RSS of complete-scan's upload handling: werkzeug multipart parsing
+# plus decoding, for one scan and for several at once. "legacy" is the old
+# path (file.read(), np.frombuffer, full-resolution colour imdecode, new
+# QRCodeDetector); "streaming" is read_upload() + decode_qr(). Every case
+# runs in a fresh interpreter because peak RSS is a process high-water
+# mark.
+#
+#   python benchmarks/scan_memory.py --width 4032 --height 3024 --concurrency 4
+
+def legacy(file):
+    img = cv2.imdecode(np.frombuffer(file.read(), np.uint8), cv2.IMREAD_COLOR)
+    data, _, _ = cv2.QRCodeDetector().detectAndDecode(img)
+    return data
+
+def streaming(file):
+    data, _ = decode_qr(read_upload(file.stream))
+    return data
+
+def peak_rss_mb():
+    # VmHWM starts over at exec; ru_maxrss would carry the parent's peak
+    # (the photos it generated) into the child
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def make_environ(photo):
+    return EnvironBuilder(method='PUT', data={'qr_image': (photo, 'scan.jpg', 'image/jpeg')}).get_environ()
+
+def child(mode, paths):
+    # Warm up OpenCV and werkzeug on a small photo so the baseline includes them
+    handler = legacy if mode == 'legacy' else streaming
+    _, small = cv2.imencode('.jpg', np.full((480, 640), 255, np.uint8))
+    handler(Request(make_environ(io.BytesIO(small.tobytes()))).files['qr_image'])
+
+    environs = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            environs.append(make_environ(io.BytesIO(f.read())))
+
+    base = peak_rss_mb()
+    results = []
+    threads = [threading.Thread(target=lambda e=e: results.append(handler(Request(e).files['qr_image'])))
+               for e in environs]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    print(f"{peak_rss_mb() - base:.1f} {sum(1 for r in results if r)}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--width', type=int, default=4032)
+    parser.add_argument('--height', type=int, default=3024)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--child')
+    parser.add_argument('paths', nargs='*')
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.paths)
+        return
+
+    rng = random.Random(3)
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i in range(args.concurrency):
+            paths.append(os.path.join(tmp, f'scan{i}.jpg'))
+            with open(paths[-1], 'wb') as f:
+                f.write(synthetic_photo(rng, f"REQ-{i:08X}", args.width, args.height, 0))
+        upload_mb = os.path.getsize(paths[0]) / 1024 / 1024
+
+        print(f"{args.width}x{args.height} JPEG uploads, {upload_mb:.1f} MB each\n")
+        print(f"{'path':<12}{'scans':>6}{'peak RSS +MB':>14}{'per scan MB':>13}{'decoded':>9}")
+        for mode in ('legacy', 'streaming'):
+            for n in sorted({1, args.concurrency}):
+                out = subprocess.run([sys.executable, __file__, '--child', mode] + paths[:n],
+                                     capture_output=True, text=True, check=True).stdout.split()
+                delta, decoded = float(out[-2]), int(out[-1])
+                print(f"{mode:<12}{n:>6}{delta:>14.1f}{delta / n:>13.1f}{f'{decoded}/{n}':>9}")
+
+if __name__ == '__main__':
+    main()
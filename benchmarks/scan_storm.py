@@ -0,0 +1,96 @@
+import time
+import random
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from seed import percentile
+from qr_decode import synthetic_photo
+import app as cleanvit
+import scanner
+from workers import BoundedProcessPool, PoolFull, PoolOverloaded
+
+# Simulates cleaners finishing jobs in a burst on one threaded worker: scans
+# of 12 MP photos arrive at --scans-per-sec while a cheap endpoint
+# (/api/config) is probed, with decoding inline on the request threads
+# versus in the bounded scan pool. Reports probe latency, scan latency and
+# how many scans were turned away (429) or timed out.
+#
+#   python benchmarks/scan_storm.py --threads 8 --scans-per-sec 20
+
+def run_storm(args, pool, photos):
+    scanner.scan_pool = pool
+    server = ThreadPoolExecutor(max_workers=args.threads)
+    client = cleanvit.app.test_client()
+    probe_latencies, scan_latencies = [], []
+    outcomes = {'ok': 0, 'rejected': 0, 'timeout': 0}
+    lock = threading.Lock()
+
+    def scan(photo, enqueued):
+        try:
+            scanner.decode_scan(scanner.np.frombuffer(photo, scanner.np.uint8))
+            result = 'ok'
+        except PoolFull:
+            result = 'rejected'
+        except PoolOverloaded:
+            result = 'timeout'
+        with lock:
+            outcomes[result] += 1
+            if result == 'ok':
+                scan_latencies.append((time.perf_counter() - enqueued) * 1000)
+
+    def probe(enqueued):
+        client.get('/api/config')
+        with lock:
+            probe_latencies.append((time.perf_counter() - enqueued) * 1000)
+
+    stop = time.perf_counter() + args.seconds
+    next_scan = next_probe = time.perf_counter()
+    i = 0
+    while time.perf_counter() < stop:
+        now = time.perf_counter()
+        if args.scans_per_sec and now >= next_scan:
+            server.submit(scan, photos[i % len(photos)], now)
+            i += 1
+            next_scan += 1 / args.scans_per_sec
+        if now >= next_probe:
+            server.submit(probe, now)
+            next_probe += args.probe_interval / 1000
+        time.sleep(0.001)
+    server.shutdown(wait=True)
+    return probe_latencies, scan_latencies, outcomes
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, default=8, help='request threads per worker')
+    parser.add_argument('--scans-per-sec', type=float, default=20)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--probe-interval', type=float, default=20, help='ms between probe requests')
+    parser.add_argument('--pool-size', type=int, default=scanner.scan_pool.max_workers)
+    parser.add_argument('--queue-limit', type=int, default=scanner.scan_pool.max_pending)
+    args = parser.parse_args()
+
+    rng = random.Random(5)
+    scanner.load_decoders()
+    photos = [synthetic_photo(rng, f"REQ-{i:08X}", 4032, 3024, 0.35) for i in range(4)]
+    scans = args.scans_per_sec
+    modes = [
+        ('no scans', BoundedProcessPool('scan', 0, 10 ** 6), 0),
+        ('inline decode', BoundedProcessPool('scan', 0, 10 ** 6), scans),
+        (f'pool {args.pool_size}/{args.queue_limit}', BoundedProcessPool('scan', args.pool_size, args.queue_limit), scans),
+    ]
+    print(f"{args.threads} request threads, {scans:g} scans/s of 4032x3024 photos for {args.seconds:g}s\n")
+    print(f"{'mode':<16}{'probe p50':>10}{'probe p99':>10}{'scan p50':>10}{'scan p99':>10}"
+          f"{'ok':>6}{'429':>6}{'timeout':>9}")
+    for name, pool, rate in modes:
+        args.scans_per_sec = rate
+        probes, scan_ms, outcomes = run_storm(args, pool, photos)
+        print(f"{name:<16}{percentile(probes, 50):>10.1f}{percentile(probes, 99):>10.1f}"
+              f"{percentile(scan_ms, 50) if scan_ms else 0:>10.1f}{percentile(scan_ms, 99) if scan_ms else 0:>10.1f}"
+              f"{outcomes['ok']:>6}{outcomes['rejected']:>6}{outcomes['timeout']:>9}")
+        if pool.max_workers:
+            print(f"{'':<16}pool stats: {pool.stats()}")
+    print("\n(milliseconds)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+import os
+import sys
+import random
+import sqlite3
+import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SOURCE_DB = os.path.join(ROOT, 'cleanvit.db')
+
+BLOCKS = ['A', 'B', 'C', 'D', 'M', 'P', 'Q', 'R', 'S']
+TYPES = ['Full Cleaning', 'Sweeping', 'Mopping', 'Bathroom', 'Dusting']
+INSTRUCTIONS = [
+    None,
+    'Please clean under the beds as well',
+    'Bathroom needs extra attention, the floor is very dirty',
+    'Knock before entering, someone may be asleep',
+    'Dustbin near the window is overflowing',
+]
+
+# ----------------- SEEDED DATASET -----------------
+# Builds a throwaway SQLite database with the same tables as cleanvit.db
+# (schema copied from the local file) and fills it with a realistic mix of
+# students, cleaners and requests for the benchmark scripts.
+
+def create_schema(conn):
+    src = sqlite3.connect(SOURCE_DB)
+    try:
+        ddl = [row[0] for row in src.execute(
+            "SELECT sql FROM sqlite_master WHERE type IN ('table', 'index') "
+            "AND sql IS NOT NULL AND name NOT LIKE 'sqlite_%'")]
+    finally:
+        src.close()
+    for stmt in ddl:
+        conn.execute(stmt)
+
+def seed(path=':memory:', n_requests=5000, n_rooms=500, n_cleaners=20, qr_code=None, rng=None):
+    # qr_code: optional value to store in every row, e.g. a legacy base64
+    # data URL, to reproduce what older versions kept in the table.
+    rng = rng or random.Random(42)
+    conn = sqlite3.connect(path, check_same_thread=False)
+    create_schema(conn)
+
+    users = []
+    for i in range(n_rooms):
+        block = BLOCKS[i % len(BLOCKS)]
+        room = str(100 + i // len(BLOCKS))
+        users.append((f'student{i}@vitstudent.ac.in', '$2b$12$' + 'x' * 53, f'Student {i}',
+                      block, room, f'{block}-{room}', 'student'))
+    conn.executemany(
+        "INSERT INTO users (email, password, name, block, room_number, group_no, role) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)", users)
+
+    cleaners = []
+    for i in range(n_cleaners):
+        blocks = rng.sample(BLOCKS, 3)
+        cleaners.append((f'CLN{i:03d}', '$2b$12$' + 'x' * 53, f'Cleaner {i}',
+                         '[' + ','.join(f'"{b}"' for b in blocks) + ']'))
+    conn.executemany(
+        "INSERT INTO cleaners (employee_id, password, name, assigned_blocks) VALUES (?, ?, ?, ?)",
+        cleaners)
+
+    start = datetime.datetime(2025, 1, 1)
+    rows = []
+    for i in range(n_requests):
+        user_id = rng.randint(1, n_rooms)
+        _, _, _, block, room, group_no, _ = users[user_id - 1]
+        created = start + datetime.timedelta(minutes=i * 5 + rng.randint(0, 4))
+        status = rng.choices(['completed', 'in_progress', 'pending'], [85, 5, 10])[0]
+        cleaner_id = accepted = completed = rating = feedback = None
+        if status != 'pending':
+            cleaner_id = rng.randint(1, n_cleaners)
+            accepted = created + datetime.timedelta(minutes=rng.randint(2, 240))
+        if status == 'completed':
+            completed = accepted + datetime.timedelta(minutes=rng.randint(10, 90))
+            if rng.random() < 0.6:
+                rating = rng.randint(1, 5)
+                feedback = rng.choice(['', 'Good job', 'Very thorough, thank you!', 'Missed the corners'])
+        fmt = lambda d: d.strftime('%Y-%m-%d %H:%M:%S') if d else None
+        rows.append((f'REQ-{i:08X}', user_id, cleaner_id, block, room, group_no,
+                     rng.choice(TYPES), rng.choice(INSTRUCTIONS), status, qr_code,
+                     fmt(created), fmt(accepted), fmt(completed), rating, feedback))
+    conn.executemany(
+        "INSERT INTO requests (request_id, user_id, cleaner_id, block, room_number, group_no, type, "
+        "instructions, status, qr_code, created_at, accepted_at, completed_at, rating, feedback) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    conn.commit()
+    return conn
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0
+    k = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+    return ordered[k]
@@ -0,0 +1,97 @@
+import time
+import json
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import jwt
+from supabase import create_client, ClientOptions
+
+from seed import percentile
+import storage.base
+from storage.supabase_backend import SupabaseStorage
+from storage.transport import build_http_client
+from workers import QueryFanout
+
+# Endpoint latency of the admin and cleaner dashboards' independent reads,
+# one after another versus fanned out on the query thread pool. Runs the real
+# supabase-py client against a local stand-in for PostgREST that answers
+# every query after --latency-ms.
+#
+#   python benchmarks/stats_fanout.py --latency-ms 30 --repeat 20
+
+class PostgREST(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    latency = 0.0
+
+    def respond(self, rows):
+        time.sleep(self.latency)
+        body = json.dumps(rows).encode('utf-8') if self.command != 'HEAD' else b''
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Range', f'0-{max(len(rows) - 1, 0)}/{len(rows)}')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.startswith('/rest/v1/cleaners'):
+            self.respond([{'id': 1, 'name': 'Cleaner', 'employee_id': 'CLN001', 'assigned_blocks': '["A"]'}])
+        else:
+            self.respond([])
+
+    do_HEAD = do_GET
+
+    def log_message(self, *args):
+        pass
+
+def admin_stats(db):
+    db.admin_stats_legacy()
+
+def cleaner_stats(db):
+    db.gather({
+        'cleaner_stats.cleaner': lambda: db.get_cleaner(1),
+        'cleaner_stats.rollup': lambda: db.get_cleaner_rollup(1),
+        'cleaner_stats.history': lambda: db.recent_history(1, limit=5),
+        'cleaner_stats.archived_history': lambda: db.recent_history(1, limit=5, archived=True),
+    })
+
+def measure(db, fn, repeat):
+    fn(db)  # warm the connection pool
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(db)
+        timings.append((time.perf_counter() - t0) * 1000)
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--latency-ms', type=float, default=30)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+
+    PostgREST.latency = args.latency_ms / 1000
+    server = ThreadingHTTPServer(('127.0.0.1', 0), PostgREST)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_port}'
+    key = jwt.encode({'role': 'anon'}, 'benchmark-secret-key-0123456789abcdef')
+    db = SupabaseStorage(lambda: create_client(url, key, options=ClientOptions(httpx_client=build_http_client())))
+
+    print(f"{args.latency_ms}ms per query, {args.repeat} runs\n")
+    print(f"{'endpoint':<22}{'mode':<12}{'p50 ms':>10}{'p99 ms':>10}")
+    for name, fn in [('admin stats (5 reads)', admin_stats), ('cleaner stats (4)', cleaner_stats)]:
+        for mode, workers in [('sequential', 0), ('fan-out', args.workers)]:
+            storage.base.query_fanout = QueryFanout(mode, workers)
+            timings = measure(db, fn, args.repeat)
+            print(f"{name:<22}{mode:<12}{percentile(timings, 50):>10.1f}{percentile(timings, 99):>10.1f}")
+
+    print("\nper-query timings (fan-out):")
+    for query, t in storage.base.query_fanout.stats()['queries'].items():
+        print(f"  {query:<34} avg {t['avgMs']:>7.1f}ms  max {t['maxMs']:>7.1f}ms")
+    server.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+import os
+import time
+import tempfile
+import argparse
+
+from seed import seed, percentile
+from storage.sqlite_backend import SQLiteStorage
+
+# Per-query latency of the storage layer's read paths. Always runs on a seeded
+# local SQLite file; with --supabase it also runs the same calls against the
+# Supabase project in SUPABASE_URL / SUPABASE_KEY (read-only, nothing seeded),
+# using --group-no / --cleaner-id / --user-id to pick existing rows there.
+#
+#   python benchmarks/storage_latency.py --requests 20000
+#   python benchmarks/storage_latency.py --supabase --group-no A-101 --cleaner-id 1 --user-id 1
+
+STUDENT_FIELDS = ('id', 'request_id', 'type', 'instructions', 'status', 'created_at',
+                  'accepted_at', 'completed_at', 'rating', 'feedback')
+CLEANER_FIELDS = ('id', 'block', 'room_number', 'type', 'instructions', 'status',
+                  'accepted_at', 'completed_at', 'rating', 'feedback', 'student_name')
+PENDING_FIELDS = ('id', 'block', 'room_number', 'type', 'instructions', 'created_at', 'student_name')
+CLEANER_LIST_FIELDS = ('id', 'employee_id', 'name', 'assigned_blocks', 'is_active', 'created_at')
+
+def cases(db, group_no, cleaner_id, user_id, blocks):
+    yield 'get_user_profile', lambda: db.get_user_profile(user_id)
+    yield 'list_group_requests', lambda: db.list_group_requests(STUDENT_FIELDS, group_no=group_no, limit=51)
+    yield 'list_cleaner_requests', lambda: db.list_cleaner_requests(CLEANER_FIELDS, cleaner_id, limit=51)
+    yield 'list_pending_requests', lambda: db.list_pending_requests(PENDING_FIELDS, blocks, limit=51)
+    yield 'list_cleaners', lambda: db.list_cleaners(CLEANER_LIST_FIELDS)
+    yield 'admin_stats', db.admin_stats
+    yield 'get_cleaner_rollup', lambda: db.get_cleaner_rollup(cleaner_id)
+    yield 'recent_history', lambda: db.recent_history(cleaner_id)
+
+def measure(db, params, repeat):
+    results = {}
+    for name, call in cases(db, *params):
+        call()  # warm up (connection, statement cache)
+        timings = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            call()
+            timings.append((time.perf_counter() - t0) * 1000)
+        results[name] = timings
+    return results
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--supabase', action='store_true')
+    parser.add_argument('--group-no')
+    parser.add_argument('--cleaner-id', type=int, default=1)
+    parser.add_argument('--user-id', type=int, default=1)
+    args = parser.parse_args()
+
+    backends = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        conn = seed(path, n_requests=args.requests)
+        group_no = conn.execute("SELECT group_no FROM users WHERE id = 1").fetchone()[0]
+        conn.close()
+        params = (group_no, 1, 1, ['A', 'B', 'C'])
+        backends['sqlite'] = measure(SQLiteStorage(path), params, args.repeat)
+
+    if args.supabase:
+        from dotenv import load_dotenv
+        from storage import create_storage
+        load_dotenv()
+        os.environ['STORAGE_BACKEND'] = 'supabase'
+        db = create_storage()
+        params = (args.group_no, args.cleaner_id, args.user_id, ['A', 'B', 'C'])
+        backends['supabase'] = measure(db, params, args.repeat)
+
+    print(f"{args.requests} requests seeded (sqlite), {args.repeat} runs per query\n")
+    header = f"{'query':<24}" + ''.join(f"{b + ' p50':>16}{b + ' p99':>16}" for b in backends)
+    print(header)
+    for name in backends['sqlite']:
+        line = f"{name:<24}"
+        for timings in backends.values():
+            line += f"{percentile(timings[name], 50):>16.3f}{percentile(timings[name], 99):>16.3f}"
+        print(line)
+    print("\n(milliseconds)")
+
+if __name__ == '__main__':
+    main()
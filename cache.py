@@ -0,0 +1,86 @@
+import threading
+import time
+from collections import OrderedDict
+
+# ----------------- RESULT CACHE -----------------
+# Small in-process cache shared by all request threads of one worker.
+# Keys are tuples whose first element is a namespace (usually the endpoint),
+# e.g. ('admin_stats',) or ('cleaner_stats', 7), so a write can drop either a
+# single entry or everything under a namespace.
+
+class TTLCache:
+    def __init__(self, maxsize=256, ttl=15.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        # Returns (found, value) so that falsy values can be cached too
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at is None or expires_at > now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._data[key]
+                self.expirations += 1
+            self.misses += 1
+            return False, None
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_set(self, key, compute, ttl=None):
+        found, value = self.get(key)
+        if found:
+            return value
+        value = compute()
+        self.set(key, value, ttl)
+        return value
+
+    def invalidate(self, namespace, *params):
+        # invalidate('cleaner_stats', 7) drops one entry,
+        # invalidate('cleaner_stats') drops the whole namespace.
+        with self._lock:
+            if params:
+                keys = [(namespace,) + params] if (namespace,) + params in self._data else []
+            else:
+                keys = [k for k in self._data if k[0] == namespace]
+            for k in keys:
+                del self._data[k]
+            self.invalidations += len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': round(self.hits / lookups, 4) if lookups else 0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations
+            }
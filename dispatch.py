@@ -0,0 +1,227 @@
+import time
+import heapq
+import itertools
+import threading
+import datetime
+
+# ----------------- DISPATCH -----------------
+# Pending requests are held in memory, one priority queue per block, and
+# assigned to cleaners on shift as they become free instead of waiting for
+# a cleaner to poll and accept. The oldest request (after its type's head
+# start) across the blocks that have a free cleaner goes first, to the
+# least-loaded cleaner covering its block; a cleaner's load is their number
+# of open (assigned or in-progress) jobs.
+#
+# Assignment is one conditional write, db.assign_request: the request must
+# still be pending and the cleaner active, on shift and under max_jobs, all
+# checked in the database. So a request is never assigned twice and no
+# cleaner goes over the cap, whether a cleaner accepted by hand or another
+# worker process's dispatcher got there first. A refused assignment means
+# this process's view is stale; it is rebuilt and dispatch carries on.
+# Each process also rebuilds from the database on first use and every
+# resync_seconds, which picks up requests created, accepted and completed
+# through other processes and cleaners going on or off shift.
+#
+# An assigned job the cleaner has not started (or completed) within
+# start_timeout seconds goes back to pending at the next rebuild, to be
+# assigned again (to the same cleaner only if no one else covering the
+# block is free).
+
+# Seconds of head start per request type: quick jobs first keeps the
+# average wait down without starving deep cleans, which still age
+TYPE_HEAD_START_SECONDS = {'Normal Cleaning': 600}
+
+def epoch_seconds(value):
+    # created_at as stored (SQLite text or PostgREST ISO 8601), naive = UTC
+    if isinstance(value, (int, float)):
+        return float(value)
+    dt = value if isinstance(value, datetime.datetime) else datetime.datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return dt.timestamp()
+
+class Dispatcher:
+    def __init__(self, db, max_jobs=1, resync_seconds=30, start_timeout=None, clock=time.time):
+        # start_timeout: None never takes a job back. clock: wall time in
+        # epoch seconds (the simulation benchmark drives its own)
+        self.db = db
+        self.max_jobs = max_jobs
+        self.resync_seconds = resync_seconds
+        self.start_timeout = start_timeout
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._queues = {}     # block -> heap of (priority, seq, req_id)
+        self._pending = {}    # req_id -> (seq, block, created); stale heap entries are skipped
+        self._cleaners = {}   # cleaner_id -> {'blocks': [...], 'load': n, 'last': assigned at}
+        self._by_block = {}   # block -> [cleaner_id, ...]
+        self._synced_at = None
+        self.assigned = 0
+        self.conflicts = 0
+        self.requeued = 0
+        self._waits = {'count': 0, 'totalSeconds': 0.0, 'maxSeconds': 0.0}
+
+    # ---- queue state ----
+    def _push(self, row):
+        seq = next(self._seq)
+        created = epoch_seconds(row['created_at'])
+        priority = created - TYPE_HEAD_START_SECONDS.get(row.get('type'), 0)
+        self._pending[row['id']] = (seq, row['block'], created)
+        heapq.heappush(self._queues.setdefault(row['block'], []), (priority, seq, row['id']))
+
+    def _head(self, block):
+        heap = self._queues.get(block)
+        while heap:
+            _, seq, req_id = heap[0]
+            entry = self._pending.get(req_id)
+            if entry and entry[0] == seq:
+                return heap[0]
+            heapq.heappop(heap)
+        return None
+
+    def _free_cleaner(self, block):
+        best = None
+        for cleaner_id in self._by_block.get(block, ()):
+            c = self._cleaners[cleaner_id]
+            if c['load'] < self.max_jobs and (best is None or (c['load'], c['last']) < best[0]):
+                best = ((c['load'], c['last']), cleaner_id)
+        return best[1] if best else None
+
+    def load(self, pending_rows, cleaner_rows):
+        # Replaces all state: pending_rows {id, block, type, created_at},
+        # cleaner_rows {id, blocks, jobs} (active and on shift only)
+        with self._lock:
+            self._queues.clear()
+            self._pending.clear()
+            self._cleaners.clear()
+            self._by_block.clear()
+            for row in pending_rows:
+                self._push(row)
+            for row in cleaner_rows:
+                blocks = list(row['blocks'])
+                self._cleaners[row['id']] = {'blocks': blocks, 'load': row['jobs'] or 0, 'last': 0.0}
+                for block in blocks:
+                    self._by_block.setdefault(block, []).append(row['id'])
+            self._synced_at = time.monotonic()
+
+    def rebuild(self):
+        # Returns the requests taken back from cleaners who did not start
+        # them in time (now pending again, and queued)
+        requeued = []
+        if self.start_timeout is not None:
+            before = datetime.datetime.utcfromtimestamp(self.clock() - self.start_timeout)
+            requeued = self.db.requeue_assigned(before=before)
+        res = self.db.gather({'dispatch.queue': self.db.list_dispatch_queue,
+                              'dispatch.cleaners': self.db.list_cleaner_loads})
+        self.load(res['dispatch.queue'], res['dispatch.cleaners'])
+        with self._lock:
+            self.requeued += len(requeued)
+        return requeued
+
+    def invalidate(self):
+        # Rebuild before the next dispatch (e.g. a cleaner was added)
+        with self._lock:
+            self._synced_at = None
+
+    # ---- events from the routes ----
+    def add(self, row):
+        with self._lock:
+            if self._synced_at is not None:
+                self._push(row)
+
+    def accepted(self, req_id, cleaner_id):
+        # A cleaner accepted a request by hand
+        with self._lock:
+            self._pending.pop(req_id, None)
+            if cleaner_id in self._cleaners:
+                self._cleaners[cleaner_id]['load'] += 1
+
+    def released(self, cleaner_id):
+        # A cleaner completed a job
+        with self._lock:
+            c = self._cleaners.get(cleaner_id)
+            if c and c['load'] > 0:
+                c['load'] -= 1
+
+    # ---- assignment ----
+    def _next_assignment(self):
+        # Oldest head among blocks with a free cleaner; reserves the pair
+        best = None
+        for block in self._queues:
+            head = self._head(block)
+            if head is None or (best is not None and head >= best[0]):
+                continue
+            cleaner_id = self._free_cleaner(block)
+            if cleaner_id is not None:
+                best = (head, cleaner_id)
+        if best is None:
+            return None
+        (_, _, req_id), cleaner_id = best
+        _, _, created = self._pending.pop(req_id)
+        self._cleaners[cleaner_id]['load'] += 1
+        return req_id, cleaner_id, created
+
+    def dispatch(self):
+        # Assigns until no free cleaner covers a queued request. Returns the
+        # rows written, for the caller to publish: assigned ones, and any
+        # put back to pending by the rebuild.
+        rows = []
+        if self._synced_at is None or time.monotonic() - self._synced_at > self.resync_seconds:
+            rows.extend(self.rebuild())
+        rebuilt = False
+        while True:
+            with self._lock:
+                job = self._next_assignment()
+            if job is None:
+                return rows
+            req_id, cleaner_id, created = job
+            try:
+                row = self.db.assign_request(req_id, cleaner_id, self.max_jobs)
+            except Exception:
+                # State unknown; the next dispatch rebuilds from the database
+                self.invalidate()
+                raise
+            if row is None:
+                # Accepted elsewhere, or the cleaner went off shift or filled
+                # up through another process. Start again from the database,
+                # at most once per call.
+                with self._lock:
+                    self.conflicts += 1
+                if rebuilt:
+                    self.invalidate()
+                    return rows
+                rebuilt = True
+                rows.extend(self.rebuild())
+                continue
+            now = self.clock()
+            with self._lock:
+                self._cleaners[cleaner_id]['last'] = now
+                self.assigned += 1
+                wait = max(0.0, now - created)
+                self._waits['count'] += 1
+                self._waits['totalSeconds'] += wait
+                self._waits['maxSeconds'] = max(self._waits['maxSeconds'], wait)
+            rows.append(row)
+
+    def stats(self):
+        with self._lock:
+            queued = {}
+            for entry in self._pending.values():
+                queued[entry[1]] = queued.get(entry[1], 0) + 1
+            w = self._waits
+            return {
+                'maxJobsPerCleaner': self.max_jobs,
+                'synced': self._synced_at is not None,
+                'queued': sum(queued.values()),
+                'queuedByBlock': dict(sorted(queued.items())),
+                'cleaners': {cid: {'blocks': c['blocks'], 'openJobs': c['load']}
+                             for cid, c in sorted(self._cleaners.items())},
+                'startTimeoutSeconds': self.start_timeout,
+                'assigned': self.assigned,
+                'conflicts': self.conflicts,
+                'requeued': self.requeued,
+                # Time from creation to assignment, for requests this
+                # process assigned
+                'avgWaitSeconds': round(w['totalSeconds'] / w['count'], 1) if w['count'] else 0,
+                'maxWaitSeconds': round(w['maxSeconds'], 1)
+            }
@@ -0,0 +1,65 @@
+import json
+import queue
+import threading
+
+# ----------------- EVENT BUS -----------------
+# In-process pub/sub behind the /api/events Server-Sent Events stream.
+# Mutation routes publish request lifecycle events; every open stream holds a
+# Subscription whose filter decides which events it sees. Events only reach
+# streams served by the same worker process.
+
+class Subscription:
+    def __init__(self, match, maxsize):
+        self.match = match
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def get(self, timeout):
+        # Returns the next event, or None if nothing arrived within timeout
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+class EventBus:
+    def __init__(self, max_queue=100):
+        self.max_queue = max_queue
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self.published = 0
+
+    def subscribe(self, match):
+        sub = Subscription(match, self.max_queue)
+        with self._lock:
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def publish(self, event_type, data):
+        event = {'type': event_type, 'data': data}
+        with self._lock:
+            subscribers = list(self._subscribers)
+            self.published += 1
+        for sub in subscribers:
+            try:
+                if not sub.match(event):
+                    continue
+                # Never block a mutation route on a slow client
+                sub.queue.put_nowait(event)
+            except queue.Full:
+                sub.dropped += 1
+            except Exception as e:
+                print(f"Event filter error: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                'subscribers': len(self._subscribers),
+                'published': self.published
+            }
+
+def format_sse(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event['data'], default=str)}\n\n"
@@ -0,0 +1,195 @@
+import os
+import re
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+
+# ----------------- METRICS -----------------
+# Counters and histograms kept in process memory and served by /metrics in
+# the Prometheus text format (version 0.0.4). Every gunicorn worker has its
+# own registry, so scrape each worker or label them by instance. Recording
+# is a dict lookup and a few increments under one lock per metric; values
+# are only formatted when scraped.
+
+# Seconds; covers a cached JSON response up to a slow QR decode
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def label_text(names, values, extra=''):
+    pairs = [f'{n}="{escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = f"{name}_total"
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for label_values, v in sorted(values.items()):
+            yield f"{self.name}{label_text(self.labels, label_values)} {number(v)}"
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [per-bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            series[i] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, *label_values):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, *label_values)
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def samples(self):
+        with self._lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        for label_values, counts in sorted(series.items()):
+            cumulative = 0
+            for edge, n in zip(self.buckets + (float('inf'),), counts):
+                cumulative += n
+                le = f'le="{number(edge)}"'
+                yield f"{self.name}_bucket{label_text(self.labels, label_values, le)} {cumulative}"
+            labels = label_text(self.labels, label_values)
+            yield f"{self.name}_sum{labels} {counts[-1]!r}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+class Collected:
+    # Read when scraped from state kept elsewhere (caches, pools):
+    # collect() returns {label values tuple: value}. kind is 'gauge', or
+    # 'counter' for running totals (name them *_total).
+    def __init__(self, name, help, labels, collect, kind='gauge'):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.collect = collect
+        self.kind = kind
+
+    def reset(self):
+        pass
+
+    def samples(self):
+        for label_values, v in sorted(self.collect().items()):
+            yield f"{self.name}{label_text(self.labels, label_values)} {number(v)}"
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self.add(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self.add(Histogram(name, help, labels, buckets))
+
+    def collected(self, name, help, labels, collect, kind='gauge'):
+        return self.add(Collected(name, help, labels, collect, kind))
+
+    def reset(self):
+        for metric in self._metrics:
+            metric.reset()
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+registry = Registry()
+# A forked worker starts from zero rather than from the parent's counts
+os.register_at_fork(after_in_child=registry.reset)
+
+http_requests = registry.counter(
+    'cleanvit_http_requests', 'HTTP requests by route template, method and status.',
+    ('route', 'method', 'status'))
+http_request_seconds = registry.histogram(
+    'cleanvit_http_request_duration_seconds', 'Time to build the response, by route template and method.',
+    ('route', 'method'))
+db_call_seconds = registry.histogram(
+    'cleanvit_db_call_duration_seconds', 'Database calls by backend, table (or RPC) and operation.',
+    ('backend', 'table', 'operation'))
+qr_render_seconds = registry.histogram(
+    'cleanvit_qr_render_duration_seconds', 'QR PNG rendering, inline or in the pre-generated pool.',
+    ('source',))
+qr_decode_seconds = registry.histogram(
+    'cleanvit_qr_decode_duration_seconds', 'Scan decoding including pool queueing, by the stage that succeeded.',
+    ('stage',))
+bcrypt_seconds = registry.histogram(
+    'cleanvit_bcrypt_duration_seconds', 'Password hashing and verification including pool queueing.',
+    ('operation',))
+
+# ---- database call labels ----
+
+POSTGREST_OPERATIONS = {'GET': 'select', 'HEAD': 'count', 'POST': 'insert', 'PATCH': 'update', 'DELETE': 'delete'}
+SQL_WRITE_RE = re.compile(r'\b(INSERT\s+(?:OR\s+\w+\s+)?INTO|UPDATE|DELETE\s+FROM)\s+(\w+)', re.I)
+SQL_READ_RE = re.compile(r'\bFROM\s+(\w+)', re.I)
+
+def postgrest_target(method, path):
+    # /rest/v1/<table> or /rest/v1/rpc/<function> -> (table, operation)
+    parts = path.strip('/').split('/')
+    if len(parts) >= 3 and parts[:2] == ['rest', 'v1']:
+        if parts[2] == 'rpc' and len(parts) > 3:
+            return parts[3], 'rpc'
+        return parts[2], POSTGREST_OPERATIONS.get(method, method.lower())
+    return '/'.join(parts[:2]) or '/', method.lower()
+
+@lru_cache(maxsize=512)
+def sql_target(sql):
+    # Statement text -> (table, operation); the first write target wins, so
+    # an upsert's "DO UPDATE" does not count as a second table
+    m = SQL_WRITE_RE.search(sql)
+    if m:
+        return m.group(2), m.group(1).split()[0].lower()
+    m = SQL_READ_RE.search(sql)
+    return (m.group(1) if m else 'none'), 'select'
@@ -0,0 +1,85 @@
+import os
+import sys
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from storage import create_storage
+from storage.migrations import SCHEMA_MIGRATIONS_TABLE, list_migrations, migration_script, pending_migrations
+
+# Schema migrations (see storage/migrations.py).
+#   python migrate.py            SQLite: apply pending migrations (the app
+#                                also does this when it opens the file)
+#   python migrate.py --status   list migrations and whether each is applied
+#   python migrate.py --postgres print the pending Postgres migrations, to
+#                                paste into the Supabase SQL editor
+#   python migrate.py --postgres --apply
+#                                apply them over DATABASE_URL (needs psycopg)
+
+# Try import psycopg (only for --postgres --apply)
+try:
+    import psycopg
+    HAS_PSYCOPG = True
+except ImportError:
+    HAS_PSYCOPG = False
+
+def applied_postgres(db, conn=None):
+    # Versions in schema_migrations; none if the table does not exist yet
+    if conn is not None:
+        conn.execute(SCHEMA_MIGRATIONS_TABLE['postgres'])
+        return {r[0] for r in conn.execute("SELECT version FROM schema_migrations")}
+    try:
+        return {r['version'] for r in db.table('schema_migrations').select('version').execute().data}
+    except Exception:
+        return set()
+
+def main(args):
+    if '--postgres' in args:
+        dialect = 'postgres'
+        conn = None
+        if '--apply' in args:
+            url = os.getenv('DATABASE_URL')
+            if not (HAS_PSYCOPG and url):
+                print("--apply needs psycopg installed and DATABASE_URL set")
+                return 1
+            conn = psycopg.connect(url, autocommit=True)
+            applied = applied_postgres(None, conn)
+        else:
+            db = create_storage() if os.getenv('SUPABASE_URL') else None
+            applied = applied_postgres(db) if db and db.name == 'supabase' else set()
+    else:
+        dialect = 'sqlite'
+        db = create_storage()
+        if not db or db.name != 'sqlite':
+            print("Set STORAGE_BACKEND=sqlite (and SQLITE_PATH), or use --postgres")
+            return 1
+        # Opening the database applies pending migrations
+        applied = {r['version'] for r in db.conn().execute("SELECT version FROM schema_migrations").fetchall()}
+
+    if '--status' in args:
+        for version, name, _ in list_migrations(dialect):
+            print(f"{version} {name:<30} {'applied' if version in applied else 'pending'}")
+        return 0
+
+    pending = pending_migrations(dialect, applied)
+    if dialect == 'sqlite':
+        print(f"SQLite schema is at {max(applied, default='baseline')}")
+        return 0
+    if not pending:
+        print("-- Postgres schema is up to date")
+        return 0
+    if conn is None:
+        print(SCHEMA_MIGRATIONS_TABLE['postgres'] + ";\n")
+        for migration in pending:
+            print(f"-- {migration[0]}_{migration[1]}")
+            print(migration_script(dialect, migration))
+        return 0
+    for migration in pending:
+        # One transaction per file (the script has its own BEGIN/COMMIT)
+        conn.execute(migration_script(dialect, migration))
+        print(f"Applied {migration[0]}_{migration[1]}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,15 @@
+-- 0001. INDEXES FOR THE HOT QUERY SHAPES
+-- Every filter the app issues on a large table is served by an index; see
+-- benchmarks/explain_check.py. requests (group_no, created_at) is already
+-- covered by requests_group_created_idx (schema section 8).
+
+-- Dashboards and dispatch: WHERE status = ? [AND block = ?] ORDER BY created_at
+CREATE INDEX IF NOT EXISTS requests_status_block_created_idx ON requests (status, block, created_at);
+-- Cleaner stats, history and loads: WHERE cleaner_id = ? AND status = ? ORDER BY completed_at DESC
+CREATE INDEX IF NOT EXISTS requests_cleaner_status_completed_idx ON requests (cleaner_id, status, completed_at DESC);
+-- Admin recent reviews: WHERE rating IS NOT NULL ORDER BY completed_at DESC LIMIT 5
+CREATE INDEX IF NOT EXISTS requests_rated_completed_idx ON requests (completed_at DESC) WHERE rating IS NOT NULL;
+-- Roommates and bulk requests: WHERE group_no = ? / group_no IN (...)
+CREATE INDEX IF NOT EXISTS users_group_no_idx ON users (group_no);
+-- OTP verification: WHERE email = ? AND otp = ? AND used = FALSE ORDER BY created_at DESC LIMIT 1
+CREATE INDEX IF NOT EXISTS otps_email_otp_used_created_idx ON otps (email, otp, used, created_at DESC);
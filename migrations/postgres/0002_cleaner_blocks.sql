@@ -0,0 +1,57 @@
+-- 0002. CLEANER BLOCKS
+-- cleaners.assigned_blocks is a JSON array in a TEXT column, which no index
+-- can search. cleaner_blocks holds one row per (cleaner, block), kept in
+-- step with assigned_blocks by a trigger, so "who covers block X" is an
+-- index lookup. The app still writes assigned_blocks; the dispatcher reads
+-- cleaner_blocks (Storage.list_cleaner_loads).
+CREATE TABLE IF NOT EXISTS cleaner_blocks (
+    cleaner_id INTEGER NOT NULL REFERENCES cleaners(id) ON DELETE CASCADE,
+    block TEXT NOT NULL,
+    PRIMARY KEY (cleaner_id, block)
+);
+CREATE INDEX IF NOT EXISTS cleaner_blocks_block_idx ON cleaner_blocks (block, cleaner_id);
+
+-- Malformed assigned_blocks (not JSON, or not an array) count as [], as in
+-- SQLite, instead of failing the write or this migration
+CREATE OR REPLACE FUNCTION cleaner_block_values(p_blocks TEXT)
+RETURNS SETOF TEXT
+LANGUAGE plpgsql
+IMMUTABLE
+AS $$
+DECLARE
+    parsed JSONB;
+BEGIN
+    BEGIN
+        parsed := p_blocks::jsonb;
+    EXCEPTION WHEN invalid_text_representation THEN
+        RETURN;
+    END;
+    IF jsonb_typeof(parsed) IS DISTINCT FROM 'array' THEN
+        RETURN;
+    END IF;
+    RETURN QUERY SELECT DISTINCT jsonb_array_elements_text(parsed);
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION cleaners_sync_blocks()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    DELETE FROM cleaner_blocks WHERE cleaner_id = NEW.id;
+    INSERT INTO cleaner_blocks (cleaner_id, block)
+    SELECT NEW.id, b FROM cleaner_block_values(NEW.assigned_blocks) AS b;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS cleaners_sync_blocks ON cleaners;
+CREATE TRIGGER cleaners_sync_blocks
+AFTER INSERT OR UPDATE OF assigned_blocks ON cleaners
+FOR EACH ROW EXECUTE FUNCTION cleaners_sync_blocks();
+
+-- Backfill existing cleaners
+INSERT INTO cleaner_blocks (cleaner_id, block)
+SELECT c.id, b
+FROM cleaners c, cleaner_block_values(c.assigned_blocks) AS b
+ON CONFLICT DO NOTHING;
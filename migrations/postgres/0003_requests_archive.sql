@@ -0,0 +1,203 @@
+-- 0003. REQUESTS ARCHIVE
+-- Completed requests older than ARCHIVE_AFTER_DAYS are moved, oldest first
+-- and in batches, from requests to requests_archive by archive_requests()
+-- (called by archive.py). requests then only grows with active work, plus
+-- the recent history.
+--   - Rows keep their id, so keyset cursors and links stay valid.
+--   - The rollups are not touched by the move: the delete triggers skip
+--     rows being archived, and ratings given after archival are counted by
+--     a trigger on requests_archive.
+--   - all_requests is both tables, for the admin aggregates and the
+--     rollup rebuilds. Listings query each table on its own index instead.
+CREATE TABLE IF NOT EXISTS requests_archive (
+    id INTEGER PRIMARY KEY,
+    request_id TEXT UNIQUE NOT NULL,
+    user_id INTEGER REFERENCES users(id),
+    cleaner_id INTEGER REFERENCES cleaners(id),
+    block TEXT NOT NULL,
+    room_number TEXT NOT NULL,
+    group_no TEXT,
+    type TEXT NOT NULL,
+    instructions TEXT,
+    status TEXT,
+    qr_code TEXT,
+    created_at TIMESTAMPTZ,
+    accepted_at TIMESTAMPTZ,
+    completed_at TIMESTAMPTZ,
+    rating INTEGER,
+    feedback TEXT,
+    completed_by INTEGER REFERENCES cleaners(id),
+    archived_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- Same listing shapes as the requests indexes (schema section 8, 0001)
+CREATE INDEX IF NOT EXISTS requests_archive_group_created_idx ON requests_archive (group_no, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS requests_archive_user_created_idx ON requests_archive (user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS requests_archive_cleaner_accepted_idx ON requests_archive (cleaner_id, accepted_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS requests_archive_cleaner_completed_idx ON requests_archive (cleaner_id, completed_at DESC);
+CREATE INDEX IF NOT EXISTS requests_archive_rated_completed_idx ON requests_archive (completed_at DESC) WHERE rating IS NOT NULL;
+CREATE INDEX IF NOT EXISTS requests_archive_block_status_idx ON requests_archive (block, status);
+-- The archiver's batch: WHERE status = 'completed' AND completed_at < ? ORDER BY completed_at
+CREATE INDEX IF NOT EXISTS requests_status_completed_idx ON requests (status, completed_at);
+
+CREATE OR REPLACE VIEW all_requests AS
+    SELECT id, request_id, user_id, cleaner_id, block, room_number, group_no, type, instructions,
+           status, created_at, accepted_at, completed_at, rating, feedback, completed_by
+    FROM requests
+    UNION ALL
+    SELECT id, request_id, user_id, cleaner_id, block, room_number, group_no, type, instructions,
+           status, created_at, accepted_at, completed_at, rating, feedback, completed_by
+    FROM requests_archive;
+
+-- Deletes made by archive_requests() leave the rollups alone
+DROP TRIGGER IF EXISTS requests_cleaner_rollup ON requests;
+CREATE TRIGGER requests_cleaner_rollup
+AFTER INSERT OR UPDATE OF cleaner_id, status, rating, completed_at ON requests
+FOR EACH ROW EXECUTE FUNCTION requests_cleaner_rollup();
+DROP TRIGGER IF EXISTS requests_cleaner_rollup_delete ON requests;
+CREATE TRIGGER requests_cleaner_rollup_delete
+AFTER DELETE ON requests
+FOR EACH ROW WHEN (current_setting('cleanvit.archiving', true) IS DISTINCT FROM 'on')
+EXECUTE FUNCTION requests_cleaner_rollup();
+
+DROP TRIGGER IF EXISTS requests_analytics_rollup ON requests;
+CREATE TRIGGER requests_analytics_rollup
+AFTER INSERT OR UPDATE OF created_at, block, type, status, accepted_at, completed_at ON requests
+FOR EACH ROW EXECUTE FUNCTION requests_analytics_rollup();
+DROP TRIGGER IF EXISTS requests_analytics_rollup_delete ON requests;
+CREATE TRIGGER requests_analytics_rollup_delete
+AFTER DELETE ON requests
+FOR EACH ROW WHEN (current_setting('cleanvit.archiving', true) IS DISTINCT FROM 'on')
+EXECUTE FUNCTION requests_analytics_rollup();
+
+-- A rating on an archived request (status stays completed, so only the
+-- rating terms change)
+DROP TRIGGER IF EXISTS requests_archive_cleaner_rollup ON requests_archive;
+CREATE TRIGGER requests_archive_cleaner_rollup
+AFTER UPDATE OF rating ON requests_archive
+FOR EACH ROW EXECUTE FUNCTION requests_cleaner_rollup();
+
+-- Moves up to p_limit requests completed before p_before; returns the count.
+-- SKIP LOCKED lets two archivers run at once without waiting on each other.
+CREATE OR REPLACE FUNCTION archive_requests(p_before TIMESTAMPTZ, p_limit INTEGER)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    n INTEGER;
+BEGIN
+    PERFORM set_config('cleanvit.archiving', 'on', true);
+    WITH moved AS (
+        DELETE FROM requests
+        WHERE id IN (SELECT id FROM requests
+                     WHERE status = 'completed' AND completed_at < p_before
+                     ORDER BY completed_at
+                     LIMIT p_limit
+                     FOR UPDATE SKIP LOCKED)
+        RETURNING *
+    )
+    INSERT INTO requests_archive (id, request_id, user_id, cleaner_id, block, room_number, group_no, type,
+                                  instructions, status, qr_code, created_at, accepted_at, completed_at,
+                                  rating, feedback, completed_by)
+    SELECT id, request_id, user_id, cleaner_id, block, room_number, group_no, type,
+           instructions, status, qr_code, created_at, accepted_at, completed_at,
+           rating, feedback, completed_by
+    FROM moved;
+    GET DIAGNOSTICS n = ROW_COUNT;
+    PERFORM set_config('cleanvit.archiving', 'off', true);
+    RETURN n;
+END;
+$$;
+
+-- Admin stats, now over both tables (same shape as schema section 6)
+CREATE OR REPLACE FUNCTION admin_stats()
+RETURNS JSON
+LANGUAGE SQL
+STABLE
+AS $$
+    WITH per_block AS (
+        SELECT block,
+               COUNT(*) AS total,
+               COUNT(*) FILTER (WHERE status = 'pending') AS pending,
+               COUNT(*) FILTER (WHERE status = 'completed') AS completed
+        FROM all_requests
+        GROUP BY block
+    ),
+    reviews AS (
+        SELECT u.name AS student, c.name AS cleaner, r.rating, r.feedback, r.completed_at AS date
+        FROM all_requests r
+        LEFT JOIN users u ON u.id = r.user_id
+        LEFT JOIN cleaners c ON c.id = r.cleaner_id
+        WHERE r.rating IS NOT NULL
+        ORDER BY r.completed_at DESC NULLS LAST
+        LIMIT 5
+    )
+    SELECT json_build_object(
+        'total', COALESCE((SELECT SUM(total) FROM per_block), 0),
+        'pending', COALESCE((SELECT SUM(pending) FROM per_block), 0),
+        'completed', COALESCE((SELECT SUM(completed) FROM per_block), 0),
+        'blocks', COALESCE((SELECT json_agg(json_build_object('block', block, 'count', total) ORDER BY block) FROM per_block), '[]'::json),
+        'reviews', COALESCE((SELECT json_agg(reviews) FROM reviews), '[]'::json)
+    );
+$$;
+
+-- Rollup rebuilds, now over both tables (schema sections 10 and 11)
+CREATE OR REPLACE FUNCTION rebuild_cleaner_rollups()
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    n INTEGER;
+BEGIN
+    LOCK TABLE requests, requests_archive IN SHARE MODE;
+    DELETE FROM cleaner_rollups;
+    INSERT INTO cleaner_rollups (cleaner_id, completed_count, rating_sum, rating_count, last_completed_at)
+    SELECT cleaner_id,
+           COUNT(*) FILTER (WHERE status = 'completed'),
+           COALESCE(SUM(rating), 0),
+           COUNT(rating),
+           MAX(completed_at) FILTER (WHERE status = 'completed')
+    FROM all_requests
+    WHERE cleaner_id IS NOT NULL AND (status = 'completed' OR rating IS NOT NULL)
+    GROUP BY cleaner_id;
+    GET DIAGNOSTICS n = ROW_COUNT;
+    RETURN n;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION rebuild_request_rollups()
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    n INTEGER;
+BEGIN
+    LOCK TABLE requests, requests_archive IN SHARE MODE;
+    DELETE FROM request_rollups;
+    DELETE FROM latency_rollups;
+
+    INSERT INTO request_rollups (granularity, bucket, dimension, value, count)
+    SELECT g, date_trunc(g, r.created_at), d.dimension, d.value, COUNT(*)
+    FROM all_requests r
+    CROSS JOIN unnest(ARRAY['hour', 'day']) AS g
+    CROSS JOIN LATERAL (VALUES ('status', COALESCE(r.status, 'pending')),
+                               ('block', r.block),
+                               ('type', r.type)) AS d(dimension, value)
+    GROUP BY 1, 2, 3, 4;
+    GET DIAGNOSTICS n = ROW_COUNT;
+
+    INSERT INTO latency_rollups (granularity, bucket, metric, bin, count)
+    SELECT g, date_trunc(g, accepted_at), 'accept', latency_bin(EXTRACT(EPOCH FROM accepted_at - created_at)), COUNT(*)
+    FROM all_requests, unnest(ARRAY['hour', 'day']) AS g
+    WHERE accepted_at IS NOT NULL
+    GROUP BY 1, 2, 3, 4;
+
+    INSERT INTO latency_rollups (granularity, bucket, metric, bin, count)
+    SELECT g, date_trunc(g, completed_at), 'complete', latency_bin(EXTRACT(EPOCH FROM completed_at - accepted_at)), COUNT(*)
+    FROM all_requests, unnest(ARRAY['hour', 'day']) AS g
+    WHERE completed_at IS NOT NULL AND accepted_at IS NOT NULL
+    GROUP BY 1, 2, 3, 4;
+
+    RETURN n;
+END;
+$$;
@@ -0,0 +1,15 @@
+-- 0004. FINER LATENCY BINS
+-- The first latency bin covered everything under a minute, so sub-second
+-- accepts were reported as tens of seconds. Bins now start at 1, 5, 15
+-- and 30 s. Bin numbers shift, so the histograms are rebuilt from
+-- all_requests; writers wait for the lock instead of binning against the
+-- old edges meanwhile.
+LOCK TABLE requests, requests_archive IN SHARE MODE;
+DELETE FROM latency_rollups;
+DELETE FROM latency_bins;
+INSERT INTO latency_bins (bin, lower_seconds, upper_seconds) VALUES
+    (0, -1e18, 1), (1, 1, 5), (2, 5, 15), (3, 15, 30), (4, 30, 60),
+    (5, 60, 120), (6, 120, 300), (7, 300, 600), (8, 600, 900), (9, 900, 1800),
+    (10, 1800, 3600), (11, 3600, 7200), (12, 7200, 14400), (13, 14400, 28800),
+    (14, 28800, 86400), (15, 86400, 1e18);
+SELECT rebuild_request_rollups();
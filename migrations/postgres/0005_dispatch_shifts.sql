@@ -0,0 +1,30 @@
+-- 0005. DISPATCH SHIFTS AND ASSIGNMENTS
+-- The dispatcher (dispatch.py) only hands jobs to cleaners who are on
+-- shift, which they switch themselves (PUT /api/cleaner/shift). A handed-out
+-- job is 'assigned' until the cleaner starts it; one not started in time
+-- goes back to 'pending' (Storage.requeue_assigned), found through the
+-- partial index below.
+ALTER TABLE cleaners ADD COLUMN IF NOT EXISTS on_shift BOOLEAN NOT NULL DEFAULT FALSE;
+CREATE INDEX IF NOT EXISTS requests_assigned_accepted_idx ON requests (accepted_at) WHERE status = 'assigned';
+
+-- pending -> assigned, only while the cleaner is active, on shift and has
+-- fewer than p_max_jobs open jobs. Locking the cleaner row makes
+-- concurrent assignments to the same cleaner (from several app processes)
+-- take turns, so each one counts the jobs the previous one assigned.
+CREATE OR REPLACE FUNCTION assign_request(p_id INTEGER, p_cleaner_id INTEGER, p_max_jobs INTEGER)
+RETURNS SETOF requests
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    PERFORM 1 FROM cleaners WHERE id = p_cleaner_id AND is_active AND on_shift FOR UPDATE;
+    IF NOT FOUND THEN
+        RETURN;
+    END IF;
+    RETURN QUERY
+    UPDATE requests SET status = 'assigned', cleaner_id = p_cleaner_id, accepted_at = NOW()
+    WHERE id = p_id AND status = 'pending'
+      AND (SELECT COUNT(*) FROM requests
+           WHERE cleaner_id = p_cleaner_id AND status IN ('assigned', 'in_progress')) < p_max_jobs
+    RETURNING *;
+END;
+$$;
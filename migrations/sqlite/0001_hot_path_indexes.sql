@@ -0,0 +1,6 @@
+-- 0001. INDEXES FOR THE HOT QUERY SHAPES (see migrations/postgres)
+CREATE INDEX IF NOT EXISTS requests_status_block_created_idx ON requests (status, block, created_at);
+CREATE INDEX IF NOT EXISTS requests_cleaner_status_completed_idx ON requests (cleaner_id, status, completed_at DESC);
+CREATE INDEX IF NOT EXISTS requests_rated_completed_idx ON requests (completed_at DESC) WHERE rating IS NOT NULL;
+CREATE INDEX IF NOT EXISTS users_group_no_idx ON users (group_no);
+CREATE INDEX IF NOT EXISTS otps_email_otp_used_created_idx ON otps (email, otp, used, created_at DESC);
@@ -0,0 +1,35 @@
+-- 0002. CLEANER BLOCKS (see migrations/postgres)
+-- Foreign keys are not enforced by default in SQLite, so a delete trigger
+-- stands in for ON DELETE CASCADE. Malformed assigned_blocks (not JSON, or
+-- not an array) count as [].
+CREATE TABLE IF NOT EXISTS cleaner_blocks (
+    cleaner_id INTEGER NOT NULL REFERENCES cleaners(id) ON DELETE CASCADE,
+    block TEXT NOT NULL,
+    PRIMARY KEY (cleaner_id, block)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cleaner_blocks_block_idx ON cleaner_blocks (block, cleaner_id);
+
+CREATE TRIGGER IF NOT EXISTS cleaners_blocks_insert
+AFTER INSERT ON cleaners
+BEGIN
+    INSERT OR IGNORE INTO cleaner_blocks (cleaner_id, block)
+    SELECT NEW.id, value FROM json_each(CASE WHEN NOT json_valid(NEW.assigned_blocks) THEN '[]' WHEN json_type(NEW.assigned_blocks) = 'array' THEN NEW.assigned_blocks ELSE '[]' END);
+END;
+
+CREATE TRIGGER IF NOT EXISTS cleaners_blocks_update
+AFTER UPDATE OF assigned_blocks ON cleaners
+BEGIN
+    DELETE FROM cleaner_blocks WHERE cleaner_id = NEW.id;
+    INSERT OR IGNORE INTO cleaner_blocks (cleaner_id, block)
+    SELECT NEW.id, value FROM json_each(CASE WHEN NOT json_valid(NEW.assigned_blocks) THEN '[]' WHEN json_type(NEW.assigned_blocks) = 'array' THEN NEW.assigned_blocks ELSE '[]' END);
+END;
+
+CREATE TRIGGER IF NOT EXISTS cleaners_blocks_delete
+AFTER DELETE ON cleaners
+BEGIN
+    DELETE FROM cleaner_blocks WHERE cleaner_id = OLD.id;
+END;
+
+INSERT OR IGNORE INTO cleaner_blocks (cleaner_id, block)
+SELECT c.id, j.value
+FROM cleaners c, json_each(CASE WHEN NOT json_valid(c.assigned_blocks) THEN '[]' WHEN json_type(c.assigned_blocks) = 'array' THEN c.assigned_blocks ELSE '[]' END) j;
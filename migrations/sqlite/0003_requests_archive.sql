@@ -0,0 +1,104 @@
+-- 0003. REQUESTS ARCHIVE (see migrations/postgres)
+-- archive_requests() in SQLiteStorage copies a batch into requests_archive
+-- and then deletes it from requests; the delete triggers skip rows that
+-- already have their archived copy.
+CREATE TABLE IF NOT EXISTS requests_archive (
+    id INTEGER PRIMARY KEY,
+    request_id TEXT UNIQUE NOT NULL,
+    user_id INTEGER NOT NULL,
+    cleaner_id INTEGER,
+    block TEXT NOT NULL,
+    room_number TEXT NOT NULL,
+    group_no TEXT,
+    type TEXT NOT NULL,
+    instructions TEXT,
+    status TEXT,
+    qr_code TEXT,
+    created_at DATETIME,
+    accepted_at DATETIME,
+    completed_at DATETIME,
+    rating INTEGER,
+    feedback TEXT,
+    completed_by INTEGER,
+    archived_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id),
+    FOREIGN KEY (cleaner_id) REFERENCES cleaners(id),
+    FOREIGN KEY (completed_by) REFERENCES cleaners(id)
+);
+
+CREATE INDEX IF NOT EXISTS requests_archive_group_created_idx ON requests_archive (group_no, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS requests_archive_user_created_idx ON requests_archive (user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS requests_archive_cleaner_accepted_idx ON requests_archive (cleaner_id, accepted_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS requests_archive_cleaner_completed_idx ON requests_archive (cleaner_id, completed_at DESC);
+CREATE INDEX IF NOT EXISTS requests_archive_rated_completed_idx ON requests_archive (completed_at DESC) WHERE rating IS NOT NULL;
+CREATE INDEX IF NOT EXISTS requests_archive_block_status_idx ON requests_archive (block, status);
+CREATE INDEX IF NOT EXISTS requests_status_completed_idx ON requests (status, completed_at);
+
+CREATE VIEW IF NOT EXISTS all_requests AS
+    SELECT id, request_id, user_id, cleaner_id, block, room_number, group_no, type, instructions,
+           status, created_at, accepted_at, completed_at, rating, feedback, completed_by
+    FROM requests
+    UNION ALL
+    SELECT id, request_id, user_id, cleaner_id, block, room_number, group_no, type, instructions,
+           status, created_at, accepted_at, completed_at, rating, feedback, completed_by
+    FROM requests_archive;
+
+DROP TRIGGER IF EXISTS requests_rollup_delete;
+CREATE TRIGGER requests_rollup_delete
+AFTER DELETE ON requests
+WHEN OLD.cleaner_id IS NOT NULL AND NOT EXISTS (SELECT 1 FROM requests_archive WHERE id = OLD.id)
+BEGIN
+    UPDATE cleaner_rollups SET
+        completed_count = completed_count - (OLD.status = 'completed'),
+        rating_sum = rating_sum - COALESCE(OLD.rating, 0),
+        rating_count = rating_count - (OLD.rating IS NOT NULL)
+    WHERE cleaner_id = OLD.cleaner_id;
+END;
+
+DROP TRIGGER IF EXISTS requests_analytics_delete;
+CREATE TRIGGER requests_analytics_delete
+AFTER DELETE ON requests
+WHEN NOT EXISTS (SELECT 1 FROM requests_archive WHERE id = OLD.id)
+BEGIN
+    UPDATE request_rollups SET count = count - 1
+    WHERE granularity = 'hour' AND bucket = strftime('%Y-%m-%d %H:00:00', OLD.created_at)
+      AND (dimension, value) IN (VALUES ('status', COALESCE(OLD.status, 'pending')), ('block', OLD.block), ('type', OLD.type));
+    UPDATE latency_rollups SET count = count - 1
+    WHERE granularity = 'hour' AND bucket = strftime('%Y-%m-%d %H:00:00', OLD.accepted_at) AND metric = 'accept'
+      AND OLD.created_at IS NOT NULL
+      AND bin = (SELECT bin FROM latency_bins
+                 WHERE (julianday(OLD.accepted_at) - julianday(OLD.created_at)) * 86400 >= lower_seconds
+                   AND (julianday(OLD.accepted_at) - julianday(OLD.created_at)) * 86400 < upper_seconds);
+    UPDATE latency_rollups SET count = count - 1
+    WHERE granularity = 'hour' AND bucket = strftime('%Y-%m-%d %H:00:00', OLD.completed_at) AND metric = 'complete'
+      AND OLD.accepted_at IS NOT NULL
+      AND bin = (SELECT bin FROM latency_bins
+                 WHERE (julianday(OLD.completed_at) - julianday(OLD.accepted_at)) * 86400 >= lower_seconds
+                   AND (julianday(OLD.completed_at) - julianday(OLD.accepted_at)) * 86400 < upper_seconds);
+    UPDATE request_rollups SET count = count - 1
+    WHERE granularity = 'day' AND bucket = strftime('%Y-%m-%d 00:00:00', OLD.created_at)
+      AND (dimension, value) IN (VALUES ('status', COALESCE(OLD.status, 'pending')), ('block', OLD.block), ('type', OLD.type));
+    UPDATE latency_rollups SET count = count - 1
+    WHERE granularity = 'day' AND bucket = strftime('%Y-%m-%d 00:00:00', OLD.accepted_at) AND metric = 'accept'
+      AND OLD.created_at IS NOT NULL
+      AND bin = (SELECT bin FROM latency_bins
+                 WHERE (julianday(OLD.accepted_at) - julianday(OLD.created_at)) * 86400 >= lower_seconds
+                   AND (julianday(OLD.accepted_at) - julianday(OLD.created_at)) * 86400 < upper_seconds);
+    UPDATE latency_rollups SET count = count - 1
+    WHERE granularity = 'day' AND bucket = strftime('%Y-%m-%d 00:00:00', OLD.completed_at) AND metric = 'complete'
+      AND OLD.accepted_at IS NOT NULL
+      AND bin = (SELECT bin FROM latency_bins
+                 WHERE (julianday(OLD.completed_at) - julianday(OLD.accepted_at)) * 86400 >= lower_seconds
+                   AND (julianday(OLD.completed_at) - julianday(OLD.accepted_at)) * 86400 < upper_seconds);
+END;
+
+-- A rating on an archived request (it stays completed)
+CREATE TRIGGER IF NOT EXISTS requests_archive_rollup_rating
+AFTER UPDATE OF rating ON requests_archive
+WHEN NEW.cleaner_id IS NOT NULL
+BEGIN
+    UPDATE cleaner_rollups SET
+        rating_sum = rating_sum - COALESCE(OLD.rating, 0) + COALESCE(NEW.rating, 0),
+        rating_count = rating_count - (OLD.rating IS NOT NULL) + (NEW.rating IS NOT NULL)
+    WHERE cleaner_id = NEW.cleaner_id;
+END;
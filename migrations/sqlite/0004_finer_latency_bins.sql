@@ -0,0 +1,22 @@
+-- 0004. FINER LATENCY BINS (see migrations/postgres)
+-- Re-bins the latency histograms (SQLiteStorage.rebuild_request_rollups)
+DELETE FROM latency_rollups;
+DELETE FROM latency_bins;
+INSERT INTO latency_bins (bin, lower_seconds, upper_seconds) VALUES
+    (0, -1e18, 1), (1, 1, 5), (2, 5, 15), (3, 15, 30), (4, 30, 60),
+    (5, 60, 120), (6, 120, 300), (7, 300, 600), (8, 600, 900), (9, 900, 1800),
+    (10, 1800, 3600), (11, 3600, 7200), (12, 7200, 14400), (13, 14400, 28800),
+    (14, 28800, 86400), (15, 86400, 1e18);
+WITH g(granularity, fmt) AS (VALUES ('hour', '%Y-%m-%d %H:00:00'), ('day', '%Y-%m-%d 00:00:00')),
+l(metric, at, secs) AS (
+    SELECT 'accept', accepted_at, (julianday(accepted_at) - julianday(created_at)) * 86400
+    FROM all_requests WHERE accepted_at IS NOT NULL AND created_at IS NOT NULL
+    UNION ALL
+    SELECT 'complete', completed_at, (julianday(completed_at) - julianday(accepted_at)) * 86400
+    FROM all_requests WHERE completed_at IS NOT NULL AND accepted_at IS NOT NULL
+)
+INSERT INTO latency_rollups (granularity, bucket, metric, bin, count)
+SELECT g.granularity, strftime(g.fmt, l.at), l.metric, b.bin, COUNT(*)
+FROM l, g, latency_bins b
+WHERE l.secs >= b.lower_seconds AND l.secs < b.upper_seconds
+GROUP BY 1, 2, 3, 4;
@@ -0,0 +1,5 @@
+-- 0005. DISPATCH SHIFTS AND ASSIGNMENTS (see migrations/postgres)
+-- The job cap is checked by SQLiteStorage.assign_request itself, since
+-- SQLite runs one write at a time.
+ALTER TABLE cleaners ADD COLUMN on_shift INTEGER NOT NULL DEFAULT 0;
+CREATE INDEX IF NOT EXISTS requests_assigned_accepted_idx ON requests (accepted_at) WHERE status = 'assigned';
@@ -0,0 +1,52 @@
+import os
+
+import tracing
+from metrics import bcrypt_seconds
+from workers import BoundedProcessPool
+
+# Try import bcrypt
+try:
+    import bcrypt
+    HAS_BCRYPT = True
+except ImportError:
+    HAS_BCRYPT = False
+    from werkzeug.security import generate_password_hash, check_password_hash
+
+# ----------------- PASSWORD HASHING -----------------
+# bcrypt costs hundreds of milliseconds of CPU per call, so hashing and
+# verification run in a small dedicated process pool. HASH_POOL_SIZE=0 keeps
+# them inline (e.g. on serverless deployments). HASH_QUEUE_LIMIT should stay
+# below the worker's request thread count: every queued hash holds a request
+# thread, so past the limit logins get a fast 503 and other endpoints keep
+# their threads.
+
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', 12))
+HASH_TIMEOUT_SECONDS = float(os.getenv('HASH_TIMEOUT_SECONDS', 10))
+
+hash_pool = BoundedProcessPool(
+    'bcrypt',
+    max_workers=int(os.getenv('HASH_POOL_SIZE', 2)),
+    max_pending=int(os.getenv('HASH_QUEUE_LIMIT', 4))
+)
+
+def _hash(password, rounds):
+    if HAS_BCRYPT:
+        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+    else:
+        return generate_password_hash(password)
+
+def _verify(password, hashed):
+    if HAS_BCRYPT:
+        if isinstance(hashed, str):
+            hashed = hashed.encode('utf-8')
+        return bcrypt.checkpw(password.encode('utf-8'), hashed)
+    else:
+        return check_password_hash(hashed, password)
+
+def hash_password(password):
+    with bcrypt_seconds.time('hash'), tracing.span('bcrypt'):
+        return hash_pool.run(_hash, password, BCRYPT_ROUNDS, timeout=HASH_TIMEOUT_SECONDS)
+
+def verify_password(password, hashed):
+    with bcrypt_seconds.time('verify'), tracing.span('bcrypt'):
+        return hash_pool.run(_verify, password, hashed, timeout=HASH_TIMEOUT_SECONDS)
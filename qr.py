@@ -0,0 +1,139 @@
+import io
+import os
+import re
+import hashlib
+import threading
+from collections import deque
+
+from cache import TTLCache
+import tracing
+from metrics import qr_render_seconds
+
+# ----------------- QR RENDERING -----------------
+# QR codes only encode the request_id, so they are rendered on demand by
+# /api/requests/<request_id>/qr.png instead of being stored with the row.
+
+REQUEST_ID_RE = re.compile(r'^REQ-[0-9A-F]{8}$')
+
+def new_request_ids(n):
+    # n distinct request_ids (REQ- + 8 random hex digits) from one
+    # os.urandom call
+    ids = []
+    seen = set()
+    while len(ids) < n:
+        raw = os.urandom(4 * (n - len(ids))).hex().upper()
+        for i in range(0, len(raw), 8):
+            req_id = f"REQ-{raw[i:i + 8]}"
+            if req_id not in seen:
+                seen.add(req_id)
+                ids.append(req_id)
+    return ids
+
+def new_request_id():
+    return new_request_ids(1)[0]
+
+# Rendered PNGs are deterministic per request_id, so entries never expire;
+# the LRU bound keeps memory in check (~1 KB per image).
+qr_cache = TTLCache(maxsize=1024, ttl=0)
+
+def render_qr_png(data):
+    # qrcode (and Pillow behind it) is imported on the first render, by the
+    # pool's refill thread or the qr.png route, not at startup
+    import qrcode
+    qr = qrcode.QRCode(version=1, box_size=10, border=5)
+    qr.add_data(data)
+    qr.make(fit=True)
+    img = qr.make_image(fill_color="black", back_color="white")
+    buf = io.BytesIO()
+    img.save(buf)
+    return buf.getvalue()
+
+def render_qr(request_id, source='on_demand'):
+    # (png_bytes, etag)
+    with qr_render_seconds.time(source), tracing.span('qr_render'):
+        png = render_qr_png(request_id)
+    return png, hashlib.sha1(png).hexdigest()
+
+def get_qr_png(request_id):
+    # Returns (png_bytes, etag)
+    return qr_cache.get_or_set(('qr', request_id), lambda: render_qr(request_id))
+
+# ----------------- PRE-GENERATED QR POOL -----------------
+# A student's client fetches the QR image right after creating a request.
+# A background thread keeps up to QR_POOL_SIZE (request_id, png, etag)
+# entries ready; create_request takes one and puts its PNG straight into
+# qr_cache, so neither the create call nor that first fetch renders
+# anything. The thread refills once the pool is below half. An empty pool
+# falls back to a fresh id, rendered on demand as before. QR_POOL_SIZE=0
+# turns the pool off (e.g. on serverless deployments).
+
+class QRPool:
+    def __init__(self, size):
+        self.size = size
+        self._ready = deque()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self.hits = 0
+        self.misses = 0
+        self.generated = 0
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._refill, name='qr-pool', daemon=True)
+                self._thread.start()
+
+    def _refill(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            while len(self._ready) < self.size:
+                req_id = new_request_id()
+                self._ready.append((req_id,) + render_qr(req_id, 'pool'))
+                with self._lock:
+                    self.generated += 1
+
+    def take(self):
+        # A request_id whose QR is already in qr_cache when the pool has one
+        if not self.size:
+            return new_request_id()
+        if self._thread is None:
+            self._start()
+        try:
+            req_id, png, etag = self._ready.popleft()
+        except IndexError:
+            with self._lock:
+                self.misses += 1
+            self._wake.set()
+            return new_request_id()
+        with self._lock:
+            self.hits += 1
+        qr_cache.set(('qr', req_id), (png, etag))
+        if len(self._ready) < self.size // 2:
+            self._wake.set()
+        return req_id
+
+    def reset(self):
+        # After a fork: the parent's ids must not be handed out twice, and
+        # its refill thread does not exist here
+        self._ready.clear()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self.hits = self.misses = self.generated = 0
+
+    def stats(self):
+        with self._lock:
+            taken = self.hits + self.misses
+            return {
+                'size': self.size,
+                'ready': len(self._ready),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': round(self.hits / taken, 4) if taken else 0,
+                'generated': self.generated
+            }
+
+qr_pool = QRPool(int(os.getenv('QR_POOL_SIZE', 64)))
+os.register_at_fork(after_in_child=qr_pool.reset)
@@ -0,0 +1,21 @@
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from storage import create_storage
+
+# Reconciliation job: recompute every cleaner_rollups row (completed count,
+# rating sum/count, last completion) and the hourly/daily analytics rollups
+# from the requests table. Safe to run while the app is serving; writers
+# wait for each rebuild to finish.
+#   python rebuild_rollups.py
+
+db = create_storage()
+if not db:
+    print("Database not configured!")
+    exit(1)
+
+n = db.rebuild_cleaner_rollups()
+print(f"Rebuilt rollups for {n} cleaners ({db.name})")
+n = db.rebuild_request_rollups()
+print(f"Rebuilt {n} request analytics rollup rows ({db.name})")
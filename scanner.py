@@ -0,0 +1,229 @@
+import os
+import struct
+import threading
+import time
+
+import tracing
+from metrics import qr_decode_seconds
+from workers import BoundedProcessPool, PoolBroken, PoolOverloaded
+
+# ----------------- DECODER IMPORTS -----------------
+# OpenCV, numpy and pyzbar take ~100 ms to import, more than the rest of the
+# app together, and only the scan route uses them. They are imported on the
+# first scan in each process (load_decoders), so a cold start (serverless,
+# a fresh gunicorn worker) does not pay for them; a scan worker process
+# loads them on its first decode. The warnings for a missing library are
+# printed then too. HAS_CV2 / HAS_PYZBAR are None until loaded.
+
+cv2 = None
+np = None
+zbar_decode = None
+HAS_CV2 = None
+HAS_PYZBAR = None
+
+_load_lock = threading.Lock()
+
+def load_decoders():
+    # True if OpenCV (which every upload is loaded with) is available
+    global cv2, np, zbar_decode, HAS_CV2, HAS_PYZBAR
+    if HAS_CV2 is None:
+        with _load_lock, tracing.span('load_decoders'):
+            if HAS_CV2 is None:
+                try:
+                    from pyzbar.pyzbar import decode as zbar_decode
+                    HAS_PYZBAR = True
+                except Exception as e:
+                    print(f"Warning: Pyzbar not found or DLL missing: {e}")
+                    HAS_PYZBAR = False
+                try:
+                    import cv2
+                    import numpy as np
+                    available = True
+                except ImportError as e:
+                    print(f"Warning: OpenCV (cv2) not found: {e}")
+                    available = False
+                # Set last: other threads check it without the lock
+                HAS_CV2 = available
+    return HAS_CV2
+
+# ----------------- QR SCAN DECODING -----------------
+# Phone photos are often 12 MP while the QR code needs only a few hundred
+# pixels, so scans are decoded in stages and stop at the first hit:
+#   reduced   - grayscale, decoded at 1/2, 1/4 or 1/8 scale (libjpeg does
+#               this during the DCT) and resized to SCAN_TARGET_PX
+#   threshold - adaptive threshold of the reduced image (glare, low contrast)
+#   rotated   - reduced image rotated 45 degrees (strong skew)
+#   full      - full-resolution grayscale, for codes too small to survive
+#               the downscale; by far the slowest stage, so it runs last
+# Each stage tries pyzbar first when it is available, then OpenCV's
+# detector. Detectors are reused per thread (they are not thread-safe).
+
+SCAN_TARGET_PX = int(os.getenv('SCAN_TARGET_PX', 1024))
+SCAN_TIMEOUT_SECONDS = float(os.getenv('SCAN_TIMEOUT_SECONDS', 10))
+SCAN_MAX_UPLOAD_BYTES = int(os.getenv('SCAN_MAX_UPLOAD_BYTES', 10 * 1024 * 1024))
+# Multipart boundaries and part headers around the image itself
+UPLOAD_OVERHEAD_BYTES = 64 * 1024
+
+REDUCED_FLAGS = ((8, 'IMREAD_REDUCED_GRAYSCALE_8'), (4, 'IMREAD_REDUCED_GRAYSCALE_4'),
+                 (2, 'IMREAD_REDUCED_GRAYSCALE_2'))
+
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+_local = threading.local()
+
+def detector():
+    if not hasattr(_local, 'detector'):
+        _local.detector = cv2.QRCodeDetector()
+    return _local.detector
+
+def image_size(data):
+    # (width, height) from a PNG or JPEG header, or None. data is any
+    # buffer (bytes, numpy array); it is read through a memoryview.
+    data = memoryview(data).cast('B')
+    if data[:8] == b'\x89PNG\r\n\x1a\n' and len(data) >= 24:
+        return struct.unpack('>II', data[16:24])
+    if data[:2] == b'\xff\xd8':
+        i = 2
+        while i + 9 <= len(data):
+            if data[i] != 0xFF:
+                return None
+            marker = data[i + 1]
+            if marker == 0xFF:
+                i += 1
+                continue
+            if marker in JPEG_SOF_MARKERS:
+                height, width = struct.unpack('>HH', data[i + 5:i + 9])
+                return width, height
+            i += 2 + struct.unpack('>H', data[i + 2:i + 4])[0]
+    return None
+
+def load_reduced(buf, size):
+    # Grayscale image whose longest side is at most SCAN_TARGET_PX, and
+    # whether it was scaled down from the original
+    flag = cv2.IMREAD_GRAYSCALE
+    if size:
+        for factor, name in REDUCED_FLAGS:
+            if max(size) // factor >= SCAN_TARGET_PX:
+                flag = getattr(cv2, name)
+                break
+    img = cv2.imdecode(buf, flag)
+    if img is None:
+        return None, False
+    scaled = flag != cv2.IMREAD_GRAYSCALE
+    longest = max(img.shape[:2])
+    if longest > SCAN_TARGET_PX:
+        ratio = SCAN_TARGET_PX / longest
+        img = cv2.resize(img, None, fx=ratio, fy=ratio, interpolation=cv2.INTER_AREA)
+        scaled = True
+    return img, scaled
+
+def binarize(img):
+    return cv2.adaptiveThreshold(img, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 51, 10)
+
+def rotate(img, degrees):
+    h, w = img.shape[:2]
+    matrix = cv2.getRotationMatrix2D((w / 2, h / 2), degrees, 1.0)
+    return cv2.warpAffine(img, matrix, (w, h), borderValue=255)
+
+def find_qr(img):
+    if HAS_PYZBAR:
+        try:
+            decoded_objects = zbar_decode(img)
+            if decoded_objects:
+                return decoded_objects[0].data.decode('utf-8')
+        except Exception as e:
+            print(f"Pyzbar scan error: {e}")
+    try:
+        data, _, _ = detector().detectAndDecode(img)
+        if data:
+            return data
+    except Exception as e:
+        print(f"CV2 scan error: {e}")
+    return None
+
+def decode_qr(data):
+    # data: bytes or a uint8 array (see read_upload). Returns (qr_text,
+    # stage) or (None, None); ValueError if OpenCV cannot read the image.
+    load_decoders()
+    buf = np.frombuffer(data, np.uint8)
+    small, scaled = load_reduced(buf, image_size(data))
+    if small is None:
+        raise ValueError('Unreadable image')
+
+    stages = [
+        ('reduced', lambda: small),
+        ('threshold', lambda: binarize(small)),
+        ('rotated', lambda: rotate(small, 45)),
+    ]
+    if scaled:
+        stages.append(('full', lambda: cv2.imdecode(buf, cv2.IMREAD_GRAYSCALE)))
+
+    for stage, load in stages:
+        qr_data = find_qr(load())
+        if qr_data:
+            return qr_data, stage
+    return None, None
+
+# Decoding holds a CPU core for tens to hundreds of milliseconds, so it
+# runs in a small process pool (like bcrypt) and leaves request threads
+# free for everything else. The image travels to the worker as one pickled
+# uint8 buffer. Past SCAN_QUEUE_LIMIT scans the route answers 429;
+# SCAN_POOL_SIZE=0 decodes inline. A decoder that crashes its worker on a
+# bad image costs that scan a 503; the pool is rebuilt for the next one.
+scan_pool = BoundedProcessPool(
+    'scan',
+    max_workers=int(os.getenv('SCAN_POOL_SIZE', 2)),
+    max_pending=int(os.getenv('SCAN_QUEUE_LIMIT', 4))
+)
+
+def decode_scan(buf):
+    started = time.perf_counter()
+    outcome = 'error'
+    try:
+        with tracing.span('qr_decode'):
+            qr_data, stage = scan_pool.run(decode_qr, buf, timeout=SCAN_TIMEOUT_SECONDS)
+        outcome = stage or 'not_found'
+        return qr_data, stage
+    except PoolBroken:
+        outcome = 'crashed'
+        raise
+    except PoolOverloaded:
+        outcome = 'overloaded'
+        raise
+    finally:
+        qr_decode_seconds.observe(time.perf_counter() - started, outcome)
+
+# ----------------- SCAN UPLOADS -----------------
+# Werkzeug spools multipart files over 500 KB to a temporary file as the
+# body streams in, and the route caps the body at SCAN_MAX_UPLOAD_BYTES
+# (413 once exceeded, before the rest is read). read_upload() then makes
+# the one in-memory copy the decoder needs, straight into a numpy buffer,
+# after checking the magic bytes so non-images are rejected without
+# being loaded (and without importing numpy).
+
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 0),          # JPEG
+    (b'\x89PNG\r\n\x1a\n', 0),    # PNG
+    (b'WEBP', 8),                 # WebP, after the RIFF size field
+)
+
+class UploadRejected(Exception):
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+def is_image(head):
+    return any(head[offset:offset + len(sig)] == sig for sig, offset in IMAGE_SIGNATURES)
+
+def read_upload(stream):
+    if not is_image(stream.read(16)):
+        raise UploadRejected('Uploaded file is not a JPEG, PNG or WebP image', 415)
+    size = stream.seek(0, os.SEEK_END)
+    if size > SCAN_MAX_UPLOAD_BYTES:
+        raise UploadRejected(f'Image larger than {SCAN_MAX_UPLOAD_BYTES // (1024 * 1024)} MB', 413)
+    stream.seek(0)
+    load_decoders()
+    buf = np.empty(size, np.uint8)
+    if stream.readinto(buf) != size:
+        raise UploadRejected('Incomplete upload', 400)
+    return buf
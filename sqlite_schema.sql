@@ -0,0 +1,345 @@
+-- LOCAL SQLITE SCHEMA FOR cleanvit.db
+-- Mirrors supabase_schema.sql. Safe to re-run:
+--   sqlite3 cleanvit.db < sqlite_schema.sql
+
+-- 1. USERS
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    email TEXT UNIQUE NOT NULL,
+    password TEXT NOT NULL,
+    name TEXT,
+    block TEXT NOT NULL,
+    room_number TEXT NOT NULL,
+    group_no TEXT,
+    role TEXT DEFAULT 'student',
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 2. CLEANERS
+CREATE TABLE IF NOT EXISTS cleaners (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    employee_id TEXT UNIQUE NOT NULL,
+    password TEXT NOT NULL,
+    name TEXT NOT NULL,
+    assigned_blocks TEXT,
+    is_active INTEGER DEFAULT 1,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 3. REQUESTS
+CREATE TABLE IF NOT EXISTS requests (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    request_id TEXT UNIQUE NOT NULL,
+    user_id INTEGER NOT NULL,
+    cleaner_id INTEGER,
+    block TEXT NOT NULL,
+    room_number TEXT NOT NULL,
+    group_no TEXT,
+    type TEXT NOT NULL,
+    instructions TEXT,
+    status TEXT DEFAULT 'pending',
+    qr_code TEXT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    accepted_at DATETIME,
+    completed_at DATETIME,
+    rating INTEGER,
+    feedback TEXT,
+    completed_by INTEGER,
+    FOREIGN KEY (user_id) REFERENCES users(id),
+    FOREIGN KEY (cleaner_id) REFERENCES cleaners(id),
+    FOREIGN KEY (completed_by) REFERENCES cleaners(id)
+);
+
+-- 4. OTPS
+CREATE TABLE IF NOT EXISTS otps (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    email TEXT NOT NULL,
+    otp TEXT NOT NULL,
+    expires_at DATETIME NOT NULL,
+    used INTEGER DEFAULT 0,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 5. ADMINS
+CREATE TABLE IF NOT EXISTS admins (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT UNIQUE NOT NULL,
+    password TEXT NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 8. LISTING INDEXES (see supabase_schema.sql)
+CREATE INDEX IF NOT EXISTS requests_group_created_idx ON requests (group_no, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS requests_user_created_idx ON requests (user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS requests_cleaner_accepted_idx ON requests (cleaner_id, accepted_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS requests_pending_block_created_idx ON requests (block, created_at, id) WHERE status = 'pending';
+
+-- 10. CLEANER ROLLUPS (see supabase_schema.sql)
+-- SQLite has no stored procedures, so each trigger spells out the
+-- subtract-old / add-new steps. SQLiteStorage.rebuild_cleaner_rollups()
+-- recomputes the table from requests.
+CREATE TABLE IF NOT EXISTS cleaner_rollups (
+    cleaner_id INTEGER PRIMARY KEY,
+    completed_count INTEGER NOT NULL DEFAULT 0,
+    rating_sum INTEGER NOT NULL DEFAULT 0,
+    rating_count INTEGER NOT NULL DEFAULT 0,
+    last_completed_at DATETIME,
+    FOREIGN KEY (cleaner_id) REFERENCES cleaners(id)
+);
+
+CREATE TRIGGER IF NOT EXISTS requests_rollup_insert
+AFTER INSERT ON requests
+WHEN NEW.cleaner_id IS NOT NULL AND (NEW.status = 'completed' OR NEW.rating IS NOT NULL)
+BEGIN
+    INSERT INTO cleaner_rollups (cleaner_id, completed_count, rating_sum, rating_count, last_completed_at)
+    VALUES (NEW.cleaner_id, NEW.status = 'completed', COALESCE(NEW.rating, 0), NEW.rating IS NOT NULL,
+            CASE WHEN NEW.status = 'completed' THEN NEW.completed_at END)
+    ON CONFLICT (cleaner_id) DO UPDATE SET
+        completed_count = completed_count + excluded.completed_count,
+        rating_sum = rating_sum + excluded.rating_sum,
+        rating_count = rating_count + excluded.rating_count,
+        last_completed_at = CASE WHEN excluded.last_completed_at IS NULL OR last_completed_at >= excluded.last_completed_at
+                                 THEN last_completed_at ELSE excluded.last_completed_at END;
+END;
+
+CREATE TRIGGER IF NOT EXISTS requests_rollup_update
+AFTER UPDATE OF cleaner_id, status, rating, completed_at ON requests
+BEGIN
+    UPDATE cleaner_rollups SET
+        completed_count = completed_count - (OLD.status = 'completed'),
+        rating_sum = rating_sum - COALESCE(OLD.rating, 0),
+        rating_count = rating_count - (OLD.rating IS NOT NULL)
+    WHERE cleaner_id = OLD.cleaner_id;
+    INSERT INTO cleaner_rollups (cleaner_id, completed_count, rating_sum, rating_count, last_completed_at)
+    SELECT NEW.cleaner_id, NEW.status = 'completed', COALESCE(NEW.rating, 0), NEW.rating IS NOT NULL,
+           CASE WHEN NEW.status = 'completed' THEN NEW.completed_at END
+    WHERE NEW.cleaner_id IS NOT NULL AND (NEW.status = 'completed' OR NEW.rating IS NOT NULL)
+    ON CONFLICT (cleaner_id) DO UPDATE SET
+        completed_count = completed_count + excluded.completed_count,
+        rating_sum = rating_sum + excluded.rating_sum,
+        rating_count = rating_count + excluded.rating_count,
+        last_completed_at = CASE WHEN excluded.last_completed_at IS NULL OR last_completed_at >= excluded.last_completed_at
+                                 THEN last_completed_at ELSE excluded.last_completed_at END;
+END;
+
+CREATE TRIGGER IF NOT EXISTS requests_rollup_delete
+AFTER DELETE ON requests
+WHEN OLD.cleaner_id IS NOT NULL
+BEGIN
+    UPDATE cleaner_rollups SET
+        completed_count = completed_count - (OLD.status = 'completed'),
+        rating_sum = rating_sum - COALESCE(OLD.rating, 0),
+        rating_count = rating_count - (OLD.rating IS NOT NULL)
+    WHERE cleaner_id = OLD.cleaner_id;
+END;
+
+-- 11. REQUEST ANALYTICS ROLLUPS (see supabase_schema.sql)
+-- Same tables; the triggers repeat each step for the hour and day buckets.
+-- SQLiteStorage.rebuild_request_rollups() recomputes them from requests.
+CREATE TABLE IF NOT EXISTS latency_bins (
+    bin INTEGER PRIMARY KEY,
+    lower_seconds REAL NOT NULL,
+    upper_seconds REAL NOT NULL
+);
+INSERT OR IGNORE INTO latency_bins (bin, lower_seconds, upper_seconds) VALUES
+    (0, -1e18, 1), (1, 1, 5), (2, 5, 15), (3, 15, 30), (4, 30, 60),
+    (5, 60, 120), (6, 120, 300), (7, 300, 600), (8, 600, 900), (9, 900, 1800),
+    (10, 1800, 3600), (11, 3600, 7200), (12, 7200, 14400), (13, 14400, 28800),
+    (14, 28800, 86400), (15, 86400, 1e18);
+
+CREATE TABLE IF NOT EXISTS request_rollups (
+    granularity TEXT NOT NULL,
+    bucket DATETIME NOT NULL,
+    dimension TEXT NOT NULL,
+    value TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (granularity, bucket, dimension, value)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS latency_rollups (
+    granularity TEXT NOT NULL,
+    bucket DATETIME NOT NULL,
+    metric TEXT NOT NULL,
+    bin INTEGER NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (granularity, bucket, metric, bin),
+    FOREIGN KEY (bin) REFERENCES latency_bins(bin)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS requests_analytics_insert
+AFTER INSERT ON requests
+BEGIN
+    INSERT INTO request_rollups (granularity, bucket, dimension, value, count) VALUES
+           ('hour', strftime('%Y-%m-%d %H:00:00', NEW.created_at), 'status', COALESCE(NEW.status, 'pending'), 1),
+           ('hour', strftime('%Y-%m-%d %H:00:00', NEW.created_at), 'block', NEW.block, 1),
+           ('hour', strftime('%Y-%m-%d %H:00:00', NEW.created_at), 'type', NEW.type, 1)
+    ON CONFLICT (granularity, bucket, dimension, value) DO UPDATE SET count = count + 1;
+    INSERT INTO latency_rollups (granularity, bucket, metric, bin, count)
+    SELECT 'hour', strftime('%Y-%m-%d %H:00:00', NEW.accepted_at), 'accept', bin, 1 FROM latency_bins
+    WHERE NEW.accepted_at IS NOT NULL AND NEW.created_at IS NOT NULL
+      AND (julianday(NEW.accepted_at) - julianday(NEW.created_at)) * 86400 >= lower_seconds
+      AND (julianday(NEW.accepted_at) - julianday(NEW.created_at)) * 86400 < upper_seconds
+    ON CONFLICT (granularity, bucket, metric, bin) DO UPDATE SET count = count + 1;
+    INSERT INTO latency_rollups (granularity, bucket, metric, bin, count)
+    SELECT 'hour', strftime('%Y-%m-%d %H:00:00', NEW.completed_at), 'complete', bin, 1 FROM latency_bins
+    WHERE NEW.completed_at IS NOT NULL AND NEW.accepted_at IS NOT NULL
+      AND (julianday(NEW.completed_at) - julianday(NEW.accepted_at)) * 86400 >= lower_seconds
+      AND (julianday(NEW.completed_at) - julianday(NEW.accepted_at)) * 86400 < upper_seconds
+    ON CONFLICT (granularity, bucket, metric, bin) DO UPDATE SET count = count + 1;
+    INSERT INTO request_rollups (granularity, bucket, dimension, value, count) VALUES
+           ('day', strftime('%Y-%m-%d 00:00:00', NEW.created_at), 'status', COALESCE(NEW.status, 'pending'), 1),
+           ('day', strftime('%Y-%m-%d 00:00:00', NEW.created_at), 'block', NEW.block, 1),
+           ('day', strftime('%Y-%m-%d 00:00:00', NEW.created_at), 'type', NEW.type, 1)
+    ON CONFLICT (granularity, bucket, dimension, value) DO UPDATE SET count = count + 1;
+    INSERT INTO latency_rollups (granularity, bucket, metric, bin, count)
+    SELECT 'day', strftime('%Y-%m-%d 00:00:00', NEW.accepted_at), 'accept', bin, 1 FROM latency_bins
+    WHERE NEW.accepted_at IS NOT NULL AND NEW.created_at IS NOT NULL
+      AND (julianday(NEW.accepted_at) - julianday(NEW.created_at)) * 86400 >= lower_seconds
+      AND (julianday(NEW.accepted_at) - julianday(NEW.created_at)) * 86400 < upper_seconds
+    ON CONFLICT (granularity, bucket, metric, bin) DO UPDATE SET count = count + 1;
+    INSERT INTO latency_rollups (granularity, bucket, metric, bin, count)
+    SELECT 'day', strftime('%Y-%m-%d 00:00:00', NEW.completed_at), 'complete', bin, 1 FROM latency_bins
+    WHERE NEW.completed_at IS NOT NULL AND NEW.accepted_at IS NOT NULL
+      AND (julianday(NEW.completed_at) - julianday(NEW.accepted_at)) * 86400 >= lower_seconds
+      AND (julianday(NEW.completed_at) - julianday(NEW.accepted_at)) * 86400 < upper_seconds
+    ON CONFLICT (granularity, bucket, metric, bin) DO UPDATE SET count = count + 1;
+END;
+
+-- Only the dimensions and latencies whose value or bucket changed are touched
+CREATE TRIGGER IF NOT EXISTS requests_analytics_update
+AFTER UPDATE OF created_at, block, type, status, accepted_at, completed_at ON requests
+BEGIN
+    UPDATE request_rollups SET count = count - 1
+    WHERE granularity = 'hour' AND bucket = strftime('%Y-%m-%d %H:00:00', OLD.created_at) AND dimension = 'status' AND value = COALESCE(OLD.status, 'pending')
+      AND (COALESCE(OLD.status, 'pending') IS NOT COALESCE(NEW.status, 'pending') OR strftime('%Y-%m-%d %H:00:00', OLD.created_at) IS NOT strftime('%Y-%m-%d %H:00:00', NEW.created_at));
+    INSERT INTO request_rollups (granularity, bucket, dimension, value, count)
+    SELECT 'hour', strftime('%Y-%m-%d %H:00:00', NEW.created_at), 'status', COALESCE(NEW.status, 'pending'), 1
+    WHERE (COALESCE(OLD.status, 'pending') IS NOT COALESCE(NEW.status, 'pending') OR strftime('%Y-%m-%d %H:00:00', OLD.created_at) IS NOT strftime('%Y-%m-%d %H:00:00', NEW.created_at))
+    ON CONFLICT (granularity, bucket, dimension, value) DO UPDATE SET count = count + 1;
+    UPDATE request_rollups SET count = count - 1
+    WHERE granularity = 'hour' AND bucket = strftime('%Y-%m-%d %H:00:00', OLD.created_at) AND dimension = 'block' AND value = OLD.block
+      AND (OLD.block IS NOT NEW.block OR strftime('%Y-%m-%d %H:00:00', OLD.created_at) IS NOT strftime('%Y-%m-%d %H:00:00', NEW.created_at));
+    INSERT INTO request_rollups (granularity, bucket, dimension, value, count)
+    SELECT 'hour', strftime('%Y-%m-%d %H:00:00', NEW.created_at), 'block', NEW.block, 1
+    WHERE (OLD.block IS NOT NEW.block OR strftime('%Y-%m-%d %H:00:00', OLD.created_at) IS NOT strftime('%Y-%m-%d %H:00:00', NEW.created_at))
+    ON CONFLICT (granularity, bucket, dimension, value) DO UPDATE SET count = count + 1;
+    UPDATE request_rollups SET count = count - 1
+    WHERE granularity = 'hour' AND bucket = strftime('%Y-%m-%d %H:00:00', OLD.created_at) AND dimension = 'type' AND value = OLD.type
+      AND (OLD.type IS NOT NEW.type OR strftime('%Y-%m-%d %H:00:00', OLD.created_at) IS NOT strftime('%Y-%m-%d %H:00:00', NEW.created_at));
+    INSERT INTO request_rollups (granularity, bucket, dimension, value, count)
+    SELECT 'hour', strftime('%Y-%m-%d %H:00:00', NEW.created_at), 'type', NEW.type, 1
+    WHERE (OLD.type IS NOT NEW.type OR strftime('%Y-%m-%d %H:00:00', OLD.created_at) IS NOT strftime('%Y-%m-%d %H:00:00', NEW.created_at))
+    ON CONFLICT (granularity, bucket, dimension, value) DO UPDATE SET count = count + 1;
+    UPDATE latency_rollups SET count = count - 1
+    WHERE granularity = 'hour' AND bucket = strftime('%Y-%m-%d %H:00:00', OLD.accepted_at) AND metric = 'accept'
+      AND OLD.created_at IS NOT NULL
+      AND (OLD.accepted_at IS NOT NEW.accepted_at OR OLD.created_at IS NOT NEW.created_at)
+      AND bin = (SELECT bin FROM latency_bins
+                 WHERE (julianday(OLD.accepted_at) - julianday(OLD.created_at)) * 86400 >= lower_seconds
+                   AND (julianday(OLD.accepted_at) - julianday(OLD.created_at)) * 86400 < upper_seconds);
+    INSERT INTO latency_rollups (granularity, bucket, metric, bin, count)
+    SELECT 'hour', strftime('%Y-%m-%d %H:00:00', NEW.accepted_at), 'accept', bin, 1 FROM latency_bins
+    WHERE NEW.accepted_at IS NOT NULL AND NEW.created_at IS NOT NULL
+      AND (OLD.accepted_at IS NOT NEW.accepted_at OR OLD.created_at IS NOT NEW.created_at)
+      AND (julianday(NEW.accepted_at) - julianday(NEW.created_at)) * 86400 >= lower_seconds
+      AND (julianday(NEW.accepted_at) - julianday(NEW.created_at)) * 86400 < upper_seconds
+    ON CONFLICT (granularity, bucket, metric, bin) DO UPDATE SET count = count + 1;
+    UPDATE latency_rollups SET count = count - 1
+    WHERE granularity = 'hour' AND bucket = strftime('%Y-%m-%d %H:00:00', OLD.completed_at) AND metric = 'complete'
+      AND OLD.accepted_at IS NOT NULL
+      AND (OLD.completed_at IS NOT NEW.completed_at OR OLD.accepted_at IS NOT NEW.accepted_at)
+      AND bin = (SELECT bin FROM latency_bins
+                 WHERE (julianday(OLD.completed_at) - julianday(OLD.accepted_at)) * 86400 >= lower_seconds
+                   AND (julianday(OLD.completed_at) - julianday(OLD.accepted_at)) * 86400 < upper_seconds);
+    INSERT INTO latency_rollups (granularity, bucket, metric, bin, count)
+    SELECT 'hour', strftime('%Y-%m-%d %H:00:00', NEW.completed_at), 'complete', bin, 1 FROM latency_bins
+    WHERE NEW.completed_at IS NOT NULL AND NEW.accepted_at IS NOT NULL
+      AND (OLD.completed_at IS NOT NEW.completed_at OR OLD.accepted_at IS NOT NEW.accepted_at)
+      AND (julianday(NEW.completed_at) - julianday(NEW.accepted_at)) * 86400 >= lower_seconds
+      AND (julianday(NEW.completed_at) - julianday(NEW.accepted_at)) * 86400 < upper_seconds
+    ON CONFLICT (granularity, bucket, metric, bin) DO UPDATE SET count = count + 1;
+    UPDATE request_rollups SET count = count - 1
+    WHERE granularity = 'day' AND bucket = strftime('%Y-%m-%d 00:00:00', OLD.created_at) AND dimension = 'status' AND value = COALESCE(OLD.status, 'pending')
+      AND (COALESCE(OLD.status, 'pending') IS NOT COALESCE(NEW.status, 'pending') OR strftime('%Y-%m-%d 00:00:00', OLD.created_at) IS NOT strftime('%Y-%m-%d 00:00:00', NEW.created_at));
+    INSERT INTO request_rollups (granularity, bucket, dimension, value, count)
+    SELECT 'day', strftime('%Y-%m-%d 00:00:00', NEW.created_at), 'status', COALESCE(NEW.status, 'pending'), 1
+    WHERE (COALESCE(OLD.status, 'pending') IS NOT COALESCE(NEW.status, 'pending') OR strftime('%Y-%m-%d 00:00:00', OLD.created_at) IS NOT strftime('%Y-%m-%d 00:00:00', NEW.created_at))
+    ON CONFLICT (granularity, bucket, dimension, value) DO UPDATE SET count = count + 1;
+    UPDATE request_rollups SET count = count - 1
+    WHERE granularity = 'day' AND bucket = strftime('%Y-%m-%d 00:00:00', OLD.created_at) AND dimension = 'block' AND value = OLD.block
+      AND (OLD.block IS NOT NEW.block OR strftime('%Y-%m-%d 00:00:00', OLD.created_at) IS NOT strftime('%Y-%m-%d 00:00:00', NEW.created_at));
+    INSERT INTO request_rollups (granularity, bucket, dimension, value, count)
+    SELECT 'day', strftime('%Y-%m-%d 00:00:00', NEW.created_at), 'block', NEW.block, 1
+    WHERE (OLD.block IS NOT NEW.block OR strftime('%Y-%m-%d 00:00:00', OLD.created_at) IS NOT strftime('%Y-%m-%d 00:00:00', NEW.created_at))
+    ON CONFLICT (granularity, bucket, dimension, value) DO UPDATE SET count = count + 1;
+    UPDATE request_rollups SET count = count - 1
+    WHERE granularity = 'day' AND bucket = strftime('%Y-%m-%d 00:00:00', OLD.created_at) AND dimension = 'type' AND value = OLD.type
+      AND (OLD.type IS NOT NEW.type OR strftime('%Y-%m-%d 00:00:00', OLD.created_at) IS NOT strftime('%Y-%m-%d 00:00:00', NEW.created_at));
+    INSERT INTO request_rollups (granularity, bucket, dimension, value, count)
+    SELECT 'day', strftime('%Y-%m-%d 00:00:00', NEW.created_at), 'type', NEW.type, 1
+    WHERE (OLD.type IS NOT NEW.type OR strftime('%Y-%m-%d 00:00:00', OLD.created_at) IS NOT strftime('%Y-%m-%d 00:00:00', NEW.created_at))
+    ON CONFLICT (granularity, bucket, dimension, value) DO UPDATE SET count = count + 1;
+    UPDATE latency_rollups SET count = count - 1
+    WHERE granularity = 'day' AND bucket = strftime('%Y-%m-%d 00:00:00', OLD.accepted_at) AND metric = 'accept'
+      AND OLD.created_at IS NOT NULL
+      AND (OLD.accepted_at IS NOT NEW.accepted_at OR OLD.created_at IS NOT NEW.created_at)
+      AND bin = (SELECT bin FROM latency_bins
+                 WHERE (julianday(OLD.accepted_at) - julianday(OLD.created_at)) * 86400 >= lower_seconds
+                   AND (julianday(OLD.accepted_at) - julianday(OLD.created_at)) * 86400 < upper_seconds);
+    INSERT INTO latency_rollups (granularity, bucket, metric, bin, count)
+    SELECT 'day', strftime('%Y-%m-%d 00:00:00', NEW.accepted_at), 'accept', bin, 1 FROM latency_bins
+    WHERE NEW.accepted_at IS NOT NULL AND NEW.created_at IS NOT NULL
+      AND (OLD.accepted_at IS NOT NEW.accepted_at OR OLD.created_at IS NOT NEW.created_at)
+      AND (julianday(NEW.accepted_at) - julianday(NEW.created_at)) * 86400 >= lower_seconds
+      AND (julianday(NEW.accepted_at) - julianday(NEW.created_at)) * 86400 < upper_seconds
+    ON CONFLICT (granularity, bucket, metric, bin) DO UPDATE SET count = count + 1;
+    UPDATE latency_rollups SET count = count - 1
+    WHERE granularity = 'day' AND bucket = strftime('%Y-%m-%d 00:00:00', OLD.completed_at) AND metric = 'complete'
+      AND OLD.accepted_at IS NOT NULL
+      AND (OLD.completed_at IS NOT NEW.completed_at OR OLD.accepted_at IS NOT NEW.accepted_at)
+      AND bin = (SELECT bin FROM latency_bins
+                 WHERE (julianday(OLD.completed_at) - julianday(OLD.accepted_at)) * 86400 >= lower_seconds
+                   AND (julianday(OLD.completed_at) - julianday(OLD.accepted_at)) * 86400 < upper_seconds);
+    INSERT INTO latency_rollups (granularity, bucket, metric, bin, count)
+    SELECT 'day', strftime('%Y-%m-%d 00:00:00', NEW.completed_at), 'complete', bin, 1 FROM latency_bins
+    WHERE NEW.completed_at IS NOT NULL AND NEW.accepted_at IS NOT NULL
+      AND (OLD.completed_at IS NOT NEW.completed_at OR OLD.accepted_at IS NOT NEW.accepted_at)
+      AND (julianday(NEW.completed_at) - julianday(NEW.accepted_at)) * 86400 >= lower_seconds
+      AND (julianday(NEW.completed_at) - julianday(NEW.accepted_at)) * 86400 < upper_seconds
+    ON CONFLICT (granularity, bucket, metric, bin) DO UPDATE SET count = count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS requests_analytics_delete
+AFTER DELETE ON requests
+BEGIN
+    UPDATE request_rollups SET count = count - 1
+    WHERE granularity = 'hour' AND bucket = strftime('%Y-%m-%d %H:00:00', OLD.created_at)
+      AND (dimension, value) IN (VALUES ('status', COALESCE(OLD.status, 'pending')), ('block', OLD.block), ('type', OLD.type));
+    UPDATE latency_rollups SET count = count - 1
+    WHERE granularity = 'hour' AND bucket = strftime('%Y-%m-%d %H:00:00', OLD.accepted_at) AND metric = 'accept'
+      AND OLD.created_at IS NOT NULL
+      AND bin = (SELECT bin FROM latency_bins
+                 WHERE (julianday(OLD.accepted_at) - julianday(OLD.created_at)) * 86400 >= lower_seconds
+                   AND (julianday(OLD.accepted_at) - julianday(OLD.created_at)) * 86400 < upper_seconds);
+    UPDATE latency_rollups SET count = count - 1
+    WHERE granularity = 'hour' AND bucket = strftime('%Y-%m-%d %H:00:00', OLD.completed_at) AND metric = 'complete'
+      AND OLD.accepted_at IS NOT NULL
+      AND bin = (SELECT bin FROM latency_bins
+                 WHERE (julianday(OLD.completed_at) - julianday(OLD.accepted_at)) * 86400 >= lower_seconds
+                   AND (julianday(OLD.completed_at) - julianday(OLD.accepted_at)) * 86400 < upper_seconds);
+    UPDATE request_rollups SET count = count - 1
+    WHERE granularity = 'day' AND bucket = strftime('%Y-%m-%d 00:00:00', OLD.created_at)
+      AND (dimension, value) IN (VALUES ('status', COALESCE(OLD.status, 'pending')), ('block', OLD.block), ('type', OLD.type));
+    UPDATE latency_rollups SET count = count - 1
+    WHERE granularity = 'day' AND bucket = strftime('%Y-%m-%d 00:00:00', OLD.accepted_at) AND metric = 'accept'
+      AND OLD.created_at IS NOT NULL
+      AND bin = (SELECT bin FROM latency_bins
+                 WHERE (julianday(OLD.accepted_at) - julianday(OLD.created_at)) * 86400 >= lower_seconds
+                   AND (julianday(OLD.accepted_at) - julianday(OLD.created_at)) * 86400 < upper_seconds);
+    UPDATE latency_rollups SET count = count - 1
+    WHERE granularity = 'day' AND bucket = strftime('%Y-%m-%d 00:00:00', OLD.completed_at) AND metric = 'complete'
+      AND OLD.accepted_at IS NOT NULL
+      AND bin = (SELECT bin FROM latency_bins
+                 WHERE (julianday(OLD.completed_at) - julianday(OLD.accepted_at)) * 86400 >= lower_seconds
+                   AND (julianday(OLD.completed_at) - julianday(OLD.accepted_at)) * 86400 < upper_seconds);
+END;
@@ -0,0 +1,68 @@
+// Helpers shared by the student, cleaner and admin pages. Each page defines
+// API_URL before loading this file.
+
+// Request listings are keyset-paged: one call fetches one page, and the
+// X-Next-Cursor header (an opaque, URL-safe token) asks for the next one.
+// Returns { rows, next }, with next null on the last page; throws on an
+// error response so the caller can say so.
+async function fetchPage(url, token, cursor) {
+    const sep = url.includes('?') ? '&' : '?';
+    const res = await fetch(cursor ? `${url}${sep}after=${encodeURIComponent(cursor)}` : url, {
+        headers: { 'Authorization': `Bearer ${token}` }
+    });
+    const body = await res.json().catch(() => ({}));
+    if (!res.ok) throw new Error(body.error || `Request failed (${res.status})`);
+    return { rows: body, next: res.headers.get('X-Next-Cursor') };
+}
+
+// "Load more" buttons (matched by selector) show only while there is a next page
+function setLoadMore(selector, cursor) {
+    document.querySelectorAll(selector).forEach(btn => {
+        btn.style.display = cursor ? 'block' : 'none';
+    });
+}
+
+// Request lifecycle events over SSE. Streams open with a short-lived stream
+// token rather than the access token, which would end up in access logs.
+// EventSource gives up once that token has expired, so a closed stream is
+// reopened with a new one. onClose runs whenever the page has no stream,
+// for it to poll meanwhile: the stream dropped, or the server has streams
+// turned off (404; SSE_ENABLED=0 on multi-instance deployments), in which
+// case no stream is tried again.
+async function openEventStream(token, types, onEvent, onClose) {
+    if (!window.EventSource) {
+        if (onClose) onClose();
+        return;
+    }
+    const retry = () => setTimeout(() => openEventStream(token, types, onEvent, onClose), 3000);
+    const res = await fetch(`${API_URL}/events/token`, {
+        method: 'POST',
+        headers: { 'Authorization': `Bearer ${token}` }
+    }).catch(() => null);
+    if (!res || !res.ok) {
+        if (onClose) onClose();
+        if (!res) retry();
+        return;
+    }
+    const { token: streamToken } = await res.json();
+    const source = new EventSource(`${API_URL}/events?token=${encodeURIComponent(streamToken)}`);
+    types.forEach(type => source.addEventListener(type, onEvent));
+    source.onerror = () => {
+        if (source.readyState !== EventSource.CLOSED) return;
+        if (onClose) onClose();
+        retry();
+    };
+}
+
+// refresh() on every event of the given types, and every pollMs while there
+// is no stream
+function refreshOnEvents(token, types, refresh, pollMs) {
+    let pollTimer = null;
+    openEventStream(token, types, () => {
+        clearInterval(pollTimer);
+        refresh();
+    }, () => {
+        clearInterval(pollTimer);
+        pollTimer = setInterval(refresh, pollMs);
+    });
+}
@@ -0,0 +1,180 @@
+import sqlite3
+
+DATABASE = 'cleanvit.db'
+
+# ----------------- ADMIN STATS AGGREGATE -----------------
+# Both backends produce the same shape as the `admin_stats()` function in
+# supabase_schema.sql:
+#   {'total': n, 'pending': n, 'completed': n,
+#    'blocks': [{'block': 'A', 'count': n}, ...],
+#    'reviews': [{'student', 'cleaner', 'rating', 'feedback', 'date'}, ...]}
+
+# One pass over requests and one over the archive, each on a covering
+# index: per-block totals and status counts together. The overall totals
+# are the sum of the (few) block rows.
+SQLITE_BLOCK_COUNTS = """
+    SELECT block, SUM(total) AS total, SUM(pending) AS pending, SUM(completed) AS completed
+    FROM (
+        SELECT block, COUNT(*) AS total, SUM(status = 'pending') AS pending, SUM(status = 'completed') AS completed
+        FROM requests GROUP BY block
+        UNION ALL
+        SELECT block, COUNT(*), SUM(status = 'pending'), SUM(status = 'completed')
+        FROM requests_archive GROUP BY block
+    )
+    GROUP BY block
+    ORDER BY block
+"""
+
+SQLITE_RECENT_REVIEWS = """
+    SELECT u.name AS student, c.name AS cleaner, r.rating, r.feedback, r.completed_at AS date
+    FROM all_requests r
+    LEFT JOIN users u ON u.id = r.user_id
+    LEFT JOIN cleaners c ON c.id = r.cleaner_id
+    WHERE r.rating IS NOT NULL
+    ORDER BY r.completed_at DESC
+    LIMIT 5
+"""
+
+def sqlite_admin_stats(conn):
+    # Row factory on the cursor only; the connection may be shared
+    cur = conn.cursor()
+    cur.row_factory = sqlite3.Row
+
+    total = pending = completed = 0
+    blocks = []
+    for row in cur.execute(SQLITE_BLOCK_COUNTS):
+        total += row['total']
+        pending += row['pending'] or 0
+        completed += row['completed'] or 0
+        blocks.append({'block': row['block'], 'count': row['total']})
+
+    reviews = [dict(row) for row in cur.execute(SQLITE_RECENT_REVIEWS)]
+
+    return {
+        'total': total,
+        'pending': pending,
+        'completed': completed,
+        'blocks': blocks,
+        'reviews': reviews
+    }
+
+def format_admin_stats(agg):
+    # Shape the aggregate into the response admin.html expects
+    blocks = agg.get('blocks') or []
+    reviews = []
+    for r in agg.get('reviews') or []:
+        reviews.append({
+            'student': r.get('student') or 'Unknown',
+            'cleaner': r.get('cleaner') or 'Unknown',
+            'rating': r['rating'],
+            'feedback': r['feedback'],
+            'date': r['date']
+        })
+
+    return {
+        'totalRequests': agg.get('total', 0),
+        'pendingRequests': agg.get('pending', 0),
+        'completedRequests': agg.get('completed', 0),
+        'blockStats': {
+            'labels': [b['block'] for b in blocks],
+            'data': [b['count'] for b in blocks]
+        },
+        'recentReviews': reviews
+    }
+
+# ----------------- REQUEST ANALYTICS -----------------
+# Shapes the rollup rows returned by Storage.request_analytics() into the
+# /api/admin/analytics response. Latency percentiles (seconds) are
+# interpolated within the histogram bin that holds them; a percentile in
+# the open-ended first or last bin is reported as that bin's inner edge.
+
+LATENCY_METRICS = ('accept', 'complete')
+LATENCY_PERCENTILES = (50, 90, 99)
+
+def histogram_percentile(hist, bins, p):
+    # hist: {bin: count}; bins: {bin: (lower_seconds, upper_seconds)}
+    total = sum(hist.values())
+    if total <= 0:
+        return None
+    target = total * p / 100
+    seen = 0
+    for b in sorted(hist):
+        n = hist[b]
+        if n > 0 and seen + n >= target:
+            lower, upper = bins[b]
+            if lower <= -1e17:
+                # Open-ended first bin (under 1 s): report its upper edge
+                # rather than a made-up value inside it
+                return upper
+            if upper >= 1e17:
+                # Open-ended last bin: report its lower edge
+                return lower
+            return round(lower + (upper - lower) * (target - seen) / n, 1)
+        seen += n
+    return None
+
+def latency_summary(hist, bins):
+    summary = {'count': sum(hist.values())}
+    for p in LATENCY_PERCENTILES:
+        summary[f'p{p}'] = histogram_percentile(hist, bins, p)
+    return summary
+
+def format_analytics(agg, granularity, start, end):
+    bins = {b['bin']: (b['lower_seconds'], b['upper_seconds']) for b in agg.get('bins') or []}
+    buckets = {}
+
+    def bucket(key):
+        if key not in buckets:
+            buckets[key] = {'requests': 0, 'byStatus': {}, 'byBlock': {}, 'byType': {},
+                            'latency': {m: {} for m in LATENCY_METRICS}}
+        return buckets[key]
+
+    # Every request is counted once per dimension; the status rows give the total
+    fields = {'status': 'byStatus', 'block': 'byBlock', 'type': 'byType'}
+    totals = {'requests': 0, 'byStatus': {}, 'byBlock': {}, 'byType': {}}
+    for row in agg.get('counts') or []:
+        n = row['count']
+        field = fields[row['dimension']]
+        for target in (bucket(row['bucket']), totals):
+            target[field][row['value']] = target[field].get(row['value'], 0) + n
+            if field == 'byStatus':
+                target['requests'] += n
+
+    overall = {m: {} for m in LATENCY_METRICS}
+    for row in agg.get('latency') or []:
+        for hist in (bucket(row['bucket'])['latency'][row['metric']], overall[row['metric']]):
+            hist[row['bin']] = hist.get(row['bin'], 0) + row['count']
+
+    series = []
+    for key in sorted(buckets):
+        b = buckets[key]
+        series.append({
+            'bucket': key,
+            'requests': b['requests'],
+            'byStatus': b['byStatus'],
+            'byBlock': b['byBlock'],
+            'byType': b['byType'],
+            'acceptP50': histogram_percentile(b['latency']['accept'], bins, 50),
+            'completeP50': histogram_percentile(b['latency']['complete'], bins, 50)
+        })
+
+    return {
+        'granularity': granularity,
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'totals': totals,
+        'latency': {m: latency_summary(overall[m], bins) for m in LATENCY_METRICS},
+        'buckets': series
+    }
+
+if __name__ == "__main__":
+    import json
+    from storage.sqlite_backend import SQLiteStorage
+
+    # Through the storage layer, which applies pending migrations
+    # (requests_archive)
+    conn = SQLiteStorage(DATABASE).conn()
+    try:
+        print(json.dumps(format_admin_stats(sqlite_admin_stats(conn)), indent=2, default=str))
+    finally:
+        conn.close()
@@ -0,0 +1,48 @@
+import os
+import importlib.util
+
+from storage.base import Storage
+
+# ----------------- STORAGE BACKEND SELECTION -----------------
+# STORAGE_BACKEND=supabase|sqlite. Unset: Supabase when SUPABASE_URL and
+# SUPABASE_KEY are configured, otherwise the local SQLite file at SQLITE_PATH.
+
+SQLITE_PATH_DEFAULT = 'cleanvit.db'
+
+def create_storage():
+    url = os.getenv('SUPABASE_URL')
+    key = os.getenv('SUPABASE_KEY')
+    backend = os.getenv('STORAGE_BACKEND') or ('supabase' if url and key else 'sqlite')
+
+    if backend == 'supabase':
+        if not (url and key):
+            print("WARNING: SUPABASE_URL and SUPABASE_KEY must be set in Environment Variables or .env file.")
+            return None
+        if importlib.util.find_spec('supabase') is None:
+            print("Failed to set up Supabase: the supabase package is not installed")
+            return None
+        from storage.supabase_backend import SupabaseStorage
+
+        # Deferred until the first query in each process (SupabaseStorage.client):
+        # importing supabase-py and building the client cost more than the
+        # rest of startup, and a cold start should not pay for them before
+        # it can answer. All sub-clients share this process's pooled
+        # keep-alive transport.
+        def connect():
+            from supabase import create_client, ClientOptions
+            from storage.transport import build_http_client
+            client = create_client(url, key, options=ClientOptions(httpx_client=build_http_client()))
+            print("Connected to Supabase!")
+            return client
+
+        return SupabaseStorage(connect)
+
+    if backend == 'sqlite':
+        from storage.sqlite_backend import SQLiteStorage
+        path = os.getenv('SQLITE_PATH', SQLITE_PATH_DEFAULT)
+        # Opened (and the schema applied) on first use, per thread
+        print(f"Using local SQLite database: {path}")
+        return SQLiteStorage(path)
+
+    print(f"WARNING: unknown STORAGE_BACKEND '{backend}' (expected supabase or sqlite)")
+    return None
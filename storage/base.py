@@ -0,0 +1,209 @@
+# ----------------- STORAGE INTERFACE -----------------
+# Every database access in app.py goes through one of these methods, so the
+# routes work unchanged on Supabase (PostgREST) or the local SQLite file.
+#
+# Conventions shared by all backends:
+#   - rows are plain dicts keyed by column name
+#   - lookups return None when nothing matches
+#   - `fields` is a tuple of column names from app.FIELD_SETS; the virtual
+#     'student_name' field is filled from the users join
+#   - list methods take a keyset `cursor` of (sort value, id) and a `limit`
+#   - conditional transitions return the updated row, or None if the row was
+#     not in the expected state
+#   - completed requests older than ARCHIVE_AFTER_DAYS live in
+#     requests_archive (see archive.py); listings read it only when passed
+#     include_archived, aggregates always do
+
+import os
+
+from workers import QueryFanout
+
+CLEANER_JOB_STATUSES = ('assigned', 'in_progress', 'accepted', 'completed')
+
+# A cleaner's open jobs: handed out by the dispatcher and not started yet,
+# or started (accepted by hand, or a dispatched job the cleaner started)
+OPEN_JOB_STATUSES = ('assigned', 'in_progress')
+
+EMPTY_ROLLUP = {'completed_count': 0, 'rating_sum': 0, 'rating_count': 0, 'last_completed_at': None}
+
+REQUEST_TABLES = ('requests', 'requests_archive')
+
+def request_tables(include_archived):
+    return REQUEST_TABLES if include_archived else REQUEST_TABLES[:1]
+
+def merge_pages(pages, column, limit, desc):
+    # One keyset page from per-table pages fetched with the same cursor and
+    # limit; ids are unique across requests and requests_archive
+    if len(pages) == 1:
+        return pages[0]
+    rows = [r for page in pages for r in page]
+    rows.sort(key=lambda r: (r[column] or '', r['id']), reverse=desc)
+    return rows[:limit]
+
+# Shared by all backends for independent reads issued together
+query_fanout = QueryFanout('query', int(os.getenv('QUERY_FANOUT_WORKERS', 8)))
+
+class Storage:
+    name = None
+
+    def gather(self, calls):
+        # Runs independent reads in parallel: {name: fn} -> {name: result}
+        return query_fanout.gather(calls)
+
+    # ---- users ----
+    def email_registered(self, email):
+        raise NotImplementedError
+
+    def find_user_by_email(self, email):
+        raise NotImplementedError
+
+    def create_user(self, fields):
+        raise NotImplementedError
+
+    def get_user_profile(self, user_id):
+        # id, name, block, room_number, group_no
+        raise NotImplementedError
+
+    def list_group_members(self, group_no):
+        # name, email of every user sharing a room group
+        raise NotImplementedError
+
+    def list_group_students(self, group_nos):
+        # id, block, room_number, group_no of every user in any of the
+        # groups, ordered by id (one query for a bulk request batch)
+        raise NotImplementedError
+
+    # ---- otps ----
+    def create_otp(self, email, otp, expires_at):
+        raise NotImplementedError
+
+    def find_unused_otp(self, email, otp):
+        raise NotImplementedError
+
+    def mark_otp_used(self, otp_id):
+        raise NotImplementedError
+
+    # ---- admins ----
+    def find_admin(self, username):
+        raise NotImplementedError
+
+    # ---- cleaners ----
+    def find_active_cleaner(self, employee_id):
+        raise NotImplementedError
+
+    def get_cleaner(self, cleaner_id):
+        raise NotImplementedError
+
+    def list_cleaners(self, fields):
+        raise NotImplementedError
+
+    def set_cleaner_shift(self, cleaner_id, on_shift):
+        # Returns the updated cleaner, or None if there is no such cleaner
+        raise NotImplementedError
+
+    def create_cleaner(self, fields):
+        raise NotImplementedError
+
+    # ---- requests ----
+    def create_request(self, fields):
+        raise NotImplementedError
+
+    def create_requests(self, rows):
+        # Multi-row insert in one statement. Rows whose request_id is already
+        # taken are skipped, not an error; returns the inserted rows.
+        raise NotImplementedError
+
+    def list_group_requests(self, fields, group_no=None, user_id=None, cursor=None, limit=50,
+                            include_archived=False):
+        # By group_no when known, else by user_id; newest first
+        raise NotImplementedError
+
+    def list_cleaner_requests(self, fields, cleaner_id, cursor=None, limit=50, include_archived=False):
+        # A cleaner's accepted and completed jobs; most recently accepted first
+        raise NotImplementedError
+
+    def list_pending_requests(self, fields, blocks, cursor=None, limit=50):
+        # Pending jobs in the given blocks; oldest first
+        raise NotImplementedError
+
+    def accept_request(self, req_id, cleaner_id):
+        # pending -> in_progress
+        raise NotImplementedError
+
+    def assign_request(self, req_id, cleaner_id, max_jobs):
+        # pending -> assigned, only while the cleaner is active, on shift and
+        # has fewer than max_jobs open jobs. The cap is checked in the same
+        # write, so it holds across worker processes.
+        raise NotImplementedError
+
+    def start_request(self, req_id, cleaner_id):
+        # assigned (to cleaner_id) -> in_progress
+        raise NotImplementedError
+
+    def requeue_assigned(self, before=None, cleaner_id=None):
+        # assigned -> pending for jobs assigned before `before` (naive UTC
+        # datetime) or, with cleaner_id, all of that cleaner's; returns the
+        # updated rows
+        raise NotImplementedError
+
+    def complete_request(self, req_id, cleaner_id, request_id, completed_by=None):
+        # assigned or in_progress (to cleaner_id, matching request_id) ->
+        # completed; scanning the QR also starts an assigned job
+        raise NotImplementedError
+
+    def get_request_state(self, req_id):
+        # request_id, status, cleaner_id (archived requests included)
+        raise NotImplementedError
+
+    def rate_request(self, req_id, rating, feedback):
+        # Archived requests included
+        raise NotImplementedError
+
+    def archive_requests(self, before, limit):
+        # Moves up to `limit` requests completed before `before` (naive UTC
+        # datetime), oldest first, to requests_archive; returns the count
+        raise NotImplementedError
+
+    # ---- dispatch ----
+    def list_dispatch_queue(self):
+        # id, block, type, created_at of every pending request, oldest first
+        raise NotImplementedError
+
+    def list_cleaner_loads(self):
+        # id, blocks (list, from cleaner_blocks), jobs (count of open jobs)
+        # of every active cleaner on shift
+        raise NotImplementedError
+
+    # ---- aggregates ----
+    def admin_stats(self):
+        # Same shape as the admin_stats() SQL function (see stats.py)
+        raise NotImplementedError
+
+    def get_cleaner_rollup(self, cleaner_id):
+        # completed_count, rating_sum, rating_count, last_completed_at from
+        # the trigger-maintained cleaner_rollups row (zeros if none yet)
+        raise NotImplementedError
+
+    def rebuild_cleaner_rollups(self):
+        # Recompute every cleaner_rollups row from requests and the archive;
+        # returns row count
+        raise NotImplementedError
+
+    def rebuild_request_rollups(self):
+        # Recompute request_rollups and latency_rollups from requests and
+        # the archive
+        raise NotImplementedError
+
+    def request_analytics(self, granularity, start, end):
+        # Rollup rows for buckets in [start, end) (naive UTC datetimes):
+        #   {'counts': [{bucket, dimension, value, count}],
+        #    'latency': [{bucket, metric, bin, count}],
+        #    'bins': [{bin, lower_seconds, upper_seconds}]}
+        raise NotImplementedError
+
+    def recent_history(self, cleaner_id, limit=5, archived=False):
+        # id, type, completed_at, rating, student_name, room_number, newest
+        # first, from requests or (archived=True) requests_archive. The archive
+        # only holds completions older than any left in requests, so callers
+        # read both in parallel and top up the first from the second.
+        raise NotImplementedError
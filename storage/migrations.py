@@ -0,0 +1,62 @@
+import os
+import re
+
+# ----------------- SCHEMA MIGRATIONS -----------------
+# sqlite_schema.sql and supabase_schema.sql are the baseline and stay safe
+# to re-run: any function or trigger a migration replaces is updated in the
+# baseline too, so re-running it never undoes one. Later changes are
+# numbered files, migrations/<dialect>/NNNN_name.sql, each applied once, in
+# order, in its own transaction, and recorded in schema_migrations. SQLite databases are migrated when the app
+# opens them (SQLiteStorage.ensure_schema); Postgres with migrate.py.
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+MIGRATION_FILE_RE = re.compile(r'^(\d{4})_(\w+)\.sql$')
+
+SCHEMA_MIGRATIONS_TABLE = {
+    'sqlite': """CREATE TABLE IF NOT EXISTS schema_migrations (
+    version TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+)""",
+    'postgres': """CREATE TABLE IF NOT EXISTS schema_migrations (
+    version TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    applied_at TIMESTAMPTZ DEFAULT NOW()
+)""",
+}
+
+def list_migrations(dialect):
+    # [(version, name, path)] in version order
+    folder = os.path.join(MIGRATIONS_DIR, dialect)
+    found = []
+    for filename in sorted(os.listdir(folder)):
+        m = MIGRATION_FILE_RE.match(filename)
+        if m:
+            found.append((m.group(1), m.group(2), os.path.join(folder, filename)))
+    return found
+
+def pending_migrations(dialect, applied):
+    return [m for m in list_migrations(dialect) if m[0] not in applied]
+
+def migration_script(dialect, migration):
+    # The migration's SQL and its schema_migrations row, as one transaction
+    version, name, path = migration
+    with open(path) as f:
+        sql = f.read().rstrip().rstrip(';')
+    record = f"INSERT INTO schema_migrations (version, name) VALUES ('{version}', '{name}')"
+    return f"BEGIN;\n{sql};\n{record};\nCOMMIT;\n"
+
+def migrate_sqlite(conn):
+    # Applies pending migrations; returns the versions applied
+    conn.execute(SCHEMA_MIGRATIONS_TABLE['sqlite'])
+    applied = {r['version'] for r in conn.execute("SELECT version FROM schema_migrations").fetchall()}
+    done = []
+    for migration in pending_migrations('sqlite', applied):
+        try:
+            conn.executescript(migration_script('sqlite', migration))
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        done.append(migration[0])
+    return done
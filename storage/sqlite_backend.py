@@ -0,0 +1,418 @@
+import os
+import json
+import sqlite3
+import time
+import datetime
+import threading
+
+import tracing
+from metrics import db_call_seconds, sql_target
+from storage.base import Storage, CLEANER_JOB_STATUSES, OPEN_JOB_STATUSES, EMPTY_ROLLUP, merge_pages, request_tables
+from storage.migrations import migrate_sqlite
+from stats import sqlite_admin_stats
+
+# ----------------- SQLITE BACKEND -----------------
+# Direct access to a local SQLite file (cleanvit.db by default) for offline
+# and local runs. Each thread gets its own connection; the database runs in
+# WAL mode so readers never wait on the writer. SQL is kept in constants or
+# built deterministically so sqlite3's per-connection statement cache reuses
+# the prepared statements.
+
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'sqlite_schema.sql')
+
+def utcnow():
+    # Same lexical format as CURRENT_TIMESTAMP, with milliseconds, so text
+    # comparison (ORDER BY, keyset cursors) matches time order
+    return datetime.datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+
+REBUILD_ROLLUPS = """
+    INSERT INTO cleaner_rollups (cleaner_id, completed_count, rating_sum, rating_count, last_completed_at)
+    SELECT cleaner_id,
+           SUM(status = 'completed'),
+           COALESCE(SUM(rating), 0),
+           COUNT(rating),
+           MAX(CASE WHEN status = 'completed' THEN completed_at END)
+    FROM all_requests
+    WHERE cleaner_id IS NOT NULL AND (status = 'completed' OR rating IS NOT NULL)
+    GROUP BY cleaner_id
+"""
+
+GRANULARITIES = "(VALUES ('hour', '%Y-%m-%d %H:00:00'), ('day', '%Y-%m-%d 00:00:00'))"
+
+REBUILD_REQUEST_ROLLUPS = f"""
+    WITH g(granularity, fmt) AS {GRANULARITIES}
+    INSERT INTO request_rollups (granularity, bucket, dimension, value, count)
+    SELECT g.granularity, strftime(g.fmt, r.created_at), 'status', COALESCE(r.status, 'pending'), COUNT(*)
+    FROM all_requests r, g GROUP BY 1, 2, 4
+    UNION ALL
+    SELECT g.granularity, strftime(g.fmt, r.created_at), 'block', r.block, COUNT(*)
+    FROM all_requests r, g GROUP BY 1, 2, 4
+    UNION ALL
+    SELECT g.granularity, strftime(g.fmt, r.created_at), 'type', r.type, COUNT(*)
+    FROM all_requests r, g GROUP BY 1, 2, 4
+"""
+
+REBUILD_LATENCY_ROLLUPS = f"""
+    WITH g(granularity, fmt) AS {GRANULARITIES},
+    l(metric, at, secs) AS (
+        SELECT 'accept', accepted_at, (julianday(accepted_at) - julianday(created_at)) * 86400
+        FROM all_requests WHERE accepted_at IS NOT NULL AND created_at IS NOT NULL
+        UNION ALL
+        SELECT 'complete', completed_at, (julianday(completed_at) - julianday(accepted_at)) * 86400
+        FROM all_requests WHERE completed_at IS NOT NULL AND accepted_at IS NOT NULL
+    )
+    INSERT INTO latency_rollups (granularity, bucket, metric, bin, count)
+    SELECT g.granularity, strftime(g.fmt, l.at), l.metric, b.bin, COUNT(*)
+    FROM l, g, latency_bins b
+    WHERE l.secs >= b.lower_seconds AND l.secs < b.upper_seconds
+    GROUP BY 1, 2, 3, 4
+"""
+
+# Columns moved by archive_requests (requests_archive adds archived_at)
+ARCHIVED_COLUMNS = ("id, request_id, user_id, cleaner_id, block, room_number, group_no, type, instructions, "
+                    "status, qr_code, created_at, accepted_at, completed_at, rating, feedback, completed_by")
+
+RECENT_HISTORY = """
+    SELECT r.id, r.type, r.completed_at, r.rating, u.name AS student_name, u.room_number
+    FROM {table} r LEFT JOIN users u ON u.id = r.user_id
+    WHERE r.cleaner_id = ? AND r.status = 'completed'
+    ORDER BY r.completed_at DESC LIMIT ?
+"""
+
+ANALYTICS_COUNTS = """
+    SELECT bucket, dimension, value, count FROM request_rollups
+    WHERE granularity = ? AND bucket >= ? AND bucket < ? AND count <> 0
+    ORDER BY bucket
+"""
+
+ANALYTICS_LATENCY = """
+    SELECT bucket, metric, bin, count FROM latency_rollups
+    WHERE granularity = ? AND bucket >= ? AND bucket < ? AND count <> 0
+    ORDER BY bucket
+"""
+
+def sqlite_time(dt):
+    return dt.strftime('%Y-%m-%d %H:%M:%S')
+
+def dict_row(cursor, row):
+    return {d[0]: row[i] for i, d in enumerate(cursor.description)}
+
+def columns(fields, *extra):
+    # Returns (select list, join clause) for a projection on requests r
+    cols = ['r.' + f for f in dict.fromkeys(tuple(fields) + extra) if f != 'student_name']
+    join = ''
+    if 'student_name' in fields:
+        cols.append('u.name AS student_name')
+        join = ' LEFT JOIN users u ON u.id = r.user_id'
+    return ', '.join(cols), join
+
+def keyset(column, cursor, limit, desc):
+    # Returns (where fragment, order/limit clause, params)
+    op, direction = ('<', 'DESC') if desc else ('>', 'ASC')
+    order = f" ORDER BY r.{column} {direction}, r.id {direction} LIMIT ?"
+    if not cursor:
+        return '', order, (limit,)
+    value, last_id = cursor
+    where = f" AND (r.{column} {op} ? OR (r.{column} = ? AND r.id {op} ?))"
+    return where, order, (value, value, last_id, limit)
+
+def placeholders(values):
+    return ', '.join('?' * len(values))
+
+class SQLiteStorage(Storage):
+    name = 'sqlite'
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def conn(self):
+        conn = getattr(self._local, 'conn', None)
+        # Never reuse a connection inherited across fork
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, cached_statements=256)
+            conn.row_factory = dict_row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+            self.ensure_schema(conn)
+        return conn
+
+    def ensure_schema(self, conn):
+        with self._schema_lock:
+            if self._schema_ready:
+                return
+            tables = {r['name'] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            with open(SCHEMA_FILE) as f:
+                conn.executescript(f.read())
+            # Databases created before completed_by was tracked
+            cols = {r['name'] for r in conn.execute("PRAGMA table_info(requests)")}
+            if 'completed_by' not in cols:
+                conn.execute("ALTER TABLE requests ADD COLUMN completed_by INTEGER REFERENCES cleaners(id)")
+            applied = migrate_sqlite(conn)
+            if applied:
+                print(f"Applied SQLite migrations {', '.join(applied)} to {self.path}")
+            # First run on an existing database: backfill the rollups
+            if 'cleaner_rollups' not in tables:
+                self.rebuild_cleaner_rollups(conn)
+            if 'request_rollups' not in tables:
+                self.rebuild_request_rollups(conn)
+            self._schema_ready = True
+
+    def observe(self, sql, started, rows):
+        # Per-table metrics, and the call's detail when the request is traced
+        elapsed = time.perf_counter() - started
+        table, operation = sql_target(sql)
+        db_call_seconds.observe(elapsed, 'sqlite', table, operation)
+        if tracing.current_trace.get() is not None:
+            tracing.record_db('sqlite', table, operation, elapsed, len(rows),
+                              tracing.row_bytes(rows), tracing.sql_filters(sql))
+
+    def one(self, sql, params=()):
+        started = time.perf_counter()
+        row = self.conn().execute(sql, params).fetchone()
+        self.observe(sql, started, [row] if row else [])
+        return row
+
+    def all(self, sql, params=()):
+        started = time.perf_counter()
+        rows = self.conn().execute(sql, params).fetchall()
+        self.observe(sql, started, rows)
+        return rows
+
+    def insert(self, table, fields):
+        cols = ', '.join(fields)
+        return self.one(f"INSERT INTO {table} ({cols}) VALUES ({placeholders(fields)}) RETURNING *",
+                        tuple(fields.values()))
+
+    # ---- users ----
+    def email_registered(self, email):
+        return self.one("SELECT id FROM users WHERE email = ?", (email,)) is not None
+
+    def find_user_by_email(self, email):
+        return self.one("SELECT * FROM users WHERE email = ?", (email,))
+
+    def create_user(self, fields):
+        return self.insert('users', fields)
+
+    def get_user_profile(self, user_id):
+        return self.one("SELECT id, name, block, room_number, group_no FROM users WHERE id = ?", (user_id,))
+
+    def list_group_members(self, group_no):
+        return self.all("SELECT name, email FROM users WHERE group_no = ?", (group_no,))
+
+    def list_group_students(self, group_nos):
+        group_nos = tuple(group_nos)
+        return self.all(f"SELECT id, block, room_number, group_no FROM users "
+                        f"WHERE group_no IN ({placeholders(group_nos)}) ORDER BY id", group_nos)
+
+    # ---- otps ----
+    def create_otp(self, email, otp, expires_at):
+        self.insert('otps', {
+            'email': email,
+            'otp': otp,
+            'expires_at': expires_at,
+            'used': False,
+            'created_at': utcnow()
+        })
+
+    def find_unused_otp(self, email, otp):
+        return self.one("SELECT * FROM otps WHERE email = ? AND otp = ? AND used = 0 "
+                        "ORDER BY created_at DESC LIMIT 1", (email, otp))
+
+    def mark_otp_used(self, otp_id):
+        self.one("UPDATE otps SET used = 1 WHERE id = ?", (otp_id,))
+
+    # ---- admins ----
+    def find_admin(self, username):
+        return self.one("SELECT * FROM admins WHERE username = ?", (username,))
+
+    # ---- cleaners ----
+    def find_active_cleaner(self, employee_id):
+        return self.one("SELECT * FROM cleaners WHERE employee_id = ? AND is_active = 1", (employee_id,))
+
+    def get_cleaner(self, cleaner_id):
+        return self.one("SELECT * FROM cleaners WHERE id = ?", (cleaner_id,))
+
+    def list_cleaners(self, fields):
+        select, _ = columns(fields)
+        return self.all(f"SELECT {select} FROM cleaners r ORDER BY r.created_at DESC")
+
+    def set_cleaner_shift(self, cleaner_id, on_shift):
+        return self.one("UPDATE cleaners SET on_shift = ? WHERE id = ? RETURNING *", (int(on_shift), cleaner_id))
+
+    def create_cleaner(self, fields):
+        return self.insert('cleaners', dict(fields, created_at=utcnow()))
+
+    # ---- requests ----
+    def create_request(self, fields):
+        return self.insert('requests', dict(fields, created_at=utcnow()))
+
+    def create_requests(self, rows):
+        if not rows:
+            return []
+        now = utcnow()
+        rows = [dict(r, created_at=now) for r in rows]
+        cols = list(rows[0])
+        values = ', '.join([f"({placeholders(cols)})"] * len(rows))
+        params = tuple(r[c] for r in rows for c in cols)
+        return self.all(f"INSERT INTO requests ({', '.join(cols)}) VALUES {values} "
+                        f"ON CONFLICT (request_id) DO NOTHING RETURNING *", params)
+
+    def list_group_requests(self, fields, group_no=None, user_id=None, cursor=None, limit=50,
+                            include_archived=False):
+        select, join = columns(fields, 'id', 'created_at')
+        where, order, params = keyset('created_at', cursor, limit, desc=True)
+        if group_no:
+            owner, value = 'r.group_no = ?', group_no
+        else:
+            owner, value = 'r.user_id = ?', user_id
+        pages = [self.all(f"SELECT {select} FROM {table} r{join} WHERE {owner}{where}{order}", (value,) + params)
+                 for table in request_tables(include_archived)]
+        return merge_pages(pages, 'created_at', limit, desc=True)
+
+    def list_cleaner_requests(self, fields, cleaner_id, cursor=None, limit=50, include_archived=False):
+        select, join = columns(fields, 'id', 'accepted_at')
+        where, order, params = keyset('accepted_at', cursor, limit, desc=True)
+        pages = [self.all(f"SELECT {select} FROM {table} r{join} "
+                          f"WHERE r.cleaner_id = ? AND r.status IN ({placeholders(CLEANER_JOB_STATUSES)}){where}{order}",
+                          (cleaner_id,) + CLEANER_JOB_STATUSES + params)
+                 for table in request_tables(include_archived)]
+        return merge_pages(pages, 'accepted_at', limit, desc=True)
+
+    def list_pending_requests(self, fields, blocks, cursor=None, limit=50):
+        blocks = tuple(blocks)
+        select, join = columns(fields, 'id', 'created_at')
+        where, order, params = keyset('created_at', cursor, limit, desc=False)
+        return self.all(f"SELECT {select} FROM requests r{join} "
+                        f"WHERE r.status = 'pending' AND r.block IN ({placeholders(blocks)}){where}{order}",
+                        blocks + params)
+
+    def accept_request(self, req_id, cleaner_id):
+        return self.one("UPDATE requests SET status = 'in_progress', cleaner_id = ?, accepted_at = ? "
+                        "WHERE id = ? AND status = 'pending' RETURNING *",
+                        (cleaner_id, utcnow(), req_id))
+
+    def assign_request(self, req_id, cleaner_id, max_jobs):
+        # SQLite runs one write at a time, so the count cannot go stale
+        # between the check and the update
+        return self.one(f"UPDATE requests SET status = 'assigned', cleaner_id = ?, accepted_at = ? "
+                        f"WHERE id = ? AND status = 'pending' "
+                        f"AND EXISTS (SELECT 1 FROM cleaners WHERE id = ? AND is_active = 1 AND on_shift = 1) "
+                        f"AND (SELECT COUNT(*) FROM requests WHERE cleaner_id = ? "
+                        f"AND status IN ({placeholders(OPEN_JOB_STATUSES)})) < ? RETURNING *",
+                        (cleaner_id, utcnow(), req_id, cleaner_id, cleaner_id, *OPEN_JOB_STATUSES, max_jobs))
+
+    def start_request(self, req_id, cleaner_id):
+        return self.one("UPDATE requests SET status = 'in_progress' "
+                        "WHERE id = ? AND status = 'assigned' AND cleaner_id = ? RETURNING *",
+                        (req_id, cleaner_id))
+
+    def requeue_assigned(self, before=None, cleaner_id=None):
+        where, params = ("cleaner_id = ?", (cleaner_id,)) if cleaner_id is not None \
+            else ("accepted_at < ?", (sqlite_time(before),))
+        return self.all(f"UPDATE requests SET status = 'pending', cleaner_id = NULL, accepted_at = NULL "
+                        f"WHERE status = 'assigned' AND {where} RETURNING *", params)
+
+    def complete_request(self, req_id, cleaner_id, request_id, completed_by=None):
+        return self.one(f"UPDATE requests SET status = 'completed', completed_at = ?, "
+                        f"completed_by = COALESCE(?, completed_by) "
+                        f"WHERE id = ? AND status IN ({placeholders(OPEN_JOB_STATUSES)}) "
+                        f"AND cleaner_id = ? AND request_id = ? RETURNING *",
+                        (utcnow(), completed_by, req_id, *OPEN_JOB_STATUSES, cleaner_id, request_id))
+
+    def get_request_state(self, req_id):
+        return (self.one("SELECT request_id, status, cleaner_id FROM requests WHERE id = ?", (req_id,))
+                or self.one("SELECT request_id, status, cleaner_id FROM requests_archive WHERE id = ?", (req_id,)))
+
+    def rate_request(self, req_id, rating, feedback):
+        return (self.one("UPDATE requests SET rating = ?, feedback = ? WHERE id = ? RETURNING *",
+                         (rating, feedback, req_id))
+                or self.one("UPDATE requests_archive SET rating = ?, feedback = ? WHERE id = ? RETURNING *",
+                            (rating, feedback, req_id)))
+
+    def archive_requests(self, before, limit):
+        # Copy, then delete: the delete triggers skip rows already in the
+        # archive, so the rollups are unchanged
+        conn = self.conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            ids = tuple(r['id'] for r in conn.execute(
+                "SELECT id FROM requests WHERE status = 'completed' AND completed_at < ? "
+                "ORDER BY completed_at LIMIT ?", (sqlite_time(before), limit)))
+            if ids:
+                marks = placeholders(ids)
+                conn.execute(f"INSERT INTO requests_archive ({ARCHIVED_COLUMNS}) "
+                             f"SELECT {ARCHIVED_COLUMNS} FROM requests WHERE id IN ({marks})", ids)
+                conn.execute(f"DELETE FROM requests WHERE id IN ({marks})", ids)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return len(ids)
+
+    # ---- dispatch ----
+    def list_dispatch_queue(self):
+        return self.all("SELECT id, block, type, created_at FROM requests "
+                        "WHERE status = 'pending' ORDER BY created_at, id")
+
+    def list_cleaner_loads(self):
+        rows = self.all(f"SELECT c.id, "
+                        f"(SELECT json_group_array(b.block) FROM cleaner_blocks b WHERE b.cleaner_id = c.id) AS blocks, "
+                        f"(SELECT COUNT(*) FROM requests r WHERE r.cleaner_id = c.id "
+                        f"AND r.status IN ({placeholders(OPEN_JOB_STATUSES)})) AS jobs "
+                        f"FROM cleaners c WHERE c.is_active = 1 AND c.on_shift = 1", OPEN_JOB_STATUSES)
+        for r in rows:
+            r['blocks'] = json.loads(r['blocks'])
+        return rows
+
+    # ---- aggregates ----
+    def admin_stats(self):
+        started = time.perf_counter()
+        stats = sqlite_admin_stats(self.conn())
+        elapsed = time.perf_counter() - started
+        db_call_seconds.observe(elapsed, 'sqlite', 'requests', 'select')
+        tracing.record_db('sqlite', 'requests', 'select', elapsed, filters='admin_stats')
+        return stats
+
+    def get_cleaner_rollup(self, cleaner_id):
+        return self.one("SELECT completed_count, rating_sum, rating_count, last_completed_at "
+                        "FROM cleaner_rollups WHERE cleaner_id = ?", (cleaner_id,)) or dict(EMPTY_ROLLUP)
+
+    def rebuild(self, conn, statements):
+        # BEGIN IMMEDIATE takes the write lock, so no trigger runs meanwhile.
+        # Returns the row count of the last statement.
+        conn = conn or self.conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for sql in statements:
+                n = conn.execute(sql).rowcount
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return n
+
+    def rebuild_cleaner_rollups(self, conn=None):
+        return self.rebuild(conn, ["DELETE FROM cleaner_rollups", REBUILD_ROLLUPS])
+
+    def rebuild_request_rollups(self, conn=None):
+        # Row count of request_rollups, like rebuild_request_rollups() in Postgres
+        self.rebuild(conn, ["DELETE FROM request_rollups", "DELETE FROM latency_rollups",
+                            REBUILD_LATENCY_ROLLUPS, REBUILD_REQUEST_ROLLUPS])
+        return (conn or self.conn()).execute("SELECT COUNT(*) AS n FROM request_rollups").fetchone()['n']
+
+    def request_analytics(self, granularity, start, end):
+        params = (granularity, sqlite_time(start), sqlite_time(end))
+        return {
+            'counts': self.all(ANALYTICS_COUNTS, params),
+            'latency': self.all(ANALYTICS_LATENCY, params),
+            'bins': self.all("SELECT bin, lower_seconds, upper_seconds FROM latency_bins ORDER BY bin")
+        }
+
+    def recent_history(self, cleaner_id, limit=5, archived=False):
+        table = 'requests_archive' if archived else 'requests'
+        return self.all(RECENT_HISTORY.format(table=table), (cleaner_id, limit))
@@ -0,0 +1,348 @@
+import os
+import datetime
+import threading
+
+from storage.base import Storage, CLEANER_JOB_STATUSES, OPEN_JOB_STATUSES, EMPTY_ROLLUP, merge_pages, request_tables
+
+# ----------------- SUPABASE BACKEND -----------------
+# PostgREST queries through supabase-py. Joins use the embedded-resource
+# syntax, e.g. select('id, users(name)').
+
+def utcnow():
+    return datetime.datetime.utcnow().isoformat()
+
+def select_clause(fields, *extra):
+    # extra: columns always needed by the caller (e.g. the sort key)
+    columns = list(dict.fromkeys(f for f in tuple(fields) + extra if f != 'student_name'))
+    if 'student_name' in fields:
+        columns.append('users(name)')
+    return ', '.join(columns)
+
+def flatten_student_name(rows):
+    # Callers expect student_name, not the nested users.name join
+    for r in rows:
+        if 'users' in r:
+            users = r.pop('users')
+            r['student_name'] = users.get('name') if users else None
+    return rows
+
+def keyset(query, column, cursor, limit, desc):
+    if cursor:
+        value, last_id = cursor
+        op = 'lt' if desc else 'gt'
+        query = query.or_(f'{column}.{op}."{value}",and({column}.eq."{value}",id.{op}.{last_id})')
+    return query.order(column, desc=desc).order('id', desc=desc).limit(limit)
+
+def first(res):
+    return res.data[0] if res.data else None
+
+# PostgREST's "relation does not exist" (42P01) and, from v12, "table not in
+# the schema cache" (PGRST205)
+MISSING_TABLE_CODES = ('42P01', 'PGRST205')
+
+class SupabaseStorage(Storage):
+    name = 'supabase'
+
+    def __init__(self, connect):
+        # connect() builds a client; called once per process so a forked
+        # worker never shares the parent's pooled connections
+        self._connect = connect
+        self._client = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._client = self._connect()
+                    self._pid = os.getpid()
+        return self._client
+
+    def table(self, name):
+        return self.client.table(name)
+
+    # ---- users ----
+    def email_registered(self, email):
+        return bool(self.table('users').select('id').eq('email', email).execute().data)
+
+    def find_user_by_email(self, email):
+        return first(self.table('users').select('*').eq('email', email).execute())
+
+    def create_user(self, fields):
+        return first(self.table('users').insert(fields).execute())
+
+    def get_user_profile(self, user_id):
+        return first(self.table('users').select('id, name, block, room_number, group_no').eq('id', user_id).execute())
+
+    def list_group_members(self, group_no):
+        return self.table('users').select('name, email').eq('group_no', group_no).execute().data
+
+    def list_group_students(self, group_nos):
+        return (self.table('users').select('id, block, room_number, group_no')
+                .in_('group_no', list(group_nos)).order('id').execute().data)
+
+    # ---- otps ----
+    def create_otp(self, email, otp, expires_at):
+        self.table('otps').insert({
+            'email': email,
+            'otp': otp,
+            'expires_at': expires_at,
+            'used': False
+        }).execute()
+
+    def find_unused_otp(self, email, otp):
+        return first(self.table('otps').select('*').eq('email', email).eq('otp', otp).eq('used', False).order('created_at', desc=True).limit(1).execute())
+
+    def mark_otp_used(self, otp_id):
+        self.table('otps').update({'used': True}).eq('id', otp_id).execute()
+
+    # ---- admins ----
+    def find_admin(self, username):
+        return first(self.table('admins').select('*').eq('username', username).execute())
+
+    # ---- cleaners ----
+    def find_active_cleaner(self, employee_id):
+        return first(self.table('cleaners').select('*').eq('employee_id', employee_id).eq('is_active', True).execute())
+
+    def get_cleaner(self, cleaner_id):
+        return first(self.table('cleaners').select('*').eq('id', cleaner_id).execute())
+
+    def list_cleaners(self, fields):
+        return self.table('cleaners').select(select_clause(fields)).order('created_at', desc=True).execute().data
+
+    def set_cleaner_shift(self, cleaner_id, on_shift):
+        return first(self.table('cleaners').update({'on_shift': bool(on_shift)}).eq('id', cleaner_id).execute())
+
+    def create_cleaner(self, fields):
+        return first(self.table('cleaners').insert(fields).execute())
+
+    # ---- requests ----
+    def create_request(self, fields):
+        return first(self.table('requests').insert(fields).execute())
+
+    def create_requests(self, rows):
+        if not rows:
+            return []
+        # INSERT ... ON CONFLICT (request_id) DO NOTHING
+        return self.table('requests').upsert(rows, on_conflict='request_id', ignore_duplicates=True).execute().data
+
+    def archived(self, read, default=None):
+        # read() against requests_archive. Until migrations/postgres/0003 has
+        # run there is no such table, and so nothing archived: default.
+        try:
+            return read()
+        except Exception as e:
+            if getattr(e, 'code', None) not in MISSING_TABLE_CODES:
+                raise
+            print(f"requests_archive unavailable, reading requests only: {e}")
+            return default
+
+    def pages(self, tables, page):
+        # page(table) -> rows, one call per table; sent in parallel when the
+        # archive is included
+        if len(tables) == 1:
+            return [page(tables[0])]
+        res = self.gather({f'request_pages.{table}': (lambda t=table: page(t) if t == 'requests'
+                                                      else self.archived(lambda: page(t), []))
+                           for table in tables})
+        return [res[f'request_pages.{table}'] for table in tables]
+
+    def list_group_requests(self, fields, group_no=None, user_id=None, cursor=None, limit=50,
+                            include_archived=False):
+        def page(table):
+            query = self.table(table).select(select_clause(fields, 'id', 'created_at'))
+            if group_no:
+                query = query.eq('group_no', group_no)
+            else:
+                query = query.eq('user_id', user_id)
+            return flatten_student_name(keyset(query, 'created_at', cursor, limit, desc=True).execute().data)
+        return merge_pages(self.pages(request_tables(include_archived), page), 'created_at', limit, desc=True)
+
+    def list_cleaner_requests(self, fields, cleaner_id, cursor=None, limit=50, include_archived=False):
+        def page(table):
+            query = self.table(table).select(select_clause(fields, 'id', 'accepted_at')).eq('cleaner_id', cleaner_id).in_('status', list(CLEANER_JOB_STATUSES))
+            return flatten_student_name(keyset(query, 'accepted_at', cursor, limit, desc=True).execute().data)
+        return merge_pages(self.pages(request_tables(include_archived), page), 'accepted_at', limit, desc=True)
+
+    def list_pending_requests(self, fields, blocks, cursor=None, limit=50):
+        query = self.table('requests').select(select_clause(fields, 'id', 'created_at')).eq('status', 'pending').in_('block', list(blocks))
+        return flatten_student_name(keyset(query, 'created_at', cursor, limit, desc=False).execute().data)
+
+    def accept_request(self, req_id, cleaner_id):
+        return first(self.table('requests').update({
+            'status': 'in_progress',
+            'cleaner_id': cleaner_id,
+            'accepted_at': utcnow()
+        }).eq('id', req_id).eq('status', 'pending').execute())
+
+    def assign_request(self, req_id, cleaner_id, max_jobs):
+        # The cap needs a count in the same transaction as the update, which
+        # PostgREST cannot express (assign_request() in migrations/postgres)
+        return first(self.client.rpc('assign_request', {
+            'p_id': req_id,
+            'p_cleaner_id': cleaner_id,
+            'p_max_jobs': max_jobs
+        }).execute())
+
+    def start_request(self, req_id, cleaner_id):
+        return first(self.table('requests').update({'status': 'in_progress'}).eq('id', req_id).eq('status', 'assigned').eq('cleaner_id', cleaner_id).execute())
+
+    def requeue_assigned(self, before=None, cleaner_id=None):
+        query = self.table('requests').update({
+            'status': 'pending',
+            'cleaner_id': None,
+            'accepted_at': None
+        }).eq('status', 'assigned')
+        if cleaner_id is not None:
+            query = query.eq('cleaner_id', cleaner_id)
+        else:
+            query = query.lt('accepted_at', before.isoformat() + '+00:00')
+        return query.execute().data
+
+    def complete_request(self, req_id, cleaner_id, request_id, completed_by=None):
+        update = {
+            'status': 'completed',
+            'completed_at': utcnow()
+        }
+        if completed_by is not None:
+            update['completed_by'] = completed_by
+        return first(self.table('requests').update(update).eq('id', req_id).in_('status', list(OPEN_JOB_STATUSES)).eq('cleaner_id', cleaner_id).eq('request_id', request_id).execute())
+
+    def get_request_state(self, req_id):
+        return (first(self.table('requests').select('request_id, status, cleaner_id').eq('id', req_id).execute())
+                or self.archived(lambda: first(self.table('requests_archive').select('request_id, status, cleaner_id').eq('id', req_id).execute())))
+
+    def rate_request(self, req_id, rating, feedback):
+        update = {
+            'rating': rating,
+            'feedback': feedback
+        }
+        return (first(self.table('requests').update(update).eq('id', req_id).execute())
+                or self.archived(lambda: first(self.table('requests_archive').update(update).eq('id', req_id).execute())))
+
+    def archive_requests(self, before, limit):
+        # One transaction server-side (archive_requests() in migrations/postgres)
+        return self.client.rpc('archive_requests', {
+            'p_before': before.isoformat() + '+00:00',
+            'p_limit': limit
+        }).execute().data
+
+    # ---- dispatch ----
+    def list_dispatch_queue(self):
+        # Paged past PostgREST's default row cap (db-max-rows)
+        rows, page = [], 1000
+        while True:
+            res = self.table('requests').select('id, block, type, created_at').eq('status', 'pending') \
+                .order('created_at').order('id').range(len(rows), len(rows) + page - 1).execute()
+            rows.extend(res.data)
+            if len(res.data) < page:
+                return rows
+
+    def list_cleaner_loads(self):
+        res = self.gather({
+            'cleaner_loads.cleaners': lambda: self.table('cleaners').select('id, cleaner_blocks(block)').eq('is_active', True).eq('on_shift', True).execute(),
+            'cleaner_loads.jobs': lambda: self.table('requests').select('cleaner_id').in_('status', list(OPEN_JOB_STATUSES)).execute(),
+        })
+        loads = {}
+        for r in res['cleaner_loads.jobs'].data:
+            loads[r['cleaner_id']] = loads.get(r['cleaner_id'], 0) + 1
+        return [{'id': c['id'], 'blocks': [b['block'] for b in c.get('cleaner_blocks') or []],
+                 'jobs': loads.get(c['id'], 0)} for c in res['cleaner_loads.cleaners'].data]
+
+    # ---- aggregates ----
+    def admin_stats(self):
+        # Single round trip: totals, status counts, block histogram and recent
+        # reviews are computed server-side by the admin_stats() SQL function.
+        try:
+            return self.client.rpc('admin_stats').execute().data
+        except Exception as e:
+            # Function not installed yet (supabase_schema.sql not re-run)
+            print(f"admin_stats RPC unavailable, using per-query stats: {e}")
+            return self.admin_stats_legacy()
+
+    def admin_stats_legacy(self):
+        requests = lambda: self.table('requests')
+        # Five independent reads, sent in parallel
+        res = self.gather({
+            # 1. Basic Counts
+            'admin_stats.total': lambda: requests().select('*', count='exact', head=True).execute(),
+            'admin_stats.pending': lambda: requests().select('*', count='exact', head=True).eq('status', 'pending').execute(),
+            'admin_stats.completed': lambda: requests().select('*', count='exact', head=True).eq('status', 'completed').execute(),
+            # 2. Block column for the per-block histogram
+            'admin_stats.blocks': lambda: requests().select('block').execute(),
+            # 3. Recent Reviews
+            'admin_stats.reviews': lambda: requests().select('rating, feedback, users(name), cleaners(name), completed_at').not_.is_('rating', 'null').order('completed_at', desc=True).limit(5).execute(),
+        })
+
+        # Block-wise request counts (aggregated in Python)
+        block_counts = {}
+        for r in res['admin_stats.blocks'].data:
+            b = r['block']
+            block_counts[b] = block_counts.get(b, 0) + 1
+
+        reviews = []
+        for r in res['admin_stats.reviews'].data:
+            reviews.append({
+                'student': r['users']['name'] if r.get('users') else None,
+                'cleaner': r['cleaners']['name'] if r.get('cleaners') else None,
+                'rating': r['rating'],
+                'feedback': r['feedback'],
+                'date': r['completed_at']
+            })
+
+        return {
+            'total': res['admin_stats.total'].count,
+            'pending': res['admin_stats.pending'].count,
+            'completed': res['admin_stats.completed'].count,
+            'blocks': [{'block': b, 'count': n} for b, n in sorted(block_counts.items())],
+            'reviews': reviews
+        }
+
+    def get_cleaner_rollup(self, cleaner_id):
+        try:
+            res = self.table('cleaner_rollups').select('completed_count, rating_sum, rating_count, last_completed_at').eq('cleaner_id', cleaner_id).execute()
+        except Exception as e:
+            # Rollup table not installed yet (supabase_schema.sql not re-run)
+            print(f"cleaner_rollups unavailable, counting from requests: {e}")
+            return self.cleaner_rollup_legacy(cleaner_id)
+        return first(res) or dict(EMPTY_ROLLUP)
+
+    def cleaner_rollup_legacy(self, cleaner_id):
+        requests = lambda: self.table('requests')
+        res = self.gather({
+            'cleaner_rollup.completed': lambda: requests().select('*', count='exact', head=True).eq('cleaner_id', cleaner_id).eq('status', 'completed').execute(),
+            'cleaner_rollup.ratings': lambda: requests().select('rating').eq('cleaner_id', cleaner_id).not_.is_('rating', 'null').execute(),
+        })
+        ratings = [r['rating'] for r in res['cleaner_rollup.ratings'].data]
+        return {
+            'completed_count': res['cleaner_rollup.completed'].count,
+            'rating_sum': sum(ratings),
+            'rating_count': len(ratings),
+            'last_completed_at': None
+        }
+
+    def rebuild_cleaner_rollups(self):
+        return self.client.rpc('rebuild_cleaner_rollups').execute().data
+
+    def rebuild_request_rollups(self):
+        return self.client.rpc('rebuild_request_rollups').execute().data
+
+    def request_analytics(self, granularity, start, end):
+        return self.client.rpc('request_analytics', {
+            'p_granularity': granularity,
+            'p_from': start.isoformat() + '+00:00',
+            'p_to': end.isoformat() + '+00:00'
+        }).execute().data
+
+    def recent_history(self, cleaner_id, limit=5, archived=False):
+        history_rows = lambda table: self.table(table).select('id, type, completed_at, rating, users(name, room_number)').eq('cleaner_id', cleaner_id).eq('status', 'completed').order('completed_at', desc=True).limit(limit).execute().data
+        rows = self.archived(lambda: history_rows('requests_archive'), []) if archived else history_rows('requests')
+        history = []
+        for h in rows:
+            users = h.pop('users', None) or {}
+            h['student_name'] = users.get('name')
+            h['room_number'] = users.get('room_number')
+            history.append(h)
+        return history
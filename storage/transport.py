@@ -0,0 +1,165 @@
+import os
+import time
+import threading
+
+from flask import has_request_context, request
+
+import tracing
+from metrics import db_call_seconds, postgrest_target
+
+# ----------------- SUPABASE HTTP TRANSPORT -----------------
+# One pooled httpx.Client per process, shared by every thread and by all
+# supabase-py sub-clients (PostgREST, auth, storage). Connections are kept
+# alive between requests, so only the first query on each pooled connection
+# pays for the TCP + TLS handshake. httpx.Client is thread-safe; after a
+# fork the child builds its own client rather than reusing the parent's
+# sockets.
+#
+# Every request carries an httpx trace hook that times connection setup
+# (connect_tcp / start_tls) per Flask endpoint, reported by
+# /api/admin/http. A warm pool shows newConnections staying flat while
+# requests grow. A response hook records each call's time to response
+# headers in the per-table metrics (/metrics); PostgREST bodies are small,
+# so that is nearly the whole call. On a traced request (tracing.py) it
+# also reads the body and adds the call, with rows and bytes, to the trace.
+
+POOL_MAX_CONNECTIONS = int(os.getenv('SUPABASE_POOL_MAX_CONNECTIONS', 20))
+POOL_MAX_KEEPALIVE = int(os.getenv('SUPABASE_POOL_MAX_KEEPALIVE', 10))
+KEEPALIVE_EXPIRY_SECONDS = float(os.getenv('SUPABASE_KEEPALIVE_EXPIRY_SECONDS', 60))
+CONNECT_TIMEOUT_SECONDS = float(os.getenv('SUPABASE_CONNECT_TIMEOUT_SECONDS', 5))
+REQUEST_TIMEOUT_SECONDS = float(os.getenv('SUPABASE_REQUEST_TIMEOUT_SECONDS', 10))
+# Seconds to wait for a free pooled connection before failing
+POOL_TIMEOUT_SECONDS = float(os.getenv('SUPABASE_POOL_TIMEOUT_SECONDS', 5))
+HTTP2 = os.getenv('SUPABASE_HTTP2', '1') == '1'
+
+class ConnectionStats:
+    # Per-route counters: requests sent, new connections opened and the time
+    # spent in TCP connect and TLS handshake for them.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def _route(self, route):
+        stats = self._routes.get(route)
+        if stats is None:
+            stats = self._routes[route] = {'requests': 0, 'newConnections': 0,
+                                           'tcpMs': 0.0, 'tlsMs': 0.0, 'maxSetupMs': 0.0}
+        return stats
+
+    def request(self, route):
+        with self._lock:
+            self._route(route)['requests'] += 1
+
+    def connected(self, route, tcp_ms, tls_ms):
+        with self._lock:
+            stats = self._route(route)
+            stats['newConnections'] += 1
+            stats['tcpMs'] += tcp_ms
+            stats['tlsMs'] += tls_ms
+            stats['maxSetupMs'] = max(stats['maxSetupMs'], tcp_ms + tls_ms)
+
+    def snapshot(self):
+        with self._lock:
+            routes = {}
+            for route, s in self._routes.items():
+                n = s['newConnections']
+                routes[route] = {
+                    'requests': s['requests'],
+                    'newConnections': n,
+                    'reuseRate': round(1 - n / s['requests'], 3) if s['requests'] else 0,
+                    'avgTcpMs': round(s['tcpMs'] / n, 2) if n else 0,
+                    'avgTlsMs': round(s['tlsMs'] / n, 2) if n else 0,
+                    'maxSetupMs': round(s['maxSetupMs'], 2)
+                }
+            return routes
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+
+connection_stats = ConnectionStats()
+# Counters describe this process's pool only
+os.register_at_fork(after_in_child=connection_stats.reset)
+
+def current_route():
+    if has_request_context():
+        return request.endpoint or request.path
+    return '(no request)'
+
+def attach_trace(req):
+    # httpx request event hook: runs on the calling thread for every request
+    route = current_route()
+    connection_stats.request(route)
+    started = {}
+    setup = {}
+
+    def trace(event, info):
+        step, _, phase = event.rpartition('.')
+        if phase == 'started':
+            started[step] = time.perf_counter()
+        elif phase == 'complete' and step in started:
+            setup[step] = (time.perf_counter() - started.pop(step)) * 1000
+            # A new connection is ready once TLS is up (or TCP, for http://)
+            if step == 'connection.start_tls' or (step == 'connection.connect_tcp' and req.url.scheme == 'http'):
+                connection_stats.connected(route, setup.get('connection.connect_tcp', 0.0),
+                                           setup.get('connection.start_tls', 0.0))
+
+    req.extensions = {**req.extensions, 'trace': trace, 'cleanvit_started': time.perf_counter()}
+
+def response_rows(resp):
+    # PostgREST reports the returned range ("0-24/*", "*/0"); fall back to
+    # counting the JSON body for writes that return rows
+    first, _, _ = resp.headers.get('content-range', '').partition('/')
+    if '-' in first:
+        lo, hi = first.split('-', 1)
+        if lo.isdigit() and hi.isdigit():
+            return int(hi) - int(lo) + 1
+    if first == '*':
+        return 0
+    try:
+        body = resp.json()
+    except ValueError:
+        return None
+    return len(body) if isinstance(body, list) else 1
+
+def record_response(resp):
+    # httpx response hook: once the headers are in
+    req = resp.request
+    started = req.extensions.get('cleanvit_started')
+    if started is None:
+        return
+    table, operation = postgrest_target(req.method, req.url.path)
+    db_call_seconds.observe(time.perf_counter() - started, 'supabase', table, operation)
+    if tracing.current_trace.get() is not None:
+        # Traced requests wait for the body too, for its size and row count
+        resp.read()
+        tracing.record_db('supabase', table, operation, time.perf_counter() - started,
+                          response_rows(resp), len(resp.content),
+                          tracing.postgrest_filters(req.url.query.decode()))
+
+def build_http_client():
+    # httpx is imported with the first client (the first Supabase query),
+    # so the SQLite backend and a cold start never load it
+    import httpx
+    return httpx.Client(
+        http2=HTTP2,
+        follow_redirects=True,
+        limits=httpx.Limits(
+            max_connections=POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=POOL_MAX_KEEPALIVE,
+            keepalive_expiry=KEEPALIVE_EXPIRY_SECONDS
+        ),
+        timeout=httpx.Timeout(REQUEST_TIMEOUT_SECONDS, connect=CONNECT_TIMEOUT_SECONDS,
+                              pool=POOL_TIMEOUT_SECONDS),
+        event_hooks={'request': [attach_trace], 'response': [record_response]}
+    )
+
+def pool_settings():
+    return {
+        'maxConnections': POOL_MAX_CONNECTIONS,
+        'maxKeepalive': POOL_MAX_KEEPALIVE,
+        'keepaliveExpirySeconds': KEEPALIVE_EXPIRY_SECONDS,
+        'connectTimeoutSeconds': CONNECT_TIMEOUT_SECONDS,
+        'requestTimeoutSeconds': REQUEST_TIMEOUT_SECONDS,
+        'http2': HTTP2
+    }
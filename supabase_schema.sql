@@ -62,6 +62,431 @@ CREATE TABLE IF NOT EXISTS admins (
     created_at TIMESTAMPTZ DEFAULT NOW()
 );
 
+-- 6. ADMIN STATS AGGREGATE
+-- Called by /api/admin/stats as supabase.rpc('admin_stats'). Defined in
+-- section 12, once all_requests (requests plus the archive) exists.
+
+-- 7. QR CODES
+-- QR images are rendered on demand by /api/requests/<request_id>/qr.png from
+-- the request_id, so qr_code is no longer written. Drop the base64 PNGs
+-- stored by older versions to shrink existing rows.
+UPDATE requests SET qr_code = NULL WHERE qr_code LIKE 'data:image/%';
+
+-- 8. LISTING INDEXES
+-- Composite indexes matching the keyset-paginated listings, so each page is an
+-- index range scan whatever the history length.
+-- Student history: WHERE group_no = ? (or user_id = ?) ORDER BY created_at DESC, id DESC
+CREATE INDEX IF NOT EXISTS requests_group_created_idx ON requests (group_no, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS requests_user_created_idx ON requests (user_id, created_at DESC, id DESC);
+-- Cleaner jobs: WHERE cleaner_id = ? ORDER BY accepted_at DESC, id DESC
+CREATE INDEX IF NOT EXISTS requests_cleaner_accepted_idx ON requests (cleaner_id, accepted_at DESC, id DESC);
+-- Pending queue: WHERE status = 'pending' AND block IN (...) ORDER BY created_at, id
+CREATE INDEX IF NOT EXISTS requests_pending_block_created_idx ON requests (block, created_at, id) WHERE status = 'pending';
+
+-- 9. SCAN COMPLETION
+-- Cleaner who scanned the QR code in /api/cleaner/complete-job-scan
+ALTER TABLE requests ADD COLUMN IF NOT EXISTS completed_by INTEGER REFERENCES cleaners(id);
+
+-- 10. CLEANER ROLLUPS
+-- Per-cleaner counters behind /api/admin/cleaners/<id>/stats, kept in step
+-- with requests by a trigger in the same transaction as every insert, update
+-- or delete. Each write subtracts the old row's contribution and adds the
+-- new one, so completions, ratings and reassignments all net out.
+-- rebuild_cleaner_rollups() recomputes everything from both tables.
+CREATE TABLE IF NOT EXISTS cleaner_rollups (
+    cleaner_id INTEGER PRIMARY KEY REFERENCES cleaners(id),
+    completed_count INTEGER NOT NULL DEFAULT 0,
+    rating_sum INTEGER NOT NULL DEFAULT 0,
+    rating_count INTEGER NOT NULL DEFAULT 0,
+    last_completed_at TIMESTAMPTZ
+);
+
+CREATE OR REPLACE FUNCTION apply_cleaner_rollup(p_cleaner INTEGER, p_status TEXT, p_rating INTEGER, p_completed_at TIMESTAMPTZ, p_sign INTEGER)
+RETURNS VOID
+LANGUAGE SQL
+AS $$
+    INSERT INTO cleaner_rollups (cleaner_id, completed_count, rating_sum, rating_count, last_completed_at)
+    SELECT p_cleaner,
+           CASE WHEN p_status = 'completed' THEN p_sign ELSE 0 END,
+           p_sign * COALESCE(p_rating, 0),
+           CASE WHEN p_rating IS NOT NULL THEN p_sign ELSE 0 END,
+           CASE WHEN p_status = 'completed' AND p_sign > 0 THEN p_completed_at END
+    WHERE p_cleaner IS NOT NULL AND (p_status = 'completed' OR p_rating IS NOT NULL)
+    ON CONFLICT (cleaner_id) DO UPDATE SET
+        completed_count = cleaner_rollups.completed_count + EXCLUDED.completed_count,
+        rating_sum = cleaner_rollups.rating_sum + EXCLUDED.rating_sum,
+        rating_count = cleaner_rollups.rating_count + EXCLUDED.rating_count,
+        last_completed_at = GREATEST(cleaner_rollups.last_completed_at, EXCLUDED.last_completed_at);
+$$;
+
+CREATE OR REPLACE FUNCTION requests_cleaner_rollup()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM apply_cleaner_rollup(OLD.cleaner_id, OLD.status, OLD.rating, OLD.completed_at, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM apply_cleaner_rollup(NEW.cleaner_id, NEW.status, NEW.rating, NEW.completed_at, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+-- Deletes made by archive_requests() (section 12) leave the rollups alone
+DROP TRIGGER IF EXISTS requests_cleaner_rollup ON requests;
+CREATE TRIGGER requests_cleaner_rollup
+AFTER INSERT OR UPDATE OF cleaner_id, status, rating, completed_at ON requests
+FOR EACH ROW EXECUTE FUNCTION requests_cleaner_rollup();
+DROP TRIGGER IF EXISTS requests_cleaner_rollup_delete ON requests;
+CREATE TRIGGER requests_cleaner_rollup_delete
+AFTER DELETE ON requests
+FOR EACH ROW WHEN (current_setting('cleanvit.archiving', true) IS DISTINCT FROM 'on')
+EXECUTE FUNCTION requests_cleaner_rollup();
+
+-- Reconciliation: rebuild every rollup from requests and requests_archive
+-- (all_requests, section 12). Holds off writers to both (readers are
+-- unaffected) so no trigger delta is lost meanwhile.
+CREATE OR REPLACE FUNCTION rebuild_cleaner_rollups()
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    n INTEGER;
+BEGIN
+    LOCK TABLE requests, requests_archive IN SHARE MODE;
+    DELETE FROM cleaner_rollups;
+    INSERT INTO cleaner_rollups (cleaner_id, completed_count, rating_sum, rating_count, last_completed_at)
+    SELECT cleaner_id,
+           COUNT(*) FILTER (WHERE status = 'completed'),
+           COALESCE(SUM(rating), 0),
+           COUNT(rating),
+           MAX(completed_at) FILTER (WHERE status = 'completed')
+    FROM all_requests
+    WHERE cleaner_id IS NOT NULL AND (status = 'completed' OR rating IS NOT NULL)
+    GROUP BY cleaner_id;
+    GET DIAGNOSTICS n = ROW_COUNT;
+    RETURN n;
+END;
+$$;
+
+-- 11. REQUEST ANALYTICS ROLLUPS
+-- Hourly and daily buckets behind /api/admin/analytics, kept in step with
+-- requests by a trigger (same subtract-old / add-new scheme as section 10):
+--   request_rollups: requests created in the bucket, counted once under
+--                    each dimension (block, type, current status)
+--   latency_rollups: histogram of accept (accepted_at - created_at) and
+--                    completion (completed_at - accepted_at) latency, bucketed
+--                    by when the accept / completion happened
+-- latency_bins holds the histogram edges in seconds, from under 1 s to over
+-- a day; the API interpolates percentiles within a bin and reports the
+-- open-ended first and last bins by their inner edge.
+CREATE TABLE IF NOT EXISTS latency_bins (
+    bin INTEGER PRIMARY KEY,
+    lower_seconds DOUBLE PRECISION NOT NULL,
+    upper_seconds DOUBLE PRECISION NOT NULL
+);
+INSERT INTO latency_bins (bin, lower_seconds, upper_seconds) VALUES
+    (0, -1e18, 1), (1, 1, 5), (2, 5, 15), (3, 15, 30), (4, 30, 60),
+    (5, 60, 120), (6, 120, 300), (7, 300, 600), (8, 600, 900), (9, 900, 1800),
+    (10, 1800, 3600), (11, 3600, 7200), (12, 7200, 14400), (13, 14400, 28800),
+    (14, 28800, 86400), (15, 86400, 1e18)
+ON CONFLICT DO NOTHING;
+
+CREATE TABLE IF NOT EXISTS request_rollups (
+    granularity TEXT NOT NULL,
+    bucket TIMESTAMPTZ NOT NULL,
+    dimension TEXT NOT NULL,
+    value TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (granularity, bucket, dimension, value)
+);
+
+CREATE TABLE IF NOT EXISTS latency_rollups (
+    granularity TEXT NOT NULL,
+    bucket TIMESTAMPTZ NOT NULL,
+    metric TEXT NOT NULL,
+    bin INTEGER NOT NULL REFERENCES latency_bins(bin),
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (granularity, bucket, metric, bin)
+);
+
+CREATE OR REPLACE FUNCTION latency_bin(p_seconds DOUBLE PRECISION)
+RETURNS INTEGER
+LANGUAGE SQL
+STABLE
+AS $$
+    SELECT bin FROM latency_bins WHERE p_seconds >= lower_seconds AND p_seconds < upper_seconds;
+$$;
+
+CREATE OR REPLACE FUNCTION bump_request_rollup(p_granularity TEXT, p_bucket TIMESTAMPTZ,
+                                               p_dimension TEXT, p_value TEXT, p_delta INTEGER)
+RETURNS VOID
+LANGUAGE SQL
+AS $$
+    INSERT INTO request_rollups (granularity, bucket, dimension, value, count)
+    VALUES (p_granularity, p_bucket, p_dimension, p_value, p_delta)
+    ON CONFLICT (granularity, bucket, dimension, value)
+    DO UPDATE SET count = request_rollups.count + EXCLUDED.count;
+$$;
+
+CREATE OR REPLACE FUNCTION bump_latency_rollup(p_granularity TEXT, p_bucket TIMESTAMPTZ,
+                                               p_metric TEXT, p_seconds DOUBLE PRECISION, p_delta INTEGER)
+RETURNS VOID
+LANGUAGE SQL
+AS $$
+    INSERT INTO latency_rollups (granularity, bucket, metric, bin, count)
+    VALUES (p_granularity, p_bucket, p_metric, latency_bin(p_seconds), p_delta)
+    ON CONFLICT (granularity, bucket, metric, bin)
+    DO UPDATE SET count = latency_rollups.count + EXCLUDED.count;
+$$;
+
+-- Only the dimensions and latencies whose value or bucket changed are
+-- touched, so a status change writes two status rows per granularity.
+CREATE OR REPLACE FUNCTION requests_analytics_rollup()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    has_old BOOLEAN := TG_OP <> 'INSERT';
+    has_new BOOLEAN := TG_OP <> 'DELETE';
+    g TEXT;
+    d RECORD;
+    l RECORD;
+BEGIN
+    FOREACH g IN ARRAY ARRAY['hour', 'day'] LOOP
+        FOR d IN
+            SELECT * FROM (VALUES
+                ('status', COALESCE(OLD.status, 'pending'), COALESCE(NEW.status, 'pending')),
+                ('block', OLD.block, NEW.block),
+                ('type', OLD.type, NEW.type)
+            ) AS v(dimension, old_value, new_value)
+        LOOP
+            CONTINUE WHEN has_old AND has_new
+                AND d.old_value IS NOT DISTINCT FROM d.new_value
+                AND date_trunc(g, OLD.created_at) IS NOT DISTINCT FROM date_trunc(g, NEW.created_at);
+            IF has_old THEN
+                PERFORM bump_request_rollup(g, date_trunc(g, OLD.created_at), d.dimension, d.old_value, -1);
+            END IF;
+            IF has_new THEN
+                PERFORM bump_request_rollup(g, date_trunc(g, NEW.created_at), d.dimension, d.new_value, 1);
+            END IF;
+        END LOOP;
+
+        FOR l IN
+            SELECT * FROM (VALUES
+                ('accept', OLD.created_at, OLD.accepted_at, NEW.created_at, NEW.accepted_at),
+                ('complete', OLD.accepted_at, OLD.completed_at, NEW.accepted_at, NEW.completed_at)
+            ) AS v(metric, old_start, old_end, new_start, new_end)
+        LOOP
+            CONTINUE WHEN has_old AND has_new
+                AND (l.old_start, l.old_end) IS NOT DISTINCT FROM (l.new_start, l.new_end);
+            IF has_old AND l.old_start IS NOT NULL AND l.old_end IS NOT NULL THEN
+                PERFORM bump_latency_rollup(g, date_trunc(g, l.old_end), l.metric,
+                                            EXTRACT(EPOCH FROM l.old_end - l.old_start), -1);
+            END IF;
+            IF has_new AND l.new_start IS NOT NULL AND l.new_end IS NOT NULL THEN
+                PERFORM bump_latency_rollup(g, date_trunc(g, l.new_end), l.metric,
+                                            EXTRACT(EPOCH FROM l.new_end - l.new_start), 1);
+            END IF;
+        END LOOP;
+    END LOOP;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS requests_analytics_rollup ON requests;
+CREATE TRIGGER requests_analytics_rollup
+AFTER INSERT OR UPDATE OF created_at, block, type, status, accepted_at, completed_at ON requests
+FOR EACH ROW EXECUTE FUNCTION requests_analytics_rollup();
+DROP TRIGGER IF EXISTS requests_analytics_rollup_delete ON requests;
+CREATE TRIGGER requests_analytics_rollup_delete
+AFTER DELETE ON requests
+FOR EACH ROW WHEN (current_setting('cleanvit.archiving', true) IS DISTINCT FROM 'on')
+EXECUTE FUNCTION requests_analytics_rollup();
+
+-- Reconciliation: rebuild both analytics tables from all_requests
+CREATE OR REPLACE FUNCTION rebuild_request_rollups()
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    n INTEGER;
+BEGIN
+    LOCK TABLE requests, requests_archive IN SHARE MODE;
+    DELETE FROM request_rollups;
+    DELETE FROM latency_rollups;
+
+    INSERT INTO request_rollups (granularity, bucket, dimension, value, count)
+    SELECT g, date_trunc(g, r.created_at), d.dimension, d.value, COUNT(*)
+    FROM all_requests r
+    CROSS JOIN unnest(ARRAY['hour', 'day']) AS g
+    CROSS JOIN LATERAL (VALUES ('status', COALESCE(r.status, 'pending')),
+                               ('block', r.block),
+                               ('type', r.type)) AS d(dimension, value)
+    GROUP BY 1, 2, 3, 4;
+    GET DIAGNOSTICS n = ROW_COUNT;
+
+    INSERT INTO latency_rollups (granularity, bucket, metric, bin, count)
+    SELECT g, date_trunc(g, accepted_at), 'accept', latency_bin(EXTRACT(EPOCH FROM accepted_at - created_at)), COUNT(*)
+    FROM all_requests, unnest(ARRAY['hour', 'day']) AS g
+    WHERE accepted_at IS NOT NULL
+    GROUP BY 1, 2, 3, 4;
+
+    INSERT INTO latency_rollups (granularity, bucket, metric, bin, count)
+    SELECT g, date_trunc(g, completed_at), 'complete', latency_bin(EXTRACT(EPOCH FROM completed_at - accepted_at)), COUNT(*)
+    FROM all_requests, unnest(ARRAY['hour', 'day']) AS g
+    WHERE completed_at IS NOT NULL AND accepted_at IS NOT NULL
+    GROUP BY 1, 2, 3, 4;
+
+    RETURN n;
+END;
+$$;
+
+-- Range read for /api/admin/analytics: counts and latency histograms for
+-- buckets in [p_from, p_to)
+CREATE OR REPLACE FUNCTION request_analytics(p_granularity TEXT, p_from TIMESTAMPTZ, p_to TIMESTAMPTZ)
+RETURNS JSON
+LANGUAGE SQL
+STABLE
+AS $$
+    SELECT json_build_object(
+        'counts', COALESCE((SELECT json_agg(c ORDER BY c.bucket) FROM (
+            SELECT bucket, dimension, value, count FROM request_rollups
+            WHERE granularity = p_granularity AND bucket >= p_from AND bucket < p_to AND count <> 0
+        ) c), '[]'::json),
+        'latency', COALESCE((SELECT json_agg(l ORDER BY l.bucket) FROM (
+            SELECT bucket, metric, bin, count FROM latency_rollups
+            WHERE granularity = p_granularity AND bucket >= p_from AND bucket < p_to AND count <> 0
+        ) l), '[]'::json),
+        'bins', (SELECT json_agg(b ORDER BY b.bin) FROM latency_bins b)
+    );
+$$;
+
+-- 12. REQUESTS ARCHIVE
+-- Completed requests older than ARCHIVE_AFTER_DAYS are moved, in batches,
+-- from requests to requests_archive by archive_requests() (archive.py); see
+-- migrations/postgres/0003_requests_archive.sql. The rollup delete triggers
+-- (sections 10 and 11) skip rows being archived, so the move leaves the
+-- rollups alone. all_requests is both tables, for the admin aggregates and
+-- the rollup rebuilds.
+CREATE TABLE IF NOT EXISTS requests_archive (
+    id INTEGER PRIMARY KEY,
+    request_id TEXT UNIQUE NOT NULL,
+    user_id INTEGER REFERENCES users(id),
+    cleaner_id INTEGER REFERENCES cleaners(id),
+    block TEXT NOT NULL,
+    room_number TEXT NOT NULL,
+    group_no TEXT,
+    type TEXT NOT NULL,
+    instructions TEXT,
+    status TEXT,
+    qr_code TEXT,
+    created_at TIMESTAMPTZ,
+    accepted_at TIMESTAMPTZ,
+    completed_at TIMESTAMPTZ,
+    rating INTEGER,
+    feedback TEXT,
+    completed_by INTEGER REFERENCES cleaners(id),
+    archived_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- Same listing shapes as the requests indexes (sections 8 and 0001)
+CREATE INDEX IF NOT EXISTS requests_archive_group_created_idx ON requests_archive (group_no, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS requests_archive_user_created_idx ON requests_archive (user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS requests_archive_cleaner_accepted_idx ON requests_archive (cleaner_id, accepted_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS requests_archive_cleaner_completed_idx ON requests_archive (cleaner_id, completed_at DESC);
+CREATE INDEX IF NOT EXISTS requests_archive_rated_completed_idx ON requests_archive (completed_at DESC) WHERE rating IS NOT NULL;
+CREATE INDEX IF NOT EXISTS requests_archive_block_status_idx ON requests_archive (block, status);
+-- The archiver's batch: WHERE status = 'completed' AND completed_at < ? ORDER BY completed_at
+CREATE INDEX IF NOT EXISTS requests_status_completed_idx ON requests (status, completed_at);
+
+CREATE OR REPLACE VIEW all_requests AS
+    SELECT id, request_id, user_id, cleaner_id, block, room_number, group_no, type, instructions,
+           status, created_at, accepted_at, completed_at, rating, feedback, completed_by
+    FROM requests
+    UNION ALL
+    SELECT id, request_id, user_id, cleaner_id, block, room_number, group_no, type, instructions,
+           status, created_at, accepted_at, completed_at, rating, feedback, completed_by
+    FROM requests_archive;
+
+-- A rating on an archived request (status stays completed, so only the
+-- rating terms change)
+DROP TRIGGER IF EXISTS requests_archive_cleaner_rollup ON requests_archive;
+CREATE TRIGGER requests_archive_cleaner_rollup
+AFTER UPDATE OF rating ON requests_archive
+FOR EACH ROW EXECUTE FUNCTION requests_cleaner_rollup();
+
+-- Moves up to p_limit requests completed before p_before; returns the count.
+-- SKIP LOCKED lets two archivers run at once without waiting on each other.
+CREATE OR REPLACE FUNCTION archive_requests(p_before TIMESTAMPTZ, p_limit INTEGER)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    n INTEGER;
+BEGIN
+    PERFORM set_config('cleanvit.archiving', 'on', true);
+    WITH moved AS (
+        DELETE FROM requests
+        WHERE id IN (SELECT id FROM requests
+                     WHERE status = 'completed' AND completed_at < p_before
+                     ORDER BY completed_at
+                     LIMIT p_limit
+                     FOR UPDATE SKIP LOCKED)
+        RETURNING *
+    )
+    INSERT INTO requests_archive (id, request_id, user_id, cleaner_id, block, room_number, group_no, type,
+                                  instructions, status, qr_code, created_at, accepted_at, completed_at,
+                                  rating, feedback, completed_by)
+    SELECT id, request_id, user_id, cleaner_id, block, room_number, group_no, type,
+           instructions, status, qr_code, created_at, accepted_at, completed_at,
+           rating, feedback, completed_by
+    FROM moved;
+    GET DIAGNOSTICS n = ROW_COUNT;
+    PERFORM set_config('cleanvit.archiving', 'off', true);
+    RETURN n;
+END;
+$$;
+
+-- Totals, status counts and the per-block histogram come from a single
+-- GROUP BY pass over both tables; recent reviews are a top-5 lookup.
+CREATE OR REPLACE FUNCTION admin_stats()
+RETURNS JSON
+LANGUAGE SQL
+STABLE
+AS $$
+    WITH per_block AS (
+        SELECT block,
+               COUNT(*) AS total,
+               COUNT(*) FILTER (WHERE status = 'pending') AS pending,
+               COUNT(*) FILTER (WHERE status = 'completed') AS completed
+        FROM all_requests
+        GROUP BY block
+    ),
+    reviews AS (
+        SELECT u.name AS student, c.name AS cleaner, r.rating, r.feedback, r.completed_at AS date
+        FROM all_requests r
+        LEFT JOIN users u ON u.id = r.user_id
+        LEFT JOIN cleaners c ON c.id = r.cleaner_id
+        WHERE r.rating IS NOT NULL
+        ORDER BY r.completed_at DESC NULLS LAST
+        LIMIT 5
+    )
+    SELECT json_build_object(
+        'total', COALESCE((SELECT SUM(total) FROM per_block), 0),
+        'pending', COALESCE((SELECT SUM(pending) FROM per_block), 0),
+        'completed', COALESCE((SELECT SUM(completed) FROM per_block), 0),
+        'blocks', COALESCE((SELECT json_agg(json_build_object('block', block, 'count', total) ORDER BY block) FROM per_block), '[]'::json),
+        'reviews', COALESCE((SELECT json_agg(reviews) FROM reviews), '[]'::json)
+    );
+$$;
+
+-- Bring the rollups (sections 10 and 11) in line with both tables
+SELECT rebuild_cleaner_rollups();
+SELECT rebuild_request_rollups();
+
 -- DEFAULT ADMIN (Password: admin123)
 -- You may need to replace the hash if using a different hashing algorithm locally
 INSERT INTO admins (username, password) VALUES ('admin', '$2b$12$K1/1.T4.U4g11e.b1.g2.e1V1a1a1a1a1a1a1a1a1a1a1a1a1') ON CONFLICT DO NOTHING;
@@ -0,0 +1,147 @@
+import re
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from urllib.parse import parse_qsl
+
+# ----------------- REQUEST TRACING -----------------
+# An opt-in breakdown of one request: every database call (table,
+# operation, filters, rows, bytes, duration) and the wall and CPU time
+# spent in QR rendering and decoding, bcrypt and JSON serialization. The
+# trace lives in a context variable, so calls made on query fan-out
+# threads (which run in a copy of the caller's context) land in the same
+# trace. With no trace active every hook is a single ContextVar lookup.
+#
+# Filter values are never recorded (only columns and operators), so OTPs
+# and emails do not end up in the slow-request log.
+
+# Database calls kept per trace; later ones are only counted
+TRACE_MAX_DB_CALLS = 200
+
+current_trace = contextvars.ContextVar('cleanvit_trace', default=None)
+current_span = contextvars.ContextVar('cleanvit_span', default=None)
+
+class Trace:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.cpu_started = time.thread_time()
+        self.db_calls = []
+        self.db_totals = {'calls': 0, 'ms': 0.0, 'rows': 0, 'bytes': 0}
+        self.spans = {}
+        self._lock = threading.Lock()
+
+    def db_call(self, call):
+        with self._lock:
+            totals = self.db_totals
+            totals['calls'] += 1
+            totals['ms'] += call['ms']
+            totals['rows'] += call['rows'] or 0
+            totals['bytes'] += call['bytes'] or 0
+            if len(self.db_calls) < TRACE_MAX_DB_CALLS:
+                self.db_calls.append(call)
+
+    def span(self, category, ms, cpu_ms):
+        with self._lock:
+            s = self.spans.get(category)
+            if s is None:
+                s = self.spans[category] = {'calls': 0, 'ms': 0.0, 'cpuMs': 0.0}
+            s['calls'] += 1
+            s['ms'] += ms
+            s['cpuMs'] += cpu_ms
+
+    def server_timing(self, total_ms):
+        # Server-Timing header value: totals per category, no filters
+        db = self.db_totals
+        parts = [f'total;dur={total_ms:.1f}',
+                 f'cpu;dur={(time.thread_time() - self.cpu_started) * 1000:.1f};desc="request thread"']
+        if db['calls']:
+            parts.append(f'db;dur={db["ms"]:.1f};desc="{db["calls"]} calls, {db["rows"]} rows, {db["bytes"]} bytes"')
+        for category, s in sorted(self.spans.items()):
+            parts.append(f'{category};dur={s["ms"]:.1f};desc="{s["calls"]} calls, {s["cpuMs"]:.1f} ms CPU"')
+        return ', '.join(parts)
+
+    def summary(self):
+        with self._lock:
+            db = dict(self.db_totals, ms=round(self.db_totals['ms'], 2))
+            return {
+                'cpuMs': round((time.thread_time() - self.cpu_started) * 1000, 2),
+                'db': db,
+                'dbCalls': [dict(c, ms=round(c['ms'], 2)) for c in self.db_calls],
+                'droppedDbCalls': db['calls'] - len(self.db_calls),
+                'spans': {k: {'calls': s['calls'], 'ms': round(s['ms'], 2), 'cpuMs': round(s['cpuMs'], 2)}
+                          for k, s in self.spans.items()}
+            }
+
+def start_trace():
+    trace = Trace()
+    current_trace.set(trace)
+    return trace
+
+def end_trace():
+    current_trace.set(None)
+
+@contextmanager
+def span(category):
+    # Wall time and this thread's CPU time for a block of work. CPU spent in
+    # a worker process on the block's behalf is added via add_worker_cpu().
+    trace = current_trace.get()
+    if trace is None:
+        yield
+        return
+    offloaded = [0.0]
+    token = current_span.set(offloaded)
+    t0, c0 = time.perf_counter(), time.thread_time()
+    try:
+        yield
+    finally:
+        current_span.reset(token)
+        trace.span(category, (time.perf_counter() - t0) * 1000,
+                   (time.thread_time() - c0) * 1000 + offloaded[0])
+
+def add_worker_cpu(cpu_ms):
+    offloaded = current_span.get()
+    if offloaded is not None:
+        offloaded[0] += cpu_ms
+
+def row_bytes(rows):
+    # Approximate payload size of result rows (value lengths, 8 per number)
+    total = 0
+    for row in rows:
+        for v in row.values():
+            if isinstance(v, (str, bytes)):
+                total += len(v)
+            elif v is not None:
+                total += 8
+    return total
+
+def record_db(backend, table, operation, seconds, rows=None, nbytes=None, filters=None):
+    trace = current_trace.get()
+    if trace is None:
+        return
+    trace.db_call({'backend': backend, 'table': table, 'operation': operation,
+                   'ms': seconds * 1000, 'rows': rows, 'bytes': nbytes, 'filters': filters})
+
+# ---- filter descriptions ----
+
+POSTGREST_PASSTHROUGH = ('select', 'order', 'limit', 'offset', 'on_conflict', 'columns')
+
+def postgrest_filters(query):
+    # "status=eq.pending&limit=50" -> "status=eq.?&limit=50"
+    parts = []
+    for key, value in parse_qsl(query, keep_blank_values=True):
+        if key in POSTGREST_PASSTHROUGH:
+            parts.append(f"{key}={value}")
+        elif key in ('or', 'and'):
+            parts.append(f"{key}=(...)")
+        else:
+            op = value.split('.', 1)[0] if '.' in value else value
+            parts.append(f"{key}={op}.?")
+    return '&'.join(parts) or None
+
+SQL_WHERE_RE = re.compile(r'\bWHERE\s+(.*?)(?:\s+(?:GROUP BY|ORDER BY|LIMIT|RETURNING)\b|$)', re.I | re.S)
+
+def sql_filters(sql):
+    # The WHERE clause of a parameterised statement (values are already ?)
+    m = SQL_WHERE_RE.search(sql)
+    return ' '.join(m.group(1).split())[:200] if m else None
@@ -0,0 +1,227 @@
+import os
+import time
+import threading
+import contextvars
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FuturesTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+import tracing
+
+# ----------------- BOUNDED WORKER POOLS -----------------
+# CPU-heavy work (bcrypt, image decoding) runs in a process pool so it does
+# not hold up the request threads. Each pool caps the number of jobs queued
+# or running; past the cap run() raises PoolFull, past a job's timeout
+# PoolOverloaded, and the route answers 503 (or 429) instead of letting
+# latency grow without bound. A worker that dies (crash, OOM kill) breaks
+# the whole executor: the jobs it took down raise PoolBroken (also a 503)
+# and the next job starts a fresh executor.
+
+class PoolOverloaded(Exception):
+    pass
+
+class PoolFull(PoolOverloaded):
+    # Raised without waiting when every slot is taken (as opposed to a job
+    # that was accepted but timed out)
+    pass
+
+class PoolBroken(PoolOverloaded):
+    # A worker process died while the job was queued or running
+    pass
+
+def _call_timed(fn, *args):
+    # Runs in the worker process: the job's result, its own run time (so the
+    # caller can tell queueing delay from work) and the CPU time it used
+    t0, c0 = time.perf_counter(), time.process_time()
+    result = fn(*args)
+    return result, (time.perf_counter() - t0) * 1000, (time.process_time() - c0) * 1000
+
+class BoundedProcessPool:
+    def __init__(self, name, max_workers, max_pending):
+        # max_workers=0 runs jobs inline on the calling thread (serverless,
+        # or platforms without multiprocessing)
+        self.name = name
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self.pending = 0
+        self.submitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.broken = 0
+        self._timings = {'completed': 0, 'totalMs': 0.0, 'runMs': 0.0, 'maxMs': 0.0, 'lastMs': 0.0}
+
+    def _get_executor(self):
+        # Created lazily and per process, so a pool built before a fork
+        # (gunicorn --preload) is never shared with the parent.
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+                self._pid = os.getpid()
+            return self._executor
+
+    def _discard(self, executor):
+        # Drops a broken executor so the next job builds a new one. Only the
+        # first of the jobs it took down gets to replace it.
+        with self._lock:
+            self.broken += 1
+            if self._executor is not executor:
+                return
+            self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _release(self, _future=None):
+        with self._lock:
+            self.pending -= 1
+        self._slots.release()
+
+    def _record(self, total_ms, run_ms):
+        with self._lock:
+            t = self._timings
+            t['completed'] += 1
+            t['totalMs'] += total_ms
+            t['runMs'] += run_ms
+            t['maxMs'] = max(t['maxMs'], total_ms)
+            t['lastMs'] = total_ms
+
+    def run(self, fn, *args, timeout=None):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise PoolFull(f"{self.name} pool is full")
+        with self._lock:
+            self.pending += 1
+            self.submitted += 1
+        t0 = time.perf_counter()
+
+        if not self.max_workers:
+            try:
+                result = fn(*args)
+            finally:
+                self._release()
+            ms = (time.perf_counter() - t0) * 1000
+            self._record(ms, ms)
+            return result
+
+        executor = self._get_executor()
+        try:
+            future = executor.submit(_call_timed, fn, *args)
+        except BrokenProcessPool:
+            self._release()
+            self._discard(executor)
+            raise PoolBroken(f"{self.name} pool lost a worker")
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        try:
+            result, run_ms, cpu_ms = future.result(timeout=timeout)
+        except FuturesTimeout:
+            # A job that cannot finish in time means the pool is backed up
+            future.cancel()
+            with self._lock:
+                self.timed_out += 1
+            raise PoolOverloaded(f"{self.name} job timed out")
+        except BrokenProcessPool:
+            self._discard(executor)
+            raise PoolBroken(f"{self.name} pool lost a worker")
+        self._record((time.perf_counter() - t0) * 1000, run_ms)
+        tracing.add_worker_cpu(cpu_ms)
+        return result
+
+    def stats(self):
+        with self._lock:
+            t = self._timings
+            n = t['completed']
+            return {
+                'workers': self.max_workers,
+                'maxPending': self.max_pending,
+                'pending': self.pending,
+                'submitted': self.submitted,
+                'rejected': self.rejected,
+                'timedOut': self.timed_out,
+                'broken': self.broken,
+                'completed': n,
+                # Wall time per job as seen by the request thread, and the
+                # part of it spent waiting for a worker (queue + transfer)
+                'avgMs': round(t['totalMs'] / n, 2) if n else 0,
+                'avgQueueMs': round((t['totalMs'] - t['runMs']) / n, 2) if n else 0,
+                'maxMs': round(t['maxMs'], 2),
+                'lastMs': round(t['lastMs'], 2)
+            }
+
+# ----------------- QUERY FAN-OUT -----------------
+# I/O-bound reads that do not depend on each other (the queries behind one
+# dashboard response) are sent in parallel on a shared thread pool and
+# gathered, so the caller waits for the slowest query rather than the sum.
+# Each task runs in a copy of the caller's context, so Flask's request
+# context (used for per-route connection stats) is visible in the workers.
+
+class QueryFanout:
+    def __init__(self, name, max_workers):
+        # max_workers=0 runs the calls one after another on the calling thread
+        self.name = name
+        self.max_workers = max_workers
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._timings = {}
+
+    def _get_executor(self):
+        # Threads do not survive a fork; build a fresh pool per process
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix=self.name)
+                self._pid = os.getpid()
+            return self._executor
+
+    def _record(self, name, ms):
+        with self._lock:
+            t = self._timings.get(name)
+            if t is None:
+                t = self._timings[name] = {'calls': 0, 'totalMs': 0.0, 'maxMs': 0.0, 'lastMs': 0.0}
+            t['calls'] += 1
+            t['totalMs'] += ms
+            t['maxMs'] = max(t['maxMs'], ms)
+            t['lastMs'] = ms
+
+    def _timed(self, name, fn):
+        t0 = time.perf_counter()
+        try:
+            return fn()
+        finally:
+            self._record(name, (time.perf_counter() - t0) * 1000)
+
+    def gather(self, calls):
+        # calls: {name: zero-argument callable}. Returns {name: result};
+        # if any call raised, re-raises the first failure after all finish.
+        if not self.max_workers or len(calls) < 2:
+            return {name: self._timed(name, fn) for name, fn in calls.items()}
+
+        executor = self._get_executor()
+        futures = {name: executor.submit(contextvars.copy_context().run, self._timed, name, fn)
+                   for name, fn in calls.items()}
+        results, error = {}, None
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                error = error or e
+        if error:
+            raise error
+        return results
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.max_workers,
+                'queries': {name: {
+                    'calls': t['calls'],
+                    'avgMs': round(t['totalMs'] / t['calls'], 2),
+                    'maxMs': round(t['maxMs'], 2),
+                    'lastMs': round(t['lastMs'], 2)
+                } for name, t in self._timings.items()}
+            }